@@ -1,10 +1,11 @@
 # core/admin.py
 
 from django.contrib import admin
+from django.utils import timezone
 from .models import (
     PatientProfile, BloodGlucoseReading, Medication, DoctorNote,
     Attachment, Consultation, Alert, DoctorProfile, FavoriteDoctor,
-    Appointment
+    Appointment, GlucoseTarget, DoctorReview, DoctorSchedule, ScheduleException, Job
 )
 
 # تسجيل PatientProfile في لوحة الإدارة
@@ -23,6 +24,13 @@ class BloodGlucoseReadingAdmin(admin.ModelAdmin):
     list_filter = ('reading_timestamp',)
     raw_id_fields = ('patient',)
 
+# تسجيل GlucoseTarget في لوحة الإدارة
+@admin.register(GlucoseTarget)
+class GlucoseTargetAdmin(admin.ModelAdmin):
+    list_display = ('patient', 'low', 'high', 'set_by', 'updated_at')
+    search_fields = ('patient__user__username',)
+    raw_id_fields = ('patient', 'set_by')
+
 # تسجيل Medication في لوحة الإدارة
 @admin.register(Medication)
 class MedicationAdmin(admin.ModelAdmin):
@@ -67,10 +75,36 @@ class AlertAdmin(admin.ModelAdmin):
 # تسجيل DoctorProfile في لوحة الإدارة
 @admin.register(DoctorProfile)
 class DoctorProfileAdmin(admin.ModelAdmin):
-    list_display = ('user', 'specialty', 'address', 'phone_number', 'is_available', 'average_rating')
+    list_display = ('user', 'specialty', 'address', 'phone_number', 'is_available', 'average_rating', 'rating_count')
     search_fields = ('user__first_name', 'user__last_name', 'specialty', 'address')
     list_filter = ('is_available', 'specialty', 'average_rating')
     raw_id_fields = ('user',)
+    # تُحدّث من التقييمات (core.ratings) ومن إجراءات المفضلة فقط
+    readonly_fields = ('average_rating', 'rating_total', 'rating_count', 'favorites_count', 'bookings_version')
+
+# تسجيل DoctorReview في لوحة الإدارة
+@admin.register(DoctorReview)
+class DoctorReviewAdmin(admin.ModelAdmin):
+    list_display = ('doctor', 'patient', 'rating', 'created_at')
+    list_filter = ('rating', 'created_at')
+    search_fields = ('doctor__user__username', 'patient__user__username', 'comment')
+    raw_id_fields = ('patient', 'doctor')
+
+# تسجيل DoctorSchedule في لوحة الإدارة
+@admin.register(DoctorSchedule)
+class DoctorScheduleAdmin(admin.ModelAdmin):
+    list_display = ('doctor', 'weekday', 'start_time', 'end_time', 'slot_minutes')
+    list_filter = ('weekday',)
+    search_fields = ('doctor__user__username',)
+    raw_id_fields = ('doctor',)
+
+# تسجيل ScheduleException في لوحة الإدارة
+@admin.register(ScheduleException)
+class ScheduleExceptionAdmin(admin.ModelAdmin):
+    list_display = ('doctor', 'date', 'start_time', 'end_time', 'reason')
+    list_filter = ('date',)
+    search_fields = ('doctor__user__username', 'reason')
+    raw_id_fields = ('doctor',)
 
 # تسجيل FavoriteDoctor في لوحة الإدارة
 @admin.register(FavoriteDoctor)
@@ -86,4 +120,20 @@ class AppointmentAdmin(admin.ModelAdmin):
     list_display = ('patient', 'doctor', 'appointment_date', 'appointment_time', 'status')
     list_filter = ('status', 'appointment_date', 'doctor')
     search_fields = ('patient__user__username', 'doctor__user__username')
-    raw_id_fields = ('patient', 'doctor')
\ No newline at end of file
+    raw_id_fields = ('patient', 'doctor')
+
+# تسجيل Job في لوحة الإدارة
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'attempts', 'run_at', 'created_at', 'finished_at')
+    list_filter = ('status', 'kind')
+    readonly_fields = ('attempts', 'locked_at', 'last_error', 'created_at', 'finished_at')
+    actions = ['requeue']
+
+    @admin.action(description='إعادة المهام المحددة إلى الطابور')
+    def requeue(self, request, queryset):
+        # للمهام الفاشلة نهائياً بعد إصلاح السبب: محاولات جديدة كاملة
+        updated = queryset.exclude(status=Job.RUNNING).update(
+            status=Job.QUEUED, attempts=0, run_at=timezone.now(), finished_at=None,
+        )
+        self.message_user(request, f'{updated} job(s) requeued.')
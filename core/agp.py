@@ -0,0 +1,111 @@
+# core/agp.py
+
+from datetime import datetime, time, timedelta
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from .detection import get_target_range
+from .glucose import bucket_edges, fetch_patient_readings
+from .models import PatientProfile
+
+AGP_WINDOWS = (14, 90)
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+PERCENTILES = (5, 25, 50, 75, 95)
+# المفتاح يتضمن تاريخ اليوم ونسخة الـ AGP للمريض (من قاعدة البيانات)، فالنسخة المخزنة لا تُقرأ بعد
+# تغير اليوم أو أي تعديل، في كل العمليات (وليس فقط العملية التي نفذت التعديل) وتنتهي وحدها
+AGP_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def agp_window(days):
+    """
+    آخر days أيام كاملة بالتوقيت المحلي حتى نهاية اليوم الحالي: [start, end).
+    """
+    tz = timezone.get_current_timezone()
+    today = timezone.localdate()
+    end = datetime.combine(today + timedelta(days=1), time.min, tzinfo=tz)
+    start = datetime.combine(today - timedelta(days=days - 1), time.min, tzinfo=tz)
+    return start, end
+
+
+def agp_cache_key(patient_id, days, version):
+    return f'agp:{patient_id}:{days}:{version}:{timezone.localdate():%Y-%m-%d}'
+
+
+def slot_percentiles(slots, values):
+    """
+    المئينات لكل slot بدون حلقة على الـ slots: ترتيب واحد بـ (slot، القيمة)
+    ثم استيفاء خطي بين أقرب عنصرين لكل مئين (مثل np.percentile).
+    يرجع (العدد لكل slot, مصفوفة SLOTS_PER_DAY × len(PERCENTILES)، NaN للـ slot الفارغ).
+    """
+    order = np.lexsort((values, slots))
+    ordered = values[order]
+    counts = np.bincount(slots, minlength=SLOTS_PER_DAY)
+    starts = np.cumsum(counts) - counts
+    result = np.full((SLOTS_PER_DAY, len(PERCENTILES)), np.nan)
+    filled = counts > 0
+    for column, percentile in enumerate(PERCENTILES):
+        position = starts[filled] + (counts[filled] - 1) * percentile / 100
+        lower = np.floor(position).astype(np.int64)
+        upper = np.ceil(position).astype(np.int64)
+        weight = position - lower
+        result[filled, column] = ordered[lower] * (1 - weight) + ordered[upper] * weight
+    return counts, result
+
+
+def compute_agp(patient_id, days):
+    start, end = agp_window(days)
+    ts, values, _ = fetch_patient_readings(patient_id, start, end)
+    # الـ slot من بداية اليوم المحلي لكل قراءة (حدود الأيام محسوبة من التقويم المحلي)
+    edges, _ = bucket_edges(start, end, 'day')
+    day = np.searchsorted(edges, ts, side='right') - 1
+    slots = np.minimum((ts - edges[day]) // (SLOT_MINUTES * 60), SLOTS_PER_DAY - 1)
+    counts, percentiles = slot_percentiles(slots, values)
+
+    low, high = get_target_range(patient_id)
+    result = []
+    for slot in range(SLOTS_PER_DAY):
+        minutes = slot * SLOT_MINUTES
+        entry = {'time': f'{minutes // 60:02d}:{minutes % 60:02d}', 'count': int(counts[slot])}
+        for column, percentile in enumerate(PERCENTILES):
+            value = percentiles[slot, column]
+            entry[f'p{percentile}'] = None if np.isnan(value) else round(float(value), 1)
+        result.append(entry)
+    return {
+        'days': days,
+        'from': start,
+        'to': end,
+        'readings': int(len(values)),
+        'slot_minutes': SLOT_MINUTES,
+        'target_range': {'low': low, 'high': high},
+        'slots': result,
+    }
+
+
+def glucose_agp(patient_id, days):
+    version = PatientProfile.objects.filter(pk=patient_id).values_list('agp_version', flat=True).first()
+    return cache.get_or_set(agp_cache_key(patient_id, days, version), lambda: compute_agp(patient_id, days), AGP_CACHE_TIMEOUT)
+
+
+def clear_agp(patient_id):
+    """
+    يعلن تغير الـ AGP للمريض (النطاق المستهدف مثلاً): الطلب التالي يحسبه من جديد.
+    """
+    PatientProfile.objects.filter(pk=patient_id).update(agp_version=F('agp_version') + 1)
+
+
+def invalidate_agp(patient_id, timestamps):
+    """
+    يعلن تغير الـ AGP فقط إذا وقعت إحدى القراءات الجديدة/المعدلة/المحذوفة داخل إحدى نوافذه.
+    """
+    if not timestamps:
+        return
+    earliest, latest = min(timestamps), max(timestamps)
+    for days in AGP_WINDOWS:
+        start, end = agp_window(days)
+        if earliest < end and latest >= start:
+            clear_agp(patient_id)
+            return
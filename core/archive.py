@@ -0,0 +1,124 @@
+# core/archive.py
+
+import os
+import shutil
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .models import ReadingArchive
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+# كل شهر مؤرشف = ملف .npy لكل عمود، بنفس الترتيب الزمني:
+# id (int64) حتى تكون إعادة الأرشفة idempotent، ts ميكروثانية Unix (int64)، value (float32)، type رمز نوع القراءة (int8)
+COLUMNS = {
+    'id': np.int64,
+    'ts': np.int64,
+    'value': np.float32,
+    'type': np.int8,
+}
+
+
+# القيم تُخزن float32 وتُقرأ مقربة لهذا العدد من المنازل (0.01 mg/dL)
+VALUE_DECIMALS = 2
+
+
+def to_micros(moment):
+    return (moment - EPOCH) // timedelta(microseconds=1)
+
+
+def archive_root():
+    return settings.GLUCOSE_ARCHIVE_ROOT
+
+
+def month_start(day):
+    return datetime.combine(day.replace(day=1), time.min, tzinfo=timezone.get_current_timezone())
+
+
+def next_month(day):
+    day = day.replace(day=1)
+    return day.replace(year=day.year + 1, month=1) if day.month == 12 else day.replace(month=day.month + 1)
+
+
+def segment_dir(patient_id, month, generation):
+    return os.path.join(archive_root(), str(patient_id), f'{month:%Y-%m}', str(generation))
+
+
+def load_segment(segment):
+    """
+    أعمدة شهر مؤرشف كمصفوفات memory-mapped: لا يُقرأ من القرص إلا الجزء المستخدم فعلاً.
+    """
+    path = segment_dir(segment.patient_id, segment.month, segment.generation)
+    return {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in COLUMNS}
+
+
+def write_segment(patient_id, month, generation, columns):
+    path = segment_dir(patient_id, month, generation)
+    os.makedirs(path, exist_ok=True)
+    for name, dtype in COLUMNS.items():
+        with open(os.path.join(path, f'{name}.npy'), 'wb') as handle:
+            np.save(handle, np.ascontiguousarray(columns[name], dtype=dtype))
+    return path
+
+
+def remove_generations(patient_id, month, keep):
+    """
+    يحذف نسخ الملفات القديمة (أو غير المعتمدة) لشهر بعد اعتماد النسخة keep.
+    keep=None يحذف كل ملفات الشهر.
+    """
+    month_dir = os.path.join(archive_root(), str(patient_id), f'{month:%Y-%m}')
+    if not os.path.isdir(month_dir):
+        return
+    for name in os.listdir(month_dir):
+        if keep is None or name != str(keep):
+            shutil.rmtree(os.path.join(month_dir, name), ignore_errors=True)
+    if keep is None:
+        shutil.rmtree(month_dir, ignore_errors=True)
+
+
+def archived_segments(patient_id, start=None, end=None):
+    segments = ReadingArchive.objects.filter(patient_id=patient_id)
+    if start is not None:
+        segments = segments.filter(last_timestamp__gte=start)
+    if end is not None:
+        segments = segments.filter(first_timestamp__lt=end)
+    return segments.order_by('month')
+
+
+def iter_archived(patient_id, start=None, end=None):
+    """
+    يمر على الأشهر المؤرشفة بالترتيب، ويرجع لكل شهر أعمدته مقصوصة على [start, end).
+    """
+    lo = None if start is None else to_micros(start)
+    hi = None if end is None else to_micros(end)
+    for segment in archived_segments(patient_id, start, end):
+        columns = load_segment(segment)
+        ts = columns['ts']
+        first = 0 if lo is None else np.searchsorted(ts, lo, side='left')
+        last = len(ts) if hi is None else np.searchsorted(ts, hi, side='left')
+        if first < last:
+            yield {name: column[first:last] for name, column in columns.items()}
+
+
+def archived_values(values):
+    return np.round(np.asarray(values, dtype=np.float64), VALUE_DECIMALS)
+
+
+def read_archived(patient_id, start=None, end=None):
+    """
+    القراءات المؤرشفة في [start, end) بنفس شكل glucose.fetch_readings:
+    (ts بالثواني int64, value float64, type int8) مرتبة زمنياً.
+    """
+    parts = list(iter_archived(patient_id, start, end))
+    if not parts:
+        return np.empty(0, np.int64), np.empty(0, np.float64), np.empty(0, np.int8)
+    micros = np.concatenate([part['ts'] for part in parts])
+    return (
+        # تقريب لأقرب ثانية مثل EpochSeconds
+        (micros + 500_000) // 1_000_000,
+        archived_values(np.concatenate([part['value'] for part in parts])),
+        np.concatenate([part['type'] for part in parts]),
+    )
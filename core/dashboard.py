@@ -0,0 +1,79 @@
+# core/dashboard.py
+
+from datetime import timedelta
+
+from django.db.models import F, FloatField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .models import Appointment, BloodGlucoseReading, GlucoseDailyRollup
+
+DASHBOARD_DAYS = 7
+# مؤشر الخطورة تقريب لـ Glycemia Risk Index: الـ rollups تعرف فقط ما تحت 70 وما فوق 180
+# (بدون درجتي < 54 و > 250)، فنستخدم أوزان الدرجة الأقل: 3 × 0.8 للانخفاض و 1.6 × 0.5 للارتفاع.
+RISK_LOW_WEIGHT = 2.4
+RISK_HIGH_WEIGHT = 0.8
+# ترتيبات مسموحة: ?ordering=risk (الافتراضي) أو -risk أو last_reading ...
+DASHBOARD_ORDERING = {
+    'risk': 'risk',
+    'mean': 'week_mean',
+    'time_in_range': 'time_in_range',
+    'last_reading': 'last_reading_at',
+    'next_appointment': 'next_appointment_date',
+    'name': 'user__first_name',
+}
+DEFAULT_DASHBOARD_ORDERING = '-risk'
+
+
+def week_aggregate(expression):
+    """
+    قيمة واحدة لكل مريض من الـ rollups اليومية لآخر DASHBOARD_DAYS أيام (subquery مرتبط بالمريض).
+    """
+    start = timezone.localdate() - timedelta(days=DASHBOARD_DAYS - 1)
+    rollups = (
+        GlucoseDailyRollup.objects.filter(patient=OuterRef('pk'), day__gte=start)
+        .order_by().values('patient').annotate(value=expression).values('value')
+    )
+    return Subquery(rollups, output_field=FloatField())
+
+
+def caseload(doctor, ordering=DEFAULT_DASHBOARD_ORDERING):
+    """
+    مرضى الطبيب مع ملخصهم السريري في استعلام واحد: آخر قراءة، متوسط وزمن النطاق لآخر 7 أيام،
+    مؤشر الخطورة، وأقرب موعد مؤكد مع هذا الطبيب. كل عمود subquery على فهرس (المريض، الوقت)
+    فلا يتغير عدد الاستعلامات مع عدد المرضى.
+    """
+    count = Cast(Sum('count'), FloatField())
+    last_reading = (
+        BloodGlucoseReading.objects.filter(patient=OuterRef('pk'))
+        .order_by('-reading_timestamp', '-id')
+    )
+    now = timezone.localtime()
+    next_appointment = (
+        Appointment.objects.filter(patient=OuterRef('pk'), doctor=doctor, status='Confirmed')
+        .filter(
+            Q(appointment_date__gt=now.date())
+            | Q(appointment_date=now.date(), appointment_time__gte=now.time())
+        )
+        .order_by('appointment_date', 'appointment_time')
+    )
+    descending = ordering.startswith('-')
+    field = F(DASHBOARD_ORDERING[ordering.lstrip('-')])
+    # المرضى بدون بيانات (بلا قراءات أو بلا موعد) دائماً في آخر القائمة
+    order = field.desc(nulls_last=True) if descending else field.asc(nulls_last=True)
+    return (
+        doctor.patients.select_related('user')
+        .annotate(
+            last_reading_value=Subquery(last_reading.values('reading_value')[:1]),
+            last_reading_at=Subquery(last_reading.values('reading_timestamp')[:1]),
+            week_count=week_aggregate(Sum('count')),
+            week_mean=week_aggregate(Sum('total') / count),
+            time_in_range=week_aggregate(Sum('in_range_count') * 100.0 / count),
+            risk=week_aggregate(
+                (RISK_LOW_WEIGHT * Sum('below_count') + RISK_HIGH_WEIGHT * Sum('above_count')) * 100.0 / count
+            ),
+            next_appointment_date=Subquery(next_appointment.values('appointment_date')[:1]),
+            next_appointment_time=Subquery(next_appointment.values('appointment_time')[:1]),
+        )
+        .order_by(order, 'pk')
+    )
@@ -0,0 +1,147 @@
+# core/detection.py
+
+from datetime import timedelta
+
+import numpy as np
+from django.utils import timezone
+
+from .glucose import TARGET_HIGH, TARGET_LOW
+from .models import BloodGlucoseReading, GlucoseTarget
+from .notifications import notify, patient_recipients
+
+# مدة بقاء القراءات خارج النطاق حتى تعتبر نوبة مستمرة
+SUSTAINED_MINUTES = 120
+# تغير سريع: أكثر من 3 mg/dL في الدقيقة بين قراءتين متتاليتين
+RATE_LIMIT = 3.0
+# لا نحسب معدل التغير بين قراءتين بينهما أكثر من نصف ساعة
+RATE_WINDOW_MINUTES = 30
+# القراءات الأقدم من هذا (سجل قديم يُرفع من الجهاز أو يُستورد) لا تطلق تنبيهات: الحدث انتهى،
+# وتبقى سياقاً لكشف القراءات الحديثة
+ALERT_MAX_AGE = timedelta(hours=24)
+
+BELOW, IN_RANGE, ABOVE = -1, 0, 1
+
+PATIENT_MESSAGES = {
+    'hypo': "تنبيه: قراءة السكر لديك منخفضة ({value:g} mg/dL). تناول سكريات سريعة وأعد القياس بعد 15 دقيقة.",
+    'hyper': "تنبيه: قراءة السكر لديك مرتفعة ({value:g} mg/dL).",
+    'sustained_low': "تنبيه: السكر لديك منخفض منذ أكثر من {minutes} دقيقة (آخر قراءة {value:g} mg/dL).",
+    'sustained_high': "تنبيه: السكر لديك مرتفع منذ أكثر من {minutes} دقيقة (آخر قراءة {value:g} mg/dL).",
+    'rapid_fall': "تنبيه: السكر لديك ينخفض بسرعة ({rate:.1f} mg/dL في الدقيقة).",
+    'rapid_rise': "تنبيه: السكر لديك يرتفع بسرعة ({rate:.1f} mg/dL في الدقيقة).",
+}
+DOCTOR_MESSAGES = {
+    'hypo': "المريض {name}: قراءة سكر منخفضة ({value:g} mg/dL).",
+    'hyper': "المريض {name}: قراءة سكر مرتفعة ({value:g} mg/dL).",
+    'sustained_low': "المريض {name}: سكر منخفض منذ أكثر من {minutes} دقيقة.",
+    'sustained_high': "المريض {name}: سكر مرتفع منذ أكثر من {minutes} دقيقة.",
+    'rapid_fall': "المريض {name}: انخفاض سريع في السكر ({rate:.1f} mg/dL في الدقيقة).",
+    'rapid_rise': "المريض {name}: ارتفاع سريع في السكر ({rate:.1f} mg/dL في الدقيقة).",
+}
+
+
+def get_target_range(patient_id):
+    """
+    النطاق الذي حدده الطبيب للمريض، أو النطاق الافتراضي.
+    """
+    target = GlucoseTarget.objects.filter(patient_id=patient_id).values_list('low', 'high').first()
+    return target or (TARGET_LOW, TARGET_HIGH)
+
+
+def fetch_tail(patient_id, since, until):
+    """
+    آخر قراءة قبل since (لمعرفة الحالة السابقة) + القراءات في [since, until]، مرتبة زمنياً.
+    """
+    readings = BloodGlucoseReading.objects.filter(patient_id=patient_id)
+    anchor = list(
+        readings.filter(reading_timestamp__lt=since)
+        .order_by('-reading_timestamp', '-id').values_list('id', 'reading_timestamp', 'reading_value')[:1]
+    )
+    tail = list(
+        readings.filter(reading_timestamp__gte=since, reading_timestamp__lte=until)
+        .order_by('reading_timestamp', 'id').values_list('id', 'reading_timestamp', 'reading_value')
+    )
+    return anchor + tail, bool(anchor)
+
+
+def detect_events(patient_id, readings, low, high):
+    """
+    يفحص القراءات الجديدة فقط، مع نافذة SUSTAINED_MINUTES قبل أقدمها كسياق،
+    فلا يُقرأ السجل كاملاً مهما كان حجم الدفعة. يرجع قائمة (kind, reading, details).
+    """
+    new = {reading.pk: reading for reading in readings}
+    timestamps = [reading.reading_timestamp for reading in readings]
+    since = min(timestamps) - timedelta(minutes=SUSTAINED_MINUTES)
+    rows, has_anchor = fetch_tail(patient_id, since, max(timestamps))
+    if not rows:
+        return []
+    ids = [row[0] for row in rows]
+    ts = np.array([row[1].timestamp() for row in rows]) / 60.0
+    values = np.array([row[2] for row in rows], dtype=np.float64)
+    is_new = np.array([pk in new for pk in ids])
+
+    state = np.where(values < low, BELOW, np.where(values > high, ABOVE, IN_RANGE))
+    prev_state = np.concatenate([[IN_RANGE], state[:-1]])
+    # بداية نوبة: قراءة خارج النطاق والقراءة السابقة ليست في نفس الحالة
+    episode_start = (state != IN_RANGE) & (state != prev_state)
+    if has_anchor:
+        episode_start[0] = False
+
+    # مدة النوبة الحالية عند كل قراءة (من أول قراءة فيها)
+    run_id = np.cumsum(np.concatenate([[True], state[1:] != state[:-1]]))
+    first_index = np.searchsorted(run_id, run_id)
+    duration = ts - ts[first_index]
+    prev_duration = np.concatenate([[0.0], duration[:-1]])
+    same_run = np.concatenate([[False], run_id[1:] == run_id[:-1]])
+    crossed = (
+        (state != IN_RANGE) & same_run
+        & (duration >= SUSTAINED_MINUTES) & (prev_duration < SUSTAINED_MINUTES)
+    )
+    # نوبة بدأت قبل النافذة (تشمل قراءة الـ anchor) لا نعرف متى بدأت، فلا نعيد التنبيه عليها
+    if has_anchor:
+        crossed &= run_id != run_id[0]
+
+    dt = np.diff(ts, prepend=np.nan)
+    rate = np.diff(values, prepend=np.nan) / np.where(dt > 0, dt, np.nan)
+    direction = np.where(np.abs(rate) >= RATE_LIMIT, np.sign(rate), 0)
+    direction[~(dt <= RATE_WINDOW_MINUTES)] = 0
+    prev_direction = np.concatenate([[0], direction[:-1]])
+    # تغير سريع متواصل يعطي تنبيهاً واحداً عند بدايته
+    rapid = (direction != 0) & (direction != prev_direction)
+
+    events = []
+    for i in np.flatnonzero(is_new & (episode_start | crossed | rapid)):
+        reading = new[ids[i]]
+        details = {'value': values[i], 'minutes': SUSTAINED_MINUTES, 'rate': abs(rate[i]) if rapid[i] else 0.0}
+        if episode_start[i]:
+            events.append(('hypo' if state[i] == BELOW else 'hyper', reading, details))
+        if crossed[i]:
+            events.append(('sustained_low' if state[i] == BELOW else 'sustained_high', reading, details))
+        if rapid[i]:
+            events.append(('rapid_fall' if direction[i] < 0 else 'rapid_rise', reading, details))
+    return events
+
+
+def process_new_readings(patient, readings):
+    """
+    مرحلة الكشف بعد كل إدخال (قراءة واحدة أو دفعة): تنبيهات للمريض وأطبائه في مهمة واحدة.
+    يُفحص فقط ما هو أحدث من ALERT_MAX_AGE. يرجع الأحداث المكتشفة.
+    """
+    cutoff = timezone.now() - ALERT_MAX_AGE
+    readings = [reading for reading in readings if reading.reading_timestamp >= cutoff]
+    if not readings:
+        return []
+    low, high = get_target_range(patient.pk)
+    events = detect_events(patient.pk, readings, low, high)
+    if not events:
+        return []
+    patient_user_id, doctor_user_ids = patient_recipients(patient)
+    name = patient.user.get_full_name() or patient.user.username
+    items = []
+    for kind, reading, details in events:
+        # نوع الحدث والمريض في الـ kind: الدمج لا يخلط حدثين مختلفين ولا مريضين عند الطبيب
+        notification_kind = f'glucose.{kind}:{patient.pk}'
+        items.append((patient_user_id, PATIENT_MESSAGES[kind].format(**details), reading, notification_kind))
+        doctor_message = DOCTOR_MESSAGES[kind].format(name=name, **details)
+        items.extend((doctor_id, doctor_message, reading, notification_kind) for doctor_id in doctor_user_ids)
+    notify(items)
+    return events
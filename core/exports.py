@@ -0,0 +1,77 @@
+# core/exports.py
+
+import csv
+import heapq
+import json
+from datetime import timedelta
+from operator import itemgetter
+
+from django.utils import timezone
+
+from .archive import EPOCH, archived_values, iter_archived
+from .glucose import READING_TYPES
+
+EXPORT_FIELDS = ['reading_timestamp', 'reading_value', 'reading_type', 'notes']
+# عدد الصفوف التي تُجلب من قاعدة البيانات وتُرسل للعميل في كل دفعة
+EXPORT_CHUNK_SIZE = 2000
+
+
+class Echo:
+    """
+    كائن يحقق واجهة write فقط، حتى يرجع csv.writer السطر بدل تخزينه.
+    """
+    def write(self, value):
+        return value
+
+
+def live_rows(readings):
+    return readings.values_list(*EXPORT_FIELDS).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def archived_rows(patient_id):
+    for columns in iter_archived(patient_id):
+        for start in range(0, len(columns['ts']), EXPORT_CHUNK_SIZE):
+            chunk = slice(start, start + EXPORT_CHUNK_SIZE)
+            rows = zip(columns['ts'][chunk].tolist(), archived_values(columns['value'][chunk]).tolist(), columns['type'][chunk].tolist())
+            for micros, value, code in rows:
+                yield EPOCH + timedelta(microseconds=micros), value, READING_TYPES[code], None
+
+
+def export_rows(readings, patient_id):
+    """
+    صفوف القراءات كـ tuples عبر iterator، فلا تُحمّل كل السجلات في الذاكرة.
+    القراءات المؤرشفة تُدمج مع الحية حسب الوقت (كلاهما مرتب زمنياً).
+    """
+    rows = heapq.merge(archived_rows(patient_id), live_rows(readings), key=itemgetter(0))
+    for timestamp, value, reading_type, notes in rows:
+        yield timezone.localtime(timestamp).isoformat(), value, reading_type, notes
+
+
+def chunked(lines, size=EXPORT_CHUNK_SIZE):
+    # نجمع الأسطر في دفعات بدل إرسال كل سطر كـ chunk منفصل في الاستجابة
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= size:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def stream_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    yield from chunked(writer.writerow(row) for row in rows)
+
+
+def stream_ndjson(rows):
+    yield from chunked(
+        json.dumps(dict(zip(EXPORT_FIELDS, row)), ensure_ascii=False) + '\n' for row in rows
+    )
+
+
+STREAMERS = {
+    'csv': stream_csv,
+    'ndjson': stream_ndjson,
+}
@@ -0,0 +1,310 @@
+# core/glucose.py
+
+from datetime import datetime, time, timedelta
+
+import numpy as np
+from django.db import connections
+from django.db.models import Case, Func, IntegerField, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from .archive import read_archived
+from .models import BloodGlucoseReading, GlucoseDailyRollup, GlucoseHourlyRollup
+
+# النطاق المستهدف الافتراضي (mg/dL) حسب التوافق الدولي لـ Time in Range
+TARGET_LOW = 70
+TARGET_HIGH = 180
+
+DEFAULT_RANGE_DAYS = 30
+BUCKETS = ('day', 'week')
+
+# كل نوع قراءة يأخذ رقماً صغيراً حتى نعد الأنواع بـ bincount
+READING_TYPES = [code for code, _ in BloodGlucoseReading.READING_TYPE_CHOICES]
+# أعمدة عدد كل نوع في جداول الـ rollup، بنفس ترتيب READING_TYPES
+TYPE_COUNT_FIELDS = ['fasting_count', 'after_meal_count', 'random_count']
+ROLLUP_FIELDS = [
+    'count', 'total', 'total_sq', 'min_value', 'max_value',
+    'below_count', 'in_range_count', 'above_count',
+] + TYPE_COUNT_FIELDS
+
+
+class EpochSeconds(Func):
+    """
+    يحول DateTimeField إلى ثواني Unix داخل SQL، حتى نجلب أرقاماً بدل كائنات datetime.
+    """
+    output_field = IntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='CAST(ROUND((julianday(%(expressions)s) - 2440587.5) * 86400) AS INTEGER)', **extra_context)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='CAST(EXTRACT(EPOCH FROM %(expressions)s) AS BIGINT)', **extra_context)
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='UNIX_TIMESTAMP(%(expressions)s)', **extra_context)
+
+
+def reading_type_code():
+    return Case(
+        *[When(reading_type=code, then=Value(index)) for index, code in enumerate(READING_TYPES)],
+        default=Value(READING_TYPES.index('Random')),
+        output_field=IntegerField(),
+    )
+
+
+def fetch_readings(queryset, start=None, end=None):
+    """
+    يجلب القراءات في استعلام واحد على شكل أعمدة NumPy:
+    (timestamps بالثواني int64, القيم float64, رمز نوع القراءة int8) مرتبة زمنياً.
+    الاستعلام يُنفذ على cursor مباشرة لأن كل الأعمدة أرقام جاهزة ولا نحتاج تحويلات Django لكل صف.
+    """
+    if start is not None:
+        queryset = queryset.filter(reading_timestamp__gte=start)
+    if end is not None:
+        queryset = queryset.filter(reading_timestamp__lt=end)
+    rows = (
+        queryset
+        .order_by('reading_timestamp')
+        .annotate(epoch=EpochSeconds('reading_timestamp'), type_code=reading_type_code())
+        .values_list('epoch', 'reading_value', 'type_code')
+    )
+    sql, params = rows.query.sql_with_params()
+    with connections[rows.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        data = np.fromiter(cursor.fetchall(), dtype=[('ts', 'i8'), ('value', 'f8'), ('type', 'i1')])
+    return data['ts'], data['value'], data['type']
+
+
+def fetch_patient_readings(patient_id, start=None, end=None):
+    """
+    مثل fetch_readings لمريض واحد، مع دمج القراءات المؤرشفة في الملفات والقراءات الحية في الجدول.
+    """
+    live = fetch_readings(BloodGlucoseReading.objects.filter(patient_id=patient_id), start, end)
+    archived = read_archived(patient_id, start, end)
+    if not len(archived[0]):
+        return live
+    ts, values, types = (np.concatenate([a, b]) for a, b in zip(archived, live))
+    order = np.argsort(ts, kind='stable')
+    return ts[order], values[order], types[order]
+
+
+def parse_range(params, default_days=DEFAULT_RANGE_DAYS):
+    """
+    يقرأ from/to من الـ query params. يقبل تاريخاً (YYYY-MM-DD) أو تاريخاً ووقتاً.
+    التاريخ في to يعني نهاية ذلك اليوم. يرجع (start, end) كوقت aware، و end غير مشمول.
+    الافتراضي آخر default_days أيام كاملة حتى نهاية اليوم الحالي، حتى يمكن قراءتها من الـ rollups.
+    """
+    tz = timezone.get_current_timezone()
+
+    def parse(name, end_of_day):
+        raw = params.get(name)
+        if not raw:
+            return None
+        # التاريخ أولاً: parse_datetime يقبل "YYYY-MM-DD" أيضاً ويعتبره بداية اليوم
+        day = parse_date(raw)
+        if day is not None:
+            if end_of_day:
+                day += timedelta(days=1)
+            return datetime.combine(day, time.min, tzinfo=tz)
+        value = parse_datetime(raw)
+        if value is None:
+            raise ValidationError({name: 'Expected a date (YYYY-MM-DD) or an ISO 8601 datetime.'})
+        return value if timezone.is_aware(value) else timezone.make_aware(value, tz)
+
+    try:
+        start = parse('from', end_of_day=False)
+        end = parse('to', end_of_day=True)
+    except ValueError:
+        raise ValidationError('Invalid date range.')
+    if end is None:
+        end = datetime.combine(timezone.localdate() + timedelta(days=1), time.min, tzinfo=tz)
+    if start is None:
+        start = datetime.combine(timezone.localtime(end, tz).date() - timedelta(days=default_days), time.min, tzinfo=tz)
+    if start >= end:
+        raise ValidationError({'from': "'from' must be earlier than 'to'."})
+    return start, end
+
+
+def bucket_edges(start, end, bucket):
+    """
+    حدود الـ buckets (بداية كل يوم/أسبوع بالتوقيت المحلي) كثواني Unix،
+    مع تاريخ بداية كل bucket. التوقيت الصيفي محسوب لأن الحدود تُبنى من التقويم المحلي.
+    """
+    tz = timezone.get_current_timezone()
+    day = timezone.localtime(start, tz).date()
+    step = timedelta(days=1)
+    if bucket == 'week':
+        day -= timedelta(days=day.weekday())
+        step = timedelta(days=7)
+
+    labels = []
+    edges = []
+    while True:
+        edge = datetime.combine(day, time.min, tzinfo=tz)
+        edges.append(int(edge.timestamp()))
+        if edge >= end:
+            break
+        labels.append(day)
+        day += step
+    return np.array(edges, dtype='i8'), labels
+
+
+def aggregate_readings(ts, values, types, edges, low=TARGET_LOW, high=TARGET_HIGH):
+    """
+    تجميع متجه (بدون حلقة على الصفوف) لكل bucket:
+    العدد، المجموع، مجموع المربعات، الأدنى، الأعلى، أعداد تحت/ضمن/فوق النطاق، وأعداد كل نوع قراءة.
+    """
+    size = len(edges) - 1
+    index = np.searchsorted(edges, ts, side='right') - 1
+    inside = (index >= 0) & (index < size)
+    index, values, types = index[inside], values[inside], types[inside]
+
+    minimum = np.full(size, np.inf)
+    maximum = np.full(size, -np.inf)
+    np.minimum.at(minimum, index, values)
+    np.maximum.at(maximum, index, values)
+    kinds = len(READING_TYPES)
+    return {
+        'count': np.bincount(index, minlength=size),
+        'total': np.bincount(index, weights=values, minlength=size),
+        'total_sq': np.bincount(index, weights=values * values, minlength=size),
+        'min': minimum,
+        'max': maximum,
+        'below': np.bincount(index[values < low], minlength=size),
+        'in_range': np.bincount(index[(values >= low) & (values <= high)], minlength=size),
+        'above': np.bincount(index[values > high], minlength=size),
+        'types': np.bincount(index * kinds + types, minlength=size * kinds).reshape(size, kinds),
+    }
+
+
+def is_local_midnight(value):
+    return timezone.localtime(value).time() == time.min
+
+
+def rollup_resolution(start, end, edges):
+    """
+    هل يمكن الإجابة من جداول الـ rollup؟ اليومية إذا كانت الفترة أياماً كاملة،
+    والساعية إذا كانت الفترة وحدود الـ buckets على رأس الساعة. غير ذلك نقرأ القراءات الخام.
+    """
+    if is_local_midnight(start) and is_local_midnight(end):
+        return 'day'
+    if start.timestamp() % 3600 == 0 and end.timestamp() % 3600 == 0 and not (edges % 3600).any():
+        return 'hour'
+    return None
+
+
+def fetch_rollups(patient_id, start, end, resolution):
+    """
+    يجلب صفوف الـ rollup للفترة كمصفوفة: العمود الأول بداية الـ bucket بالثواني ثم ROLLUP_FIELDS.
+    """
+    tz = timezone.get_current_timezone()
+    if resolution == 'day':
+        rows = GlucoseDailyRollup.objects.filter(
+            patient_id=patient_id,
+            day__gte=timezone.localtime(start, tz).date(),
+            day__lt=timezone.localtime(end, tz).date(),
+        ).values_list('day', *ROLLUP_FIELDS)
+        rows = [(datetime.combine(day, time.min, tzinfo=tz).timestamp(), *rest) for day, *rest in rows]
+    else:
+        rows = GlucoseHourlyRollup.objects.filter(
+            patient_id=patient_id, hour__gte=start, hour__lt=end,
+        ).annotate(epoch=EpochSeconds('hour')).values_list('epoch', *ROLLUP_FIELDS)
+    return np.array(list(rows), dtype='f8').reshape(-1, len(ROLLUP_FIELDS) + 1)
+
+
+def aggregate_rollups(rows, edges):
+    """
+    نفس ناتج aggregate_readings لكن بدمج صفوف الـ rollup، فالتكلفة بعدد الـ buckets وليس بعدد القراءات.
+    """
+    size = len(edges) - 1
+    index = np.searchsorted(edges, rows[:, 0], side='right') - 1
+
+    def column(name):
+        return rows[:, 1 + ROLLUP_FIELDS.index(name)]
+
+    def total(name):
+        return np.bincount(index, weights=column(name), minlength=size)
+
+    minimum = np.full(size, np.inf)
+    maximum = np.full(size, -np.inf)
+    np.minimum.at(minimum, index, column('min_value'))
+    np.maximum.at(maximum, index, column('max_value'))
+    return {
+        'count': total('count').astype('i8'),
+        'total': total('total'),
+        'total_sq': total('total_sq'),
+        'min': minimum,
+        'max': maximum,
+        'below': total('below_count').astype('i8'),
+        'in_range': total('in_range_count').astype('i8'),
+        'above': total('above_count').astype('i8'),
+        'types': np.column_stack([total(field) for field in TYPE_COUNT_FIELDS]).astype('i8'),
+    }
+
+
+def summarize(count, total, total_sq, minimum, maximum, below, in_range, above, types):
+    """
+    يحول المجاميع إلى المؤشرات السريرية لـ bucket واحد.
+    GMI حسب Bergenstal 2018، و eA1c حسب معادلة ADAG (القيم بوحدة mg/dL).
+    """
+    count = int(count)
+    mean = float(total) / count
+    sd = max(float(total_sq) / count - mean * mean, 0.0) ** 0.5
+    return {
+        'count': count,
+        'mean': round(mean, 1),
+        'sd': round(sd, 1),
+        'cv': round(sd / mean * 100, 1) if mean else None,
+        'min': float(minimum),
+        'max': float(maximum),
+        'time_below_range': round(int(below) / count * 100, 1),
+        'time_in_range': round(int(in_range) / count * 100, 1),
+        'time_above_range': round(int(above) / count * 100, 1),
+        'gmi': round(3.31 + 0.02392 * mean, 2),
+        'estimated_hba1c': round((mean + 46.7) / 28.7, 2),
+        'reading_types': {code: int(n) for code, n in zip(READING_TYPES, types)},
+    }
+
+
+def summarize_buckets(aggregates, labels):
+    buckets = []
+    for i, label in enumerate(labels):
+        if aggregates['count'][i]:
+            bucket = {'start': label}
+            bucket.update(summarize(*(aggregates[key][i] for key in (
+                'count', 'total', 'total_sq', 'min', 'max', 'below', 'in_range', 'above', 'types'
+            ))))
+            buckets.append(bucket)
+    return buckets
+
+
+def summarize_total(aggregates):
+    if not aggregates['count'].sum():
+        return None
+    return summarize(
+        aggregates['count'].sum(), aggregates['total'].sum(), aggregates['total_sq'].sum(),
+        aggregates['min'].min(), aggregates['max'].max(),
+        aggregates['below'].sum(), aggregates['in_range'].sum(), aggregates['above'].sum(),
+        aggregates['types'].sum(axis=0),
+    )
+
+
+def glucose_statistics(patient_id, start, end, bucket):
+    """
+    إحصائيات السكر لكل يوم/أسبوع في الفترة [start, end) مع ملخص إجمالي.
+    """
+    edges, labels = bucket_edges(start, end, bucket)
+    resolution = rollup_resolution(start, end, edges)
+    if resolution:
+        aggregates = aggregate_rollups(fetch_rollups(patient_id, start, end, resolution), edges)
+    else:
+        aggregates = aggregate_readings(*fetch_patient_readings(patient_id, start, end), edges)
+    return {
+        'from': start,
+        'to': end,
+        'bucket': bucket,
+        'target_range': {'low': TARGET_LOW, 'high': TARGET_HIGH},
+        'summary': summarize_total(aggregates),
+        'buckets': summarize_buckets(aggregates, labels),
+    }
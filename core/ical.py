@@ -0,0 +1,111 @@
+# core/ical.py
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Appointment, DoctorProfile, DoctorSchedule
+from .slots import DEFAULT_APPOINTMENT_MINUTES
+
+# المفتاح يتضمن نسخة الحجوزات، فالنسخة القديمة لا تُقرأ بعد أي تغيير وتنتهي وحدها
+ICS_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+PRODUCT_ID = '-//Raha Sukari//Doctor bookings//AR'
+# RFC 5545: السطر لا يتجاوز 75 بايت، والباقي يكمل في سطر يبدأ بمسافة
+LINE_OCTETS = 75
+
+
+def touch_bookings(doctor_id):
+    """
+    يعلن تغير حجوزات الطبيب: الـ ETag يتغير والتقويم يُبنى من جديد عند الطلب التالي.
+    """
+    DoctorProfile.objects.filter(pk=doctor_id).update(bookings_version=F('bookings_version') + 1)
+
+
+def touch_patient_bookings(user):
+    """
+    اسم المريض يظهر في SUMMARY، فتغيره يغير تقويم كل طبيب له عنده موعد مؤكد.
+    """
+    DoctorProfile.objects.filter(
+        appointments__patient__user=user, appointments__status='Confirmed',
+    ).update(bookings_version=F('bookings_version') + 1)
+
+
+def bookings_etag(doctor_id, version):
+    return f'"bookings-{doctor_id}-{version}"'
+
+
+def escape(text):
+    return (
+        (text or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def fold(line):
+    encoded = line.encode('utf-8')
+    if len(encoded) <= LINE_OCTETS:
+        return line
+    parts = []
+    limit = LINE_OCTETS
+    while encoded:
+        cut = min(limit, len(encoded))
+        # لا نقسم حرفاً عربياً (أكثر من بايت) بين سطرين
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+        limit = LINE_OCTETS - 1
+    return '\r\n '.join(parts)
+
+
+def utc_stamp(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def appointment_minutes(periods, appointment):
+    """
+    مدة الموعد من فترة الجدول التي يقع فيها (مثل busy_intervals في slots)، و30 دقيقة خارج الفترات.
+    """
+    weekday = appointment.appointment_date.weekday()
+    for day, start, end, length in periods:
+        if day == weekday and start <= appointment.appointment_time < end:
+            return length
+    return DEFAULT_APPOINTMENT_MINUTES
+
+
+def render_bookings(doctor_id):
+    """
+    ملف iCalendar لكل مواعيد الطبيب المؤكدة (فهرس appointment_confirmed_idx).
+    """
+    tz = timezone.get_current_timezone()
+    periods = list(DoctorSchedule.objects.filter(doctor_id=doctor_id).values_list(
+        'weekday', 'start_time', 'end_time', 'slot_minutes'
+    ))
+    appointments = Appointment.objects.filter(doctor_id=doctor_id, status='Confirmed').select_related(
+        'patient__user'
+    ).order_by('appointment_date', 'appointment_time')
+    lines = ['BEGIN:VCALENDAR', 'VERSION:2.0', f'PRODID:{PRODUCT_ID}', 'CALSCALE:GREGORIAN', 'METHOD:PUBLISH']
+    for appointment in appointments.iterator():
+        start = datetime.combine(appointment.appointment_date, appointment.appointment_time, tzinfo=tz)
+        lines += [
+            'BEGIN:VEVENT',
+            f'UID:appointment-{appointment.pk}@raha-sukari',
+            f'DTSTAMP:{utc_stamp(appointment.updated_at)}',
+            f'DTSTART:{utc_stamp(start)}',
+            f'DTEND:{utc_stamp(start + timedelta(minutes=appointment_minutes(periods, appointment)))}',
+            f'SUMMARY:{escape(appointment.patient.user.get_full_name() or appointment.patient.user.username)}',
+        ]
+        if appointment.notes:
+            lines.append(f'DESCRIPTION:{escape(appointment.notes)}')
+        lines.append('END:VEVENT')
+    lines.append('END:VCALENDAR')
+    return '\r\n'.join(map(fold, lines)) + '\r\n'
+
+
+def bookings_calendar(doctor_id, version):
+    """
+    التقويم من الـ cache لنسخة الحجوزات الحالية، ويُبنى فقط بعد تغيرها.
+    """
+    return cache.get_or_set(f'bookings-ics:{doctor_id}:{version}', lambda: render_bookings(doctor_id), ICS_CACHE_TIMEOUT)
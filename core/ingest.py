@@ -0,0 +1,47 @@
+# core/ingest.py
+
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from .models import BloodGlucoseReading
+from .agp import invalidate_agp
+from .detection import process_new_readings
+from .rollups import apply_new_readings
+
+# عدد الصفوف في كل INSERT متعدد الصفوف
+BULK_CHUNK_SIZE = 500
+# الحد الأقصى لعدد القراءات في طلب مزامنة واحد
+MAX_BULK_ITEMS = 10000
+
+
+def validate_reading_batch(items, serializer):
+    """
+    يتحقق من دفعة قراءات باستخدام نسخة واحدة من الـ serializer (بدل إنشاء serializer لكل عنصر).
+    يرجع (valid, rejected) حيث valid قائمة (index, validated_data)
+    و rejected قائمة (index, errors).
+    """
+    valid = []
+    rejected = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            rejected.append((index, {'non_field_errors': ['Invalid JSON object.']}))
+            continue
+        try:
+            valid.append((index, serializer.run_validation(item)))
+        except ValidationError as exc:
+            rejected.append((index, exc.detail))
+    return valid, rejected
+
+
+def insert_readings(patient, validated_items, chunk_size=BULK_CHUNK_SIZE):
+    """
+    يحفظ القراءات المقبولة للمريض على شكل INSERT متعدد الصفوف مقسم إلى دفعات،
+    كلها داخل transaction واحدة، مع تحديث الـ rollups وكشف القراءات الخطرة (bulk_create لا يطلق signals).
+    """
+    readings = [BloodGlucoseReading(patient=patient, **data) for data in validated_items]
+    with transaction.atomic():
+        created = BloodGlucoseReading.objects.bulk_create(readings, batch_size=chunk_size)
+        apply_new_readings(created)
+        process_new_readings(patient, created)
+    invalidate_agp(patient.pk, [reading.reading_timestamp for reading in created])
+    return created
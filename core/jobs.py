@@ -0,0 +1,135 @@
+# core/jobs.py
+
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# kind -> الدالة التي تنفذ المهمة بـ payload كـ kwargs
+HANDLERS = {}
+CLAIM_BATCH_SIZE = 20
+# التأخير قبل المحاولة n: RETRY_BASE_SECONDS * 2^(n-1) ثانية (بحد أقصى RETRY_MAX_SECONDS) مع تفاوت عشوائي
+RETRY_BASE_SECONDS = 5
+RETRY_MAX_SECONDS = 60 * 60
+# مهمة قيد التنفيذ أطول من هذا تعتبر متروكة (worker توقف) وتُستلم من جديد
+LOCK_TIMEOUT = timedelta(minutes=10)
+# المهام المنتهية (done) أقدم من هذا تُحذف بـ purge_jobs، والـ dead تبقى للمراجعة
+JOB_RETENTION = timedelta(days=7)
+PURGE_CHUNK_SIZE = 1000
+
+
+def job(kind):
+    """
+    يسجل دالة كمنفذ لنوع مهمة: @job('notifications.create').
+    """
+    def register(function):
+        HANDLERS[kind] = function
+        return function
+    return register
+
+
+def enqueue(kind, **payload):
+    """
+    يضيف مهمة للطابور داخل الـ transaction الحالي: لا يراها أي worker إلا بعد COMMIT،
+    وإذا فشل الطلب وتراجع الـ transaction تختفي معه. payload يجب أن يكون JSON.
+    مع JOBS_RUN_EAGERLY تُنفذ المهمة مباشرة بعد COMMIT بدون جدول ولا workers (للتطوير).
+    """
+    if getattr(settings, 'JOBS_RUN_EAGERLY', False):
+        transaction.on_commit(lambda: HANDLERS[kind](**payload))
+        return None
+    return Job.objects.create(kind=kind, payload=payload)
+
+
+def retry_delay(attempts):
+    delay = min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def claim_jobs(limit=CLAIM_BATCH_SIZE):
+    """
+    يستلم حتى limit مهمة مستحقة (أو متروكة) ويعلمها running في transaction واحد.
+    على SQLite الـ transaction يبدأ بقفل الكتابة (BEGIN IMMEDIATE) فلا يستلم workerان نفس المهمة،
+    وعلى PostgreSQL يفعل ذلك select_for_update(skip_locked=True).
+    المهمة المتروكة في آخر محاولاتها تنتقل إلى dead بدل إعادتها: مهمة تُسقط الـ worker نفسه لا تُعاد للأبد.
+    """
+    now = timezone.now()
+    abandoned = Q(status=Job.RUNNING, locked_at__lt=now - LOCK_TIMEOUT)
+    due = Q(status=Job.QUEUED, run_at__lte=now) | abandoned
+    with transaction.atomic():
+        Job.objects.filter(abandoned, attempts__gte=F('max_attempts')).update(
+            status=Job.DEAD, locked_at=None, finished_at=now,
+            last_error='Worker stopped during the last attempt (lock timed out).',
+        )
+        ids = list(
+            Job.objects.select_for_update(skip_locked=True).filter(due).order_by('run_at', 'id').values_list('pk', flat=True)[:limit]
+        )
+        if not ids:
+            return []
+        Job.objects.filter(pk__in=ids).update(status=Job.RUNNING, locked_at=now, attempts=F('attempts') + 1)
+        return list(Job.objects.filter(pk__in=ids).order_by('run_at', 'id'))
+
+
+def run_job(claimed):
+    """
+    ينفذ مهمة مستلمة: تنجح (done) أو تُعاد جدولتها بتأخير متزايد أو تنتقل إلى dead بعد آخر محاولة.
+    """
+    handler = HANDLERS.get(claimed.kind)
+    try:
+        if handler is None:
+            raise LookupError(f'No handler registered for job kind {claimed.kind!r}.')
+        # المنفذ يعمل خارج أي transaction: الإرسال الخارجي البطيء لا يمسك قفل الكتابة عن باقي الـ workers
+        # والطلبات. إذا توقف الـ worker قبل تعليمها done تُعاد المهمة (at-least-once).
+        handler(**claimed.payload)
+    except Exception:
+        error = traceback.format_exc()
+        if handler is not None and claimed.attempts < claimed.max_attempts:
+            Job.objects.filter(pk=claimed.pk).update(
+                status=Job.QUEUED, run_at=timezone.now() + retry_delay(claimed.attempts), locked_at=None, last_error=error,
+            )
+        else:
+            logger.error('Job %s (%s) failed permanently after %s attempts', claimed.pk, claimed.kind, claimed.attempts)
+            Job.objects.filter(pk=claimed.pk).update(
+                status=Job.DEAD, locked_at=None, last_error=error, finished_at=timezone.now(),
+            )
+        return False
+    Job.objects.filter(pk=claimed.pk).update(status=Job.DONE, locked_at=None, finished_at=timezone.now())
+    return True
+
+
+def run_pending_jobs(limit=None):
+    """
+    ينفذ المهام المستحقة الآن حتى يفرغ الطابور (أو limit مهمة). يرجع (نجحت، فشلت).
+    """
+    succeeded = failed = 0
+    while limit is None or succeeded + failed < limit:
+        batch = claim_jobs(CLAIM_BATCH_SIZE if limit is None else min(CLAIM_BATCH_SIZE, limit - succeeded - failed))
+        if not batch:
+            break
+        for claimed in batch:
+            if run_job(claimed):
+                succeeded += 1
+            else:
+                failed += 1
+    return succeeded, failed
+
+
+def purge_jobs(before, chunk_size=PURGE_CHUNK_SIZE):
+    """
+    يحذف المهام المنتهية بنجاح قبل before على دفعات (DELETE قصير لكل دفعة)، حتى لا يكبر الجدول
+    بصف لكل إشعار. المهام الـ dead تبقى. يرجع عدد المحذوف.
+    """
+    deleted = 0
+    while True:
+        ids = list(Job.objects.filter(status=Job.DONE, finished_at__lt=before).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            return deleted
+        deleted += Job.objects.filter(pk__in=ids).delete()[0]
@@ -0,0 +1,40 @@
+# core/management/benchmark.py
+
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+
+@contextmanager
+def benchmark_database():
+    """
+    ينشئ قاعدة بيانات اختبار مؤقتة للـ benchmark حتى لا نلمس db.sqlite3،
+    ويحذفها بعد الانتهاء.
+    """
+    old_name = connection.settings_dict['NAME']
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+@contextmanager
+def timer():
+    """
+    يقيس الزمن المنقضي بالثواني: with timer() as elapsed: ... ثم elapsed()
+    """
+    start = time.perf_counter()
+    end = None
+
+    def elapsed():
+        return (end or time.perf_counter()) - start
+
+    try:
+        yield elapsed
+    finally:
+        end = time.perf_counter()
@@ -0,0 +1,149 @@
+# core/management/commands/archive_readings.py
+
+from datetime import timedelta
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from core.archive import EPOCH, load_segment, month_start, next_month, remove_generations, to_micros, write_segment
+from core.glucose import reading_type_code
+from core.models import BloodGlucoseReading, ReadingArchive
+
+# عدد الـ ids في كل DELETE
+DELETE_CHUNK_SIZE = 900
+
+
+def table_size(table):
+    """
+    حجم الجدول مع فهارسه بالبايت (SQLite dbstat).
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT COALESCE(SUM(pgsize), 0) FROM dbstat WHERE name = %s "
+            "OR name IN (SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = %s)",
+            [table, table],
+        )
+        return cursor.fetchone()[0]
+
+
+def archivable(cutoff):
+    # القراءات التي فيها ملاحظات تبقى في الجدول: ملفات الأرشيف أرقام فقط
+    return BloodGlucoseReading.objects.filter(reading_timestamp__lt=cutoff).filter(Q(notes__isnull=True) | Q(notes=''))
+
+
+def fetch_columns(readings):
+    """
+    أعمدة الأرشيف لمجموعة قراءات. الوقت يُحول من datetime مباشرة حتى لا نفقد الميكروثواني.
+    """
+    rows = readings.order_by('reading_timestamp', 'id').annotate(type_code=reading_type_code())
+    data = np.fromiter(
+        (
+            (pk, to_micros(timestamp), value, code)
+            for pk, timestamp, value, code in rows.values_list('id', 'reading_timestamp', 'reading_value', 'type_code').iterator(chunk_size=2000)
+        ),
+        dtype=[('id', 'i8'), ('ts', 'i8'), ('value', 'f8'), ('type', 'i1')],
+    )
+    return {name: data[name] for name in ('id', 'ts', 'value', 'type')}
+
+
+def delete_readings(ids):
+    """
+    DELETE مباشر بالـ SQL بدون signals ولا Collector: الـ rollups تبقى كما هي (الأرشيف جزء منها)،
+    ولا نريد tombstones للمزامنة لأن القراءات لم تُحذف فعلياً. لا جداول ترتبط بالقراءات بـ ForeignKey.
+    """
+    table = connection.ops.quote_name(BloodGlucoseReading._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE id IN ({", ".join(["%s"] * len(ids))})', ids)
+        return cursor.rowcount
+
+
+def archive_month(patient_id, month, readings):
+    """
+    ينقل قراءات شهر واحد لمريض إلى ملفات الأرشيف:
+    1. يكتب نسخة جديدة من ملفات الشهر (الأرشيف السابق + القراءات الجديدة، بدون تكرار حسب id)
+    2. في transaction واحدة: يعتمد النسخة الجديدة في ReadingArchive ويحذف القراءات من الجدول
+    3. يحذف الملفات القديمة
+    القارئ يتبع رقم النسخة في قاعدة البيانات، فلا يرى أبداً قراءة في الأرشيف والجدول معاً.
+    """
+    columns = fetch_columns(readings)
+    if not len(columns['id']):
+        return 0
+    segment = ReadingArchive.objects.filter(patient_id=patient_id, month=month).first()
+    if segment is not None:
+        previous = load_segment(segment)
+        keep = ~np.isin(previous['id'], columns['id'])
+        columns = {name: np.concatenate([np.asarray(previous[name])[keep], columns[name]]) for name in columns}
+        order = np.argsort(columns['ts'], kind='stable')
+        columns = {name: column[order] for name, column in columns.items()}
+    generation = segment.generation + 1 if segment else 1
+    write_segment(patient_id, month, generation, columns)
+
+    with transaction.atomic():
+        ReadingArchive.objects.update_or_create(
+            patient_id=patient_id, month=month,
+            defaults={
+                'generation': generation,
+                'count': len(columns['id']),
+                'first_timestamp': EPOCH + timedelta(microseconds=int(columns['ts'][0])),
+                'last_timestamp': EPOCH + timedelta(microseconds=int(columns['ts'][-1])),
+            },
+        )
+        moved = 0
+        archived_ids = columns['id'].tolist()
+        for start in range(0, len(archived_ids), DELETE_CHUNK_SIZE):
+            moved += delete_readings(archived_ids[start:start + DELETE_CHUNK_SIZE])
+    remove_generations(patient_id, month, keep=generation)
+    return moved
+
+
+class Command(BaseCommand):
+    help = 'Move glucose readings older than a cutoff into per-patient, per-month NumPy archive files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', help='Archive readings before this date (YYYY-MM-DD); rounded down to the first of the month.')
+        parser.add_argument('--months', type=int, default=12, help='Keep this many whole months live when --before is not given.')
+        parser.add_argument('--patient', type=int, action='append', help='Only archive these patient profile ids.')
+
+    def handle(self, *args, **options):
+        if options['before']:
+            day = parse_date(options['before'])
+            if day is None:
+                raise CommandError('--before must be a date (YYYY-MM-DD).')
+        else:
+            day = timezone.localdate().replace(day=1)
+            for _ in range(options['months']):
+                day = (day - timedelta(days=1)).replace(day=1)
+        # الأرشفة بأشهر كاملة فقط
+        cutoff = month_start(day)
+
+        size_before = table_size(BloodGlucoseReading._meta.db_table)
+        readings = archivable(cutoff)
+        if options['patient']:
+            readings = readings.filter(patient_id__in=options['patient'])
+        patient_ids = list(readings.order_by('patient_id').values_list('patient_id', flat=True).distinct())
+
+        moved = 0
+        for patient_id in patient_ids:
+            patient_readings = readings.filter(patient_id=patient_id)
+            first = patient_readings.order_by('reading_timestamp').values_list('reading_timestamp', flat=True).first()
+            month = timezone.localtime(first).date().replace(day=1)
+            while month_start(month) < cutoff:
+                end = month_start(next_month(month))
+                moved += archive_month(
+                    patient_id, month,
+                    patient_readings.filter(reading_timestamp__gte=month_start(month), reading_timestamp__lt=end),
+                )
+                month = next_month(month)
+            self.stdout.write(f'Patient {patient_id}: archived up to {cutoff:%Y-%m-%d}')
+
+        size_after = table_size(BloodGlucoseReading._meta.db_table)
+        self.stdout.write(
+            f'Moved {moved:,} readings from {len(patient_ids)} patients. '
+            f'Readings table + indexes: {size_before / 2**20:.1f} MiB -> {size_after / 2**20:.1f} MiB '
+            f'(run VACUUM to return the freed pages to the filesystem).'
+        )
+        self.stdout.write(self.style.SUCCESS('Archive complete.'))
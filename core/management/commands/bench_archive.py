@@ -0,0 +1,81 @@
+# core/management/commands/bench_archive.py
+
+import random
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.management.benchmark import benchmark_database, timer
+from core.management.commands.archive_readings import table_size
+from core.models import BloodGlucoseReading
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the glucose archive: table size and single-insert latency before and after archiving old readings.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patients', type=int, default=5)
+        parser.add_argument('--days', type=int, default=730, help='History per patient, one reading every 15 minutes.')
+        parser.add_argument('--inserts', type=int, default=300, help='Single POSTs used to measure insert latency.')
+        parser.add_argument('--bulk', type=int, default=20000, help='Rows inserted with bulk_create to measure index maintenance cost.')
+
+    def measure(self, client, patient, label, inserts, bulk):
+        # قراءة واحدة لكل طلب كل 5 دقائق (إيقاع جهاز القياس المستمر)، بعد آخر قراءة في المرحلة السابقة
+        with timer() as elapsed:
+            for _ in range(inserts):
+                self.clock += timedelta(minutes=5)
+                item = {'reading_value': round(random.uniform(60, 250), 1), 'reading_timestamp': self.clock.isoformat()}
+                client.post('/api/readings/bulk/', [item], format='json')
+        start = timezone.now() - timedelta(days=1)
+        rows = [
+            BloodGlucoseReading(patient=patient, reading_value=100, reading_timestamp=start + timedelta(seconds=i))
+            for i in range(bulk)
+        ]
+        with timer() as bulk_elapsed:
+            BloodGlucoseReading.objects.bulk_create(rows, batch_size=500)
+        with timer() as stats_elapsed:
+            response = client.get('/api/readings/stats/', {'from': '2000-01-01', 'bucket': 'week'})
+        assert response.status_code == 200, response.content
+        size = table_size(BloodGlucoseReading._meta.db_table)
+        self.stdout.write(
+            f'{label:<8} rows={BloodGlucoseReading.objects.count():>9,}  table+indexes={size / 2**20:8.1f} MiB  '
+            f'insert={elapsed() / inserts * 1000:6.2f} ms  bulk insert={bulk / bulk_elapsed():9,.0f} rows/s  '
+            f'stats(all history)={stats_elapsed() * 1000:7.1f} ms'
+        )
+
+    def handle(self, *args, **options):
+        archive_root = tempfile.mkdtemp(prefix='glucose_archive_')
+        try:
+            with override_settings(GLUCOSE_ARCHIVE_ROOT=archive_root), benchmark_database():
+                now = timezone.now()
+                points = options['days'] * 96
+                users = [User.objects.create(username=f'bench_patient_{i}') for i in range(options['patients'])]
+                for user in users:
+                    BloodGlucoseReading.objects.bulk_create(
+                        [
+                            BloodGlucoseReading(
+                                patient=user.patientprofile,
+                                reading_value=round(random.uniform(60, 250), 1),
+                                reading_timestamp=now - timedelta(minutes=15 * i),
+                            )
+                            for i in range(1, points + 1)
+                        ],
+                        batch_size=2000,
+                    )
+                call_command('rebuild_glucose_rollups', stdout=self.stdout)
+                client = APIClient()
+                client.force_authenticate(user=users[0])
+                self.clock = now
+
+                self.measure(client, users[0].patientprofile, 'before', options['inserts'], options['bulk'])
+                call_command('archive_readings', months=3, stdout=self.stdout)
+                self.measure(client, users[0].patientprofile, 'after', options['inserts'], options['bulk'])
+        finally:
+            shutil.rmtree(archive_root, ignore_errors=True)
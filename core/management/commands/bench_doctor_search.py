@@ -0,0 +1,102 @@
+# core/management/commands/bench_doctor_search.py
+
+import random
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from rest_framework.test import APIClient
+
+from core.management.benchmark import benchmark_database, timer
+from core.models import DoctorProfile
+from core.search import rebuild_doctor_index
+
+FIRST_NAMES = ['محمد', 'أحمد', 'فاطمة', 'مريم', 'خالد', 'سارة', 'يوسف', 'ليلى', 'Omar', 'Lina', 'Sami', 'Nour']
+LAST_NAMES = ['الحداد', 'النجار', 'عبد الله', 'الخطيب', 'حبوش', 'الشامي', 'Haddad', 'Khalil', 'Saleh', 'Nasser']
+SPECIALTIES = ['أمراض القلب', 'الغدد الصماء', 'طب الأطفال', 'طب العيون', 'الأمراض الباطنية', 'Endocrinology', 'Cardiology']
+CITIES = ['غزة', 'خان يونس', 'رفح', 'دير البلح', 'جباليا', 'Ramallah', 'Nablus']
+BIO_WORDS = [
+    'استشاري', 'أخصائي', 'علاج', 'السكري', 'الضغط', 'مضخات الأنسولين', 'التغذية', 'خبرة', 'سنوات',
+    'consultant', 'diabetes', 'insulin', 'pump', 'pediatric', 'nutrition', 'years', 'experience',
+]
+# (نص البحث، فلاتر إضافية)
+QUERIES = [
+    ('محمد', {}),
+    ('الخطيب', {}),
+    ('خطيب', {}),
+    ('قلب', {}),
+    ('السكري غزة', {}),
+    ('ins', {}),
+    ('Cardio', {'is_available': 'true'}),
+    ('مضخات', {'specialty': 'الغدد الصماء', 'is_available': 'true'}),
+    ('zzz', {}),
+    ('', {'specialty': 'طب العيون'}),
+    ('', {'specialty': 'طب العيون', 'is_available': 'true'}),
+]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark /api/doctors/?q= (FTS5 index) against an icontains scan on a large doctor directory.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=50000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        total = options['doctors']
+        repeat = options['repeat']
+        rng = random.Random(0)
+        with benchmark_database():
+            # bulk_create لا يمر على الـ signals، فالفهرس يُبنى مرة واحدة بعد الإدخال
+            users = User.objects.bulk_create(
+                (User(username=f'bench_doctor_{i}', first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES), is_staff=True)
+                 for i in range(total)),
+                batch_size=1000,
+            )
+            DoctorProfile.objects.bulk_create(
+                (DoctorProfile(
+                    user=user, specialty=rng.choice(SPECIALTIES), address=rng.choice(CITIES), phone_number='0590000000',
+                    bio=' '.join(rng.choices(BIO_WORDS, k=12)), is_available=rng.random() < 0.7,
+                ) for user in users),
+                batch_size=1000,
+            )
+            with timer() as elapsed:
+                rebuild_doctor_index()
+            self.stdout.write(f'Indexed {total:,} doctors in {elapsed():.2f}s')
+
+            doctor = DoctorProfile.objects.first()
+            with timer() as elapsed:
+                for i in range(repeat):
+                    doctor.bio = f'{doctor.bio} تحديث {i}'
+                    doctor.save()
+            self.stdout.write(f'Profile save incl. reindex: {elapsed() / repeat * 1000:.2f} ms\n')
+
+            client = APIClient()
+            client.force_authenticate(user=User.objects.create(username='bench_patient'))
+            self.stdout.write(f'{"query":<32} {"matches":>8} {"fts5 ms":>9} {"icontains ms":>13}')
+            for query, filters in QUERIES:
+                with timer() as fts_elapsed:
+                    for _ in range(repeat):
+                        response = client.get('/api/doctors/', {'q': query, **filters} if query else filters)
+                matches = response.json()['count']
+
+                scan = Q()
+                for word in query.split():
+                    scan &= (
+                        Q(user__first_name__icontains=word) | Q(user__last_name__icontains=word)
+                        | Q(specialty__icontains=word) | Q(bio__icontains=word) | Q(address__icontains=word)
+                    )
+                doctors = DoctorProfile.objects.filter(scan).select_related('user')
+                if 'specialty' in filters:
+                    doctors = doctors.filter(specialty=filters['specialty'])
+                if 'is_available' in filters:
+                    doctors = doctors.filter(is_available=True)
+                with timer() as scan_elapsed:
+                    for _ in range(repeat):
+                        doctors.count()
+                        list(doctors.order_by('pk')[:10])
+
+                label = query + ''.join(f' {key}={value}' for key, value in filters.items())
+                self.stdout.write(
+                    f'{label:<32} {matches:>8,} {fts_elapsed() / repeat * 1000:>9.2f} {scan_elapsed() / repeat * 1000:>13.2f}'
+                )
@@ -0,0 +1,56 @@
+# core/management/commands/bench_ingest.py
+
+import json
+import random
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.management.benchmark import benchmark_database, timer
+
+
+class Command(BaseCommand):
+    help = 'Benchmark glucose ingestion: one POST per reading vs. /api/readings/bulk/ (points per second).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--points', type=int, default=2000, help='Number of readings to ingest per path.')
+
+    def handle(self, *args, **options):
+        points = options['points']
+        with benchmark_database():
+            user = User.objects.create(username='bench_patient')
+            client = APIClient()
+            client.force_authenticate(user=user)
+
+            start = timezone.now() - timedelta(minutes=5 * points)
+            payload = [
+                {
+                    'reading_value': round(random.uniform(60, 250), 1),
+                    'reading_timestamp': (start + timedelta(minutes=5 * i)).isoformat(),
+                    'reading_type': 'Random',
+                }
+                for i in range(points)
+            ]
+
+            with timer() as single_elapsed:
+                for item in payload:
+                    client.post('/api/readings/', item, format='json')
+
+            with timer() as bulk_json_elapsed:
+                response = client.post('/api/readings/bulk/', payload, format='json')
+            assert response.status_code == 201, response.content
+
+            body = '\n'.join(json.dumps(item) for item in payload)
+            with timer() as bulk_ndjson_elapsed:
+                response = client.post('/api/readings/bulk/', body, content_type='application/x-ndjson')
+            assert response.status_code == 201, response.content
+
+        for label, elapsed in (
+            ('single POST', single_elapsed()),
+            ('bulk JSON', bulk_json_elapsed()),
+            ('bulk NDJSON', bulk_ndjson_elapsed()),
+        ):
+            self.stdout.write(f'{label:<12} {points} points in {elapsed:.3f}s -> {points / elapsed:,.0f} points/s')
@@ -0,0 +1,91 @@
+# core/management/commands/bench_jobs.py
+
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.jobs import HANDLERS
+from core.management.benchmark import benchmark_database, timer
+from core.models import Appointment, Job, Notification
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    return statistics.median(ordered) * 1000, ordered[int(len(ordered) * 0.95) - 1] * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark booking + respond request latency with notifications written inline (JOBS_RUN_EAGERLY) '
+        'vs. enqueued for run_workers, then the queue latency of draining the jobs.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=300)
+        parser.add_argument('--workers', type=int, default=4)
+        # زمن إرسال خارجي مفترض (push/SMS) لكل مهمة إشعار
+        parser.add_argument('--delivery-ms', type=float, default=0.0)
+
+    def handle(self, *args, **options):
+        total = options['requests']
+        with benchmark_database():
+            deliver = HANDLERS['notifications.create']
+            if options['delivery_ms']:
+                def slow_delivery(**payload):
+                    time.sleep(options['delivery_ms'] / 1000)
+                    return deliver(**payload)
+                HANDLERS['notifications.create'] = slow_delivery
+
+            doctor = User.objects.create(username='bench_doctor', first_name='Bench', is_staff=True)
+            patient = User.objects.create(username='bench_patient', first_name='Patient')
+            patient_client, doctor_client = APIClient(), APIClient()
+            patient_client.force_authenticate(user=patient)
+            doctor_client.force_authenticate(user=doctor)
+            first_day = timezone.localdate() + timedelta(days=1)
+
+            def book_and_respond(offset):
+                latencies = []
+                for i in range(offset, offset + total):
+                    payload = {
+                        'doctor': doctor.doctorprofile.pk,
+                        'appointment_date': first_day + timedelta(days=i // 48),
+                        'appointment_time': f'{i % 48 // 2:02d}:{i % 2 * 30:02d}',
+                    }
+                    with timer() as elapsed:
+                        patient_client.post('/api/appointments/', payload, format='json')
+                    latencies.append(elapsed())
+                    appointment_id = Appointment.objects.order_by('-id').values_list('pk', flat=True).first()
+                    with timer() as elapsed:
+                        doctor_client.post(f'/api/appointments/{appointment_id}/respond/', {'accepted': True}, format='json')
+                    latencies.append(elapsed())
+                return latencies
+
+            self.stdout.write(f'{"mode":<10} {"p50 ms":>8} {"p95 ms":>8}')
+            with override_settings(JOBS_RUN_EAGERLY=True):
+                inline = percentiles(book_and_respond(0))
+            self.stdout.write(f'{"inline":<10} {inline[0]:>8.2f} {inline[1]:>8.2f}')
+            queued = percentiles(book_and_respond(total))
+            self.stdout.write(f'{"queued":<10} {queued[0]:>8.2f} {queued[1]:>8.2f}')
+
+            backlog = Job.objects.filter(status=Job.QUEUED).count()
+            with timer() as elapsed:
+                call_command('run_workers', workers=options['workers'], once=True, stdout=self.stdout)
+            delays = [
+                (finished - created).total_seconds()
+                for created, finished in Job.objects.filter(status=Job.DONE).values_list('created_at', 'finished_at')
+            ]
+            p50, p95 = percentiles(delays)
+            self.stdout.write(
+                f'Drained {backlog:,} jobs with {options["workers"]} workers in {elapsed():.2f}s '
+                f'({backlog / elapsed():.0f} jobs/s); enqueue-to-done p50 {p50:.0f} ms, p95 {p95:.0f} ms '
+                f'(includes the time spent queued during the request phase)'
+            )
+            self.stdout.write(f'Notifications: {Notification.objects.count():,}')
+            HANDLERS['notifications.create'] = deliver
@@ -0,0 +1,61 @@
+# core/management/commands/bench_pagination.py
+
+import base64
+import json
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.management.benchmark import benchmark_database, timer
+from core.models import BloodGlucoseReading
+
+
+class Command(BaseCommand):
+    help = 'Benchmark page-N latency of /api/readings/ with page-number (OFFSET + COUNT) vs. cursor (keyset) pagination.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readings', type=int, default=200000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        total = options['readings']
+        repeat = options['repeat']
+        with benchmark_database():
+            user = User.objects.create(username='bench_patient')
+            patient = user.patientprofile
+            start = timezone.now() - timedelta(minutes=5 * total)
+            BloodGlucoseReading.objects.bulk_create(
+                (BloodGlucoseReading(patient=patient, reading_value=100 + i % 80, reading_timestamp=start + timedelta(minutes=5 * i))
+                 for i in range(total)),
+                batch_size=1000,
+            )
+            client = APIClient()
+            client.force_authenticate(user=user)
+            ordered = BloodGlucoseReading.objects.filter(patient=patient).order_by('-reading_timestamp', '-id')
+
+            self.stdout.write(f'{"page":>8} {"page-number ms":>15} {"cursor ms":>10}')
+            page_size = 10
+            page = 1
+            while (page - 1) * page_size < total:
+                with timer() as offset_elapsed:
+                    for _ in range(repeat):
+                        client.get('/api/readings/', {'page': page})
+
+                # الـ cursor الذي كان العميل سيحمله عند وصوله لهذه الصفحة
+                if page == 1:
+                    params = {'pagination': 'cursor'}
+                else:
+                    anchor = ordered[(page - 1) * page_size - 1]
+                    position = [anchor.reading_timestamp.isoformat(), anchor.id]
+                    params = {'cursor': base64.urlsafe_b64encode(json.dumps([position, False]).encode()).decode()}
+                with timer() as cursor_elapsed:
+                    for _ in range(repeat):
+                        client.get('/api/readings/', params)
+
+                self.stdout.write(
+                    f'{page:>8} {offset_elapsed() / repeat * 1000:>15.2f} {cursor_elapsed() / repeat * 1000:>10.2f}'
+                )
+                page *= 10
@@ -0,0 +1,70 @@
+# core/management/commands/bench_push.py
+
+import asyncio
+import statistics
+import time
+import tracemalloc
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from core.management.benchmark import benchmark_database
+from core.notifications import create_notifications
+from core.push import get_broker, reset_broker
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the notification push channel: memory per idle subscriber, and the time from creating one '
+        'notification per subscriber until every subscriber received it, for each broker.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=5000)
+        # الفترة التي كان العميل يعيد فيها طلب /api/notifications/ قبل push
+        parser.add_argument('--client-poll-seconds', type=float, default=5.0)
+
+    def handle(self, *args, **options):
+        total = options['connections']
+        with benchmark_database():
+            User.objects.bulk_create(User(username=f'push_{i}') for i in range(total))
+            user_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+            self.stdout.write(
+                f'Client polling every {options["client_poll_seconds"]:g}s: '
+                f'{total / options["client_poll_seconds"]:,.0f} queries/s for {total:,} clients; '
+                f'DatabaseBroker: 1-2 queries per PUSH_POLL_INTERVAL per process'
+            )
+            self.stdout.write(f'{"broker":<16} {"KiB/conn":>9} {"fan-out ms":>11} {"p50 ms":>8}')
+            for broker in ('LocalBroker', 'DatabaseBroker'):
+                with override_settings(PUSH_BROKER=f'core.push.{broker}', PUSH_POLL_INTERVAL=0.05):
+                    reset_broker()
+                    per_connection, fan_out, p50 = asyncio.run(self.measure(user_ids))
+                    reset_broker()
+                self.stdout.write(f'{broker:<16} {per_connection / 1024:>9.2f} {fan_out:>11.1f} {p50:>8.1f}')
+
+    async def measure(self, user_ids):
+        broker = get_broker()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        queues = [broker.subscribe(user_id) for user_id in user_ids]
+        received = []
+
+        async def idle(queue):
+            await queue.get()
+            received.append(time.perf_counter())
+
+        tasks = [asyncio.create_task(idle(queue)) for queue in queues]
+        await asyncio.sleep(0.1)
+        per_connection = (tracemalloc.get_traced_memory()[0] - before) / len(user_ids)
+        tracemalloc.stop()
+
+        rows = [[user_id, 'bench', None, None] for user_id in user_ids]
+        start = time.perf_counter()
+        await sync_to_async(create_notifications)(rows)
+        await asyncio.gather(*tasks)
+        for user_id, queue in zip(user_ids, queues):
+            broker.unsubscribe(user_id, queue)
+        latencies = [(at - start) * 1000 for at in received]
+        return per_connection, max(latencies), statistics.median(latencies)
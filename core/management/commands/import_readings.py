@@ -0,0 +1,264 @@
+# core/management/commands/import_readings.py
+
+import csv
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.agp import clear_agp
+from core.models import BloodGlucoseReading, PatientProfile
+from core.rollups import apply_new_readings
+
+# معامل التحويل المعتمد من mmol/L إلى mg/dL (الوزن الجزيئي للجلوكوز / 10)
+MMOL_TO_MGDL = 18.0182
+UNITS = {'mg/dl': 1.0, 'mgdl': 1.0, 'mmol/l': MMOL_TO_MGDL, 'mmol': MMOL_TO_MGDL}
+
+# الحقول التي يمكن ربطها بأعمدة الملف: --column value=Glucose
+FIELDS = ('patient', 'timestamp', 'value', 'unit', 'type', 'notes')
+DEFAULT_COLUMNS = {'patient': 'patient', 'timestamp': 'timestamp', 'value': 'value'}
+
+# طريقة التعرف على المريض من عمود patient
+PATIENT_LOOKUPS = {
+    'id': 'id',
+    'username': 'user__username',
+    'email': 'user__email',
+    'phone_number': 'phone_number',
+}
+
+
+def parse_chunk(chunk, config):
+    """
+    يحول مجموعة صفوف CSV إلى قراءات جاهزة للإدخال. لا يستخدم Django ولا قاعدة البيانات،
+    لذلك يمكن تشغيله في عملية منفصلة. يرجع (rows, rejects):
+    rows: (رقم السطر, الصف الأصلي, مفتاح المريض, الوقت, القيمة mg/dL, نوع القراءة, الملاحظات)
+    rejects: (رقم السطر, الصف الأصلي, سبب الرفض)
+    """
+    columns = config['columns']
+    tz = ZoneInfo(config['timezone'])
+    rows = []
+    rejects = []
+
+    def cell(row, field):
+        index = columns.get(field)
+        return row[index].strip() if index is not None and index < len(row) else ''
+
+    for line, row in chunk:
+        try:
+            patient = config['patient'] or cell(row, 'patient')
+            if not patient:
+                raise ValueError('missing patient')
+
+            raw_timestamp = cell(row, 'timestamp')
+            if config['timestamp_format']:
+                timestamp = datetime.strptime(raw_timestamp, config['timestamp_format'])
+            else:
+                timestamp = datetime.fromisoformat(raw_timestamp)
+            if timestamp.tzinfo is None:
+                timestamp = timestamp.replace(tzinfo=tz)
+
+            value = float(cell(row, 'value').replace(',', '.'))
+            unit = cell(row, 'unit').lower().replace(' ', '') or config['unit']
+            if unit not in UNITS:
+                raise ValueError(f'unknown unit {unit!r}')
+            value = round(value * UNITS[unit], 1)
+            if not 0 < value < config['max_value']:
+                raise ValueError(f'value out of range ({value} mg/dL)')
+
+            raw_type = cell(row, 'type').lower()
+            reading_type = config['types'].get(raw_type) if raw_type else 'Random'
+            if reading_type is None:
+                raise ValueError(f'unknown reading type {raw_type!r}')
+
+            rows.append((line, row, patient, timestamp, value, reading_type, cell(row, 'notes') or None))
+        except ValueError as exc:
+            rejects.append((line, row, str(exc)))
+    return rows, rejects
+
+
+def read_chunks(reader, size, first_line):
+    chunk = []
+    for line, row in enumerate(reader, start=first_line):
+        chunk.append((line, row))
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def parsed_chunks(chunks, config, workers):
+    """
+    يحلل الـ chunks بالترتيب، إما في نفس العملية أو موزعة على process pool.
+    في الـ pool لا نرسل أكثر من workers * 2 chunk في نفس الوقت حتى تبقى الذاكرة ثابتة.
+    """
+    if workers <= 1:
+        for chunk in chunks:
+            yield parse_chunk(chunk, config)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(parse_chunk, chunk, config))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class Command(BaseCommand):
+    help = 'Stream-import glucose readings from large CSV device exports (bulk_create, constant memory).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+', help='CSV files to import.')
+        parser.add_argument(
+            '--column', action='append', default=[], metavar='FIELD=HEADER',
+            help=f"Map a field ({', '.join(FIELDS)}) to a CSV header, e.g. --column value=Glucose. "
+                 f"Defaults: patient=patient, timestamp=timestamp, value=value.",
+        )
+        parser.add_argument('--patient', help='Import every row for this patient (overrides the patient column).')
+        parser.add_argument('--patient-field', choices=sorted(PATIENT_LOOKUPS), default='id', help='How the patient column identifies a PatientProfile.')
+        parser.add_argument('--unit', choices=['mg/dL', 'mmol/L'], default='mg/dL', help='Unit of rows without a unit column.')
+        parser.add_argument('--timestamp-format', help='strptime format for the timestamp column (default: ISO 8601).')
+        parser.add_argument('--timezone', default=settings.TIME_ZONE, help='Time zone of timestamps without an offset.')
+        parser.add_argument('--delimiter', default=',')
+        parser.add_argument('--encoding', default='utf-8-sig')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows per multi-row INSERT.')
+        parser.add_argument('--transaction-rows', type=int, default=50000, help='Rows per transaction.')
+        parser.add_argument('--workers', type=int, default=1, help='Parse rows in this many processes.')
+        parser.add_argument('--max-value', type=float, default=1000, help='Reject readings at or above this value (mg/dL).')
+        parser.add_argument('--rejects', help='Where to write rejected rows (default: <file>.rejects.csv next to each input).')
+
+    def handle(self, *args, **options):
+        mapping = dict(DEFAULT_COLUMNS)
+        for item in options['column']:
+            field, _, header = item.partition('=')
+            if field not in FIELDS or not header:
+                raise CommandError(f'Invalid --column {item!r}; expected FIELD=HEADER with FIELD in {", ".join(FIELDS)}.')
+            mapping[field] = header
+        if options['patient']:
+            mapping.pop('patient', None)
+
+        types = {}
+        for code, label in BloodGlucoseReading.READING_TYPE_CHOICES:
+            types[code.lower()] = code
+            types[code.lower().replace(' ', '_')] = code
+            types[label] = code
+        self.options = options
+        self.base_config = {
+            'patient': options['patient'],
+            'unit': options['unit'].lower(),
+            'timezone': options['timezone'],
+            'timestamp_format': options['timestamp_format'],
+            'max_value': options['max_value'],
+            'types': types,
+        }
+        self.lookup = PATIENT_LOOKUPS[options['patient_field']]
+        self.patients = {}
+
+        total_imported = total_rejected = 0
+        started = time.perf_counter()
+        for path in options['files']:
+            imported, rejected = self.import_file(path, mapping)
+            total_imported += imported
+            total_rejected += rejected
+        elapsed = time.perf_counter() - started
+
+        for patient_id in set(self.patients.values()) - {None}:
+            clear_agp(patient_id)
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {total_imported:,} readings, rejected {total_rejected:,} rows in {elapsed:.1f}s '
+            f'({(total_imported + total_rejected) / max(elapsed, 1e-9):,.0f} rows/s).'
+        ))
+
+    def import_file(self, path, mapping):
+        rejects_path = self.options['rejects'] or f'{path}.rejects.csv'
+        with open(path, newline='', encoding=self.options['encoding']) as source:
+            reader = csv.reader(source, delimiter=self.options['delimiter'])
+            header = next(reader, None)
+            if header is None:
+                raise CommandError(f'{path} is empty.')
+            header = [name.strip() for name in header]
+            missing = [name for name in mapping.values() if name not in header]
+            if missing:
+                raise CommandError(f"{path}: missing column(s) {', '.join(missing)}; found {', '.join(header)}.")
+            config = dict(self.base_config, columns={field: header.index(name) for field, name in mapping.items()})
+            # ملف المرفوضات يُفتح بعد التحقق من العناوين، فلا يبقى ملف فارغ لملف لم يُستورد
+            with open(rejects_path, 'w', newline='', encoding='utf-8') as rejects_file:
+                imported, rejected = self.import_rows(path, reader, config, header, rejects_file)
+
+        if not rejected:
+            os.remove(rejects_path)
+        else:
+            self.stdout.write(self.style.WARNING(f'{path}: {rejected:,} rejected rows written to {rejects_path}'))
+        return imported, rejected
+
+    def import_rows(self, path, reader, config, header, rejects_file):
+        """
+        يحلل صفوف الملف ويحفظها على دفعات، ويكتب الصفوف المرفوضة مع السبب في rejects_file.
+        """
+        rejects = csv.writer(rejects_file)
+        rejects.writerow(['line', 'error'] + header)
+
+        imported = rejected = 0
+        pending = []
+        started = time.perf_counter()
+        chunks = read_chunks(reader, self.options['batch_size'], first_line=2)
+        for rows, chunk_rejects in parsed_chunks(chunks, config, self.options['workers']):
+            readings, unknown = self.build_readings(rows)
+            chunk_rejects.extend(unknown)
+            for line, row, error in chunk_rejects:
+                rejects.writerow([line, error] + list(row))
+            rejected += len(chunk_rejects)
+            pending.extend(readings)
+            if len(pending) >= self.options['transaction_rows']:
+                imported += self.save(pending)
+                pending = []
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f'{path}: {imported:,} imported, {rejected:,} rejected ({imported / elapsed:,.0f} rows/s)')
+        imported += self.save(pending)
+        return imported, rejected
+
+    def build_readings(self, rows):
+        """
+        يربط مفاتيح المرضى في الـ chunk بـ PatientProfile (استعلام واحد للمفاتيح الجديدة فقط).
+        """
+        keys = {patient for _, _, patient, *_ in rows if patient not in self.patients}
+        if keys:
+            lookup_keys = {key for key in keys if key.isdigit()} if self.lookup == 'id' else keys
+            found = {
+                str(key): patient_id for key, patient_id in
+                PatientProfile.objects.filter(**{f'{self.lookup}__in': lookup_keys}).values_list(self.lookup, 'id')
+            }
+            for key in keys:
+                self.patients[key] = found.get(key)
+        readings = []
+        unknown = []
+        for line, row, patient, timestamp, value, reading_type, notes in rows:
+            patient_id = self.patients[patient]
+            if patient_id is None:
+                unknown.append((line, row, f'unknown patient {patient!r}'))
+                continue
+            readings.append(BloodGlucoseReading(
+                patient_id=patient_id, reading_timestamp=timestamp, reading_value=value,
+                reading_type=reading_type, notes=notes,
+            ))
+        return readings, unknown
+
+    def save(self, readings):
+        """
+        transaction واحدة لكل دفعة كبيرة: INSERT متعدد الصفوف + تحديث الـ rollups.
+        لا تمر القراءات التاريخية على كشف القراءات الخطرة حتى لا تصل تنبيهات قديمة للمرضى والأطباء.
+        """
+        if not readings:
+            return 0
+        with transaction.atomic():
+            created = BloodGlucoseReading.objects.bulk_create(readings, batch_size=self.options['batch_size'])
+            apply_new_readings(created)
+        return len(created)
@@ -0,0 +1,20 @@
+# core/management/commands/purge_jobs.py
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.jobs import JOB_RETENTION, purge_jobs
+
+
+class Command(BaseCommand):
+    help = 'Delete finished (done) background jobs older than the retention age. Dead jobs are kept for review.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=JOB_RETENTION.days)
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['days'])
+        deleted = purge_jobs(before)
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted:,} finished jobs older than {before:%Y-%m-%d}.'))
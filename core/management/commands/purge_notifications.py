@@ -0,0 +1,58 @@
+# core/management/commands/purge_notifications.py
+
+import gzip
+import json
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from core.management.commands.archive_readings import table_size
+from core.models import Notification
+from core.notifications import PURGE_CHUNK_SIZE, purge_read_notifications
+
+ARCHIVE_FIELDS = ('id', 'recipient_id', 'kind', 'count', 'message', 'timestamp', 'content_type_id', 'object_id')
+
+
+def archive_writer(path):
+    """
+    يضيف كل دفعة إلى ملف JSON lines مضغوط (gzip يقبل الإضافة لملف موجود). كل سطر فيه id الإشعار،
+    فالتكرار بعد تشغيل توقف قبل الحذف يمكن إزالته عند القراءة.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def archive(notifications):
+        with gzip.open(path, 'at', encoding='utf-8') as output:
+            for row in notifications.order_by('pk').values(*ARCHIVE_FIELDS).iterator():
+                output.write(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n')
+    return archive
+
+
+class Command(BaseCommand):
+    help = 'Delete read notifications older than the retention age in short chunked transactions, optionally archiving them first.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.NOTIFICATION_RETENTION_DAYS, help='Keep read notifications newer than this.')
+        parser.add_argument('--chunk-size', type=int, default=PURGE_CHUNK_SIZE)
+        parser.add_argument('--archive', action='store_true', help='Append the rows to a .jsonl.gz file under NOTIFICATION_ARCHIVE_ROOT first.')
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['days'])
+        archive = None
+        if options['archive']:
+            path = os.path.join(settings.NOTIFICATION_ARCHIVE_ROOT, f'notifications-{timezone.localdate():%Y-%m-%d}.jsonl.gz')
+            archive = archive_writer(path)
+            self.stdout.write(f'Archiving to {path}')
+
+        size_before = table_size(Notification._meta.db_table)
+        deleted = purge_read_notifications(before, options['chunk_size'], archive)
+        size_after = table_size(Notification._meta.db_table)
+        self.stdout.write(
+            f'Deleted {deleted:,} read notifications older than {before:%Y-%m-%d %H:%M}. '
+            f'Notifications table + indexes: {size_before / 2**20:.1f} MiB -> {size_after / 2**20:.1f} MiB '
+            f'(run VACUUM to return the freed pages to the filesystem).'
+        )
+        self.stdout.write(self.style.SUCCESS('Purge complete.'))
@@ -0,0 +1,18 @@
+# core/management/commands/purge_sync_tombstones.py
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.sync import TOMBSTONE_RETENTION, purge_tombstones
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete sync tombstones older than TOMBSTONE_RETENTION. Sync tokens older than that are already rejected, '
+        'so clients holding them fall back to a full snapshot and never miss a deletion.'
+    )
+
+    def handle(self, *args, **options):
+        before = timezone.now() - TOMBSTONE_RETENTION
+        deleted = purge_tombstones(before)
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted:,} sync tombstones older than {before:%Y-%m-%d}.'))
@@ -0,0 +1,23 @@
+# core/management/commands/rebuild_glucose_rollups.py
+
+from django.core.management.base import BaseCommand
+
+from core.models import PatientProfile
+from core.rollups import rebuild_patients
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the hourly and daily glucose rollup tables from the raw readings, a chunk of patients at a time.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patient', type=int, action='append', help='Only rebuild these patient profile ids.')
+        parser.add_argument('--chunk-size', type=int, default=100, help='Patients per transaction.')
+
+    def handle(self, *args, **options):
+        patient_ids = options['patient'] or list(PatientProfile.objects.order_by('id').values_list('id', flat=True))
+        chunk_size = options['chunk_size']
+        for start in range(0, len(patient_ids), chunk_size):
+            chunk = patient_ids[start:start + chunk_size]
+            rebuild_patients(chunk)
+            self.stdout.write(f'Rebuilt rollups for {start + len(chunk)}/{len(patient_ids)} patients')
+        self.stdout.write(self.style.SUCCESS('Glucose rollups rebuilt.'))
@@ -0,0 +1,20 @@
+# core/management/commands/reconcile_doctor_ratings.py
+
+from django.core.management.base import BaseCommand
+
+from core.ratings import reconcile_ratings
+
+
+class Command(BaseCommand):
+    help = 'Recompute doctor rating totals, counts and averages from the reviews table and fix any drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctor', type=int, action='append', help='Only reconcile these doctor profile ids.')
+
+    def handle(self, *args, **options):
+        fixed = reconcile_ratings(options['doctor'])
+        if fixed:
+            shown = ', '.join(map(str, fixed[:20])) + (' ...' if len(fixed) > 20 else '')
+            self.stdout.write(self.style.WARNING(f'Fixed rating drift for {len(fixed)} doctor(s): {shown}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Doctor ratings are consistent.'))
@@ -0,0 +1,20 @@
+# core/management/commands/reconcile_unread_counts.py
+
+from django.core.management.base import BaseCommand
+
+from core.notifications import reconcile_unread_counts
+
+
+class Command(BaseCommand):
+    help = 'Recompute per-user unread notification counters from the notifications table and fix any drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', help='Only reconcile these user ids.')
+
+    def handle(self, *args, **options):
+        fixed = reconcile_unread_counts(options['user'])
+        if fixed:
+            shown = ', '.join(map(str, fixed[:20])) + (' ...' if len(fixed) > 20 else '')
+            self.stdout.write(self.style.WARNING(f'Fixed unread counter drift for {len(fixed)} user(s): {shown}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Unread notification counters are consistent.'))
@@ -0,0 +1,56 @@
+# core/management/commands/run_workers.py
+
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.jobs import CLAIM_BATCH_SIZE, claim_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = 'Run background job workers (core.jobs) until stopped, or drain the queue once with --once.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Number of worker threads.')
+        parser.add_argument('--batch', type=int, default=CLAIM_BATCH_SIZE, help='Jobs claimed per round trip.')
+        parser.add_argument('--poll', type=float, default=1.0, help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--once', action='store_true', help='Exit once no job is due.')
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        totals = {'done': 0, 'failed': 0}
+        lock = threading.Lock()
+
+        def work():
+            try:
+                while not stop.is_set():
+                    batch = claim_jobs(options['batch'])
+                    if not batch:
+                        if options['once']:
+                            return
+                        stop.wait(options['poll'])
+                        continue
+                    for claimed in batch:
+                        succeeded = run_job(claimed)
+                        with lock:
+                            totals['done' if succeeded else 'failed'] += 1
+            finally:
+                # كل thread له اتصال خاص بقاعدة البيانات
+                connection.close()
+
+        # SIGTERM (systemd, docker stop) مثل Ctrl+C: يكمل كل worker الدفعة التي استلمها ثم يتوقف
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        threads = [threading.Thread(target=work, name=f'job-worker-{i}') for i in range(options['workers'])]
+        for thread in threads:
+            thread.start()
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        self.stdout.write(f"Jobs done: {totals['done']:,}, failed: {totals['failed']:,}")
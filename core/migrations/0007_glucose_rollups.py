@@ -0,0 +1,58 @@
+# Generated by Django 5.2.4 on 2026-10-16 22:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_alter_appointment_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GlucoseDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.FloatField(default=0)),
+                ('total_sq', models.FloatField(default=0)),
+                ('min_value', models.FloatField(blank=True, null=True)),
+                ('max_value', models.FloatField(blank=True, null=True)),
+                ('below_count', models.PositiveIntegerField(default=0)),
+                ('in_range_count', models.PositiveIntegerField(default=0)),
+                ('above_count', models.PositiveIntegerField(default=0)),
+                ('fasting_count', models.PositiveIntegerField(default=0)),
+                ('after_meal_count', models.PositiveIntegerField(default=0)),
+                ('random_count', models.PositiveIntegerField(default=0)),
+                ('day', models.DateField(verbose_name='اليوم')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_glucose_rollups', to='core.patientprofile')),
+            ],
+            options={
+                'unique_together': {('patient', 'day')},
+            },
+        ),
+        migrations.CreateModel(
+            name='GlucoseHourlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.FloatField(default=0)),
+                ('total_sq', models.FloatField(default=0)),
+                ('min_value', models.FloatField(blank=True, null=True)),
+                ('max_value', models.FloatField(blank=True, null=True)),
+                ('below_count', models.PositiveIntegerField(default=0)),
+                ('in_range_count', models.PositiveIntegerField(default=0)),
+                ('above_count', models.PositiveIntegerField(default=0)),
+                ('fasting_count', models.PositiveIntegerField(default=0)),
+                ('after_meal_count', models.PositiveIntegerField(default=0)),
+                ('random_count', models.PositiveIntegerField(default=0)),
+                ('hour', models.DateTimeField(verbose_name='بداية الساعة')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_glucose_rollups', to='core.patientprofile')),
+            ],
+            options={
+                'unique_together': {('patient', 'hour')},
+            },
+        ),
+    ]
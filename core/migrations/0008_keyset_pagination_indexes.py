@@ -0,0 +1,44 @@
+# Generated by Django 5.2.4 on 2026-10-16 22:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('core', '0007_glucose_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attachment',
+            index=models.Index(fields=['patient', 'uploaded_at', 'id'], name='attachment_patient_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attachment',
+            index=models.Index(fields=['uploaded_at', 'id'], name='attachment_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bloodglucosereading',
+            index=models.Index(fields=['patient', 'reading_timestamp', 'id'], name='reading_patient_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bloodglucosereading',
+            index=models.Index(fields=['reading_timestamp', 'id'], name='reading_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='doctornote',
+            index=models.Index(fields=['patient', 'timestamp', 'id'], name='doctornote_patient_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='doctornote',
+            index=models.Index(fields=['timestamp', 'id'], name='doctornote_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', 'timestamp', 'id'], name='notification_recipient_ts_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GlucoseTarget',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('low', models.FloatField(verbose_name='الحد الأدنى (mg/dL)')),
+                ('high', models.FloatField(verbose_name='الحد الأعلى (mg/dL)')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('patient', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='glucose_target', to='core.patientprofile')),
+                ('set_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='glucose_targets_set', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'النطاق المستهدف',
+                'verbose_name_plural': 'النطاقات المستهدفة',
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_sync_updated_at_and_tombstones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadingArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='أول يوم في الشهر')),
+                ('generation', models.PositiveIntegerField(default=1)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('first_timestamp', models.DateTimeField()),
+                ('last_timestamp', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now=True)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reading_archives', to='core.patientprofile')),
+            ],
+            options={
+                'verbose_name': 'أرشيف قراءات',
+                'verbose_name_plural': 'أرشيف القراءات',
+                'unique_together': {('patient', 'month')},
+            },
+        ),
+    ]
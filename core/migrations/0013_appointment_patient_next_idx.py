@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_reading_archive'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('status', 'Confirmed')), fields=['patient', 'doctor', 'appointment_date', 'appointment_time'], name='appointment_patient_next_idx'),
+        ),
+    ]
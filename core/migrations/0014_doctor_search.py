@@ -0,0 +1,85 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:39
+
+import re
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# prefix='1 2 3': فهارس بادئات جاهزة حتى لا يمر البحث بـ "ق*" أو "card*" على كل المفردات
+CREATE_SEARCH_TABLE = """
+CREATE VIRTUAL TABLE core_doctorsearch USING fts5(
+    name, specialty, bio, address,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '1 2 3'
+)
+"""
+
+
+# نسخة مجمدة من توحيد النص في core.search وقت كتابة هذا الـ migration: الـ migration لا يستورد كوداً حياً
+# قد يتغير لاحقاً. إذا تغير التوحيد في core.search يُعاد بناء الفهرس بـ rebuild_doctor_index.
+ARABIC_MARKS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+ARABIC_LETTERS = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي', 'ؤ': 'و', 'ة': 'ه',
+})
+ARABIC_ARTICLES = ('وال', 'بال', 'كال', 'فال', 'لل', 'ال')
+WORD = re.compile(r'\w+')
+
+
+def document_text(text):
+    text = ARABIC_MARKS.sub('', (text or '').lower()).translate(ARABIC_LETTERS)
+    words = WORD.findall(text)
+    stems = []
+    for word in words:
+        for article in ARABIC_ARTICLES:
+            if word.startswith(article) and len(word) - len(article) >= 2:
+                word = word[len(article):]
+                break
+        if word not in words and word not in stems:
+            stems.append(word)
+    return ' '.join([text] + stems)
+
+
+def build_search_index(apps, schema_editor):
+    # يملأ الفهرس بالأطباء الحاليين ويحفظ أوزان bm25 (الاسم، التخصص، النبذة، العنوان) في إعدادات الجدول
+    DoctorProfile = apps.get_model('core', 'DoctorProfile')
+    rows = DoctorProfile.objects.order_by('pk').values_list(
+        'pk', 'user__first_name', 'user__last_name', 'specialty', 'bio', 'address'
+    )
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("INSERT INTO core_doctorsearch (core_doctorsearch, rank) VALUES ('rank', 'bm25(10.0, 5.0, 1.0, 2.0)')")
+        cursor.executemany(
+            'INSERT INTO core_doctorsearch (rowid, name, specialty, bio, address) VALUES (%s, %s, %s, %s, %s)',
+            [
+                (pk, document_text(f'{first_name} {last_name}'), document_text(specialty),
+                 document_text(bio), document_text(address))
+                for pk, first_name, last_name, specialty, bio, address in rows.iterator(chunk_size=1000)
+            ],
+        )
+        cursor.execute("INSERT INTO core_doctorsearch (core_doctorsearch) VALUES ('optimize')")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_appointment_patient_next_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_SEARCH_TABLE, 'DROP TABLE core_doctorsearch'),
+        migrations.CreateModel(
+            name='DoctorSearch',
+            fields=[
+                ('doctor', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='core.doctorprofile')),
+                ('document', models.TextField(db_column='core_doctorsearch')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'core_doctorsearch',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
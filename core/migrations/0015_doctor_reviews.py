@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:44
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_doctor_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorReview',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rating', models.PositiveSmallIntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(5)], verbose_name='التقييم')),
+                ('comment', models.TextField(blank=True, null=True, verbose_name='التعليق')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'تقييم طبيب',
+                'verbose_name_plural': 'تقييمات الأطباء',
+            },
+        ),
+        migrations.AddField(
+            model_name='doctorprofile',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='عدد التقييمات'),
+        ),
+        migrations.AddField(
+            model_name='doctorprofile',
+            name='rating_total',
+            field=models.PositiveIntegerField(default=0, verbose_name='مجموع التقييمات'),
+        ),
+        migrations.AddIndex(
+            model_name='doctorprofile',
+            index=models.Index(fields=['average_rating', 'rating_count'], name='doctor_rating_idx'),
+        ),
+        migrations.AddField(
+            model_name='doctorreview',
+            name='doctor',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reviews', to='core.doctorprofile'),
+        ),
+        migrations.AddField(
+            model_name='doctorreview',
+            name='patient',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='doctor_reviews', to='core.patientprofile'),
+        ),
+        migrations.AddIndex(
+            model_name='doctorreview',
+            index=models.Index(fields=['doctor', 'created_at'], name='review_doctor_created_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='doctorreview',
+            unique_together={('patient', 'doctor')},
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:47
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_favorites(apps, schema_editor):
+    # يملأ العداد من المفضلة الموجودة بـ UPDATE واحد
+    DoctorProfile = apps.get_model('core', 'DoctorProfile')
+    FavoriteDoctor = apps.get_model('core', 'FavoriteDoctor')
+    favorites = FavoriteDoctor.objects.filter(doctor=OuterRef('pk')).order_by().values('doctor').annotate(value=Count('id')).values('value')
+    DoctorProfile.objects.update(favorites_count=Coalesce(Subquery(favorites), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_doctor_reviews'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctorprofile',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='عدد مرات الإضافة للمفضلة'),
+        ),
+        migrations.RunPython(count_favorites, migrations.RunPython.noop),
+    ]
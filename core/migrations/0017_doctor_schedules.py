@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:48
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_doctorprofile_favorites_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'الاثنين'), (1, 'الثلاثاء'), (2, 'الأربعاء'), (3, 'الخميس'), (4, 'الجمعة'), (5, 'السبت'), (6, 'الأحد')], verbose_name='اليوم')),
+                ('start_time', models.TimeField(verbose_name='من')),
+                ('end_time', models.TimeField(verbose_name='إلى')),
+                ('slot_minutes', models.PositiveSmallIntegerField(default=30, validators=[django.core.validators.MinValueValidator(5), django.core.validators.MaxValueValidator(240)], verbose_name='مدة الموعد (دقائق)')),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='schedules', to='core.doctorprofile')),
+            ],
+            options={
+                'verbose_name': 'فترة عمل',
+                'verbose_name_plural': 'جدول العمل',
+                'ordering': ['weekday', 'start_time'],
+                'indexes': [models.Index(fields=['doctor', 'weekday', 'start_time'], name='schedule_doctor_day_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ScheduleException',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='التاريخ')),
+                ('start_time', models.TimeField(blank=True, null=True, verbose_name='من')),
+                ('end_time', models.TimeField(blank=True, null=True, verbose_name='إلى')),
+                ('reason', models.CharField(blank=True, max_length=255, verbose_name='السبب')),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='schedule_exceptions', to='core.doctorprofile')),
+            ],
+            options={
+                'verbose_name': 'استثناء من الجدول',
+                'verbose_name_plural': 'استثناءات الجدول',
+                'ordering': ['date', 'start_time'],
+                'indexes': [models.Index(fields=['doctor', 'date'], name='schedule_exception_date_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:51
+
+from django.db import migrations, models
+
+
+def reject_double_bookings(apps, schema_editor):
+    # حجوزات مكررة سابقة على نفس الموعد: يبقى المؤكد (أو الأقدم) ويُرفض الباقي حتى يُنشأ القيد
+    Appointment = apps.get_model('core', 'Appointment')
+    # 'Confirmed' قبل 'Pending' أبجدياً، فأول صف لكل موعد هو الذي يبقى
+    rows = Appointment.objects.filter(status__in=['Pending', 'Confirmed']).order_by(
+        'doctor', 'appointment_date', 'appointment_time', 'status', 'id',
+    ).values_list('id', 'doctor', 'appointment_date', 'appointment_time')
+    rejected = []
+    previous = None
+    for pk, *slot in rows.iterator():
+        if slot == previous:
+            rejected.append(pk)
+        previous = slot
+    Appointment.objects.filter(id__in=rejected).update(status='Rejected')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_doctor_schedules'),
+    ]
+
+    operations = [
+        migrations.RunPython(reject_double_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['Pending', 'Confirmed'])), fields=('doctor', 'appointment_date', 'appointment_time'), name='appointment_active_slot_uniq'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:58
+
+import core.models
+from django.db import migrations, models
+
+
+def issue_calendar_tokens(apps, schema_editor):
+    # default يُحسب مرة واحدة لكل الصفوف الموجودة في AddField، فكل طبيب يأخذ رمزه هنا قبل قيد unique
+    DoctorProfile = apps.get_model('core', 'DoctorProfile')
+    doctors = list(DoctorProfile.objects.only('pk'))
+    for doctor in doctors:
+        doctor.calendar_token = core.models.new_calendar_token()
+    DoctorProfile.objects.bulk_update(doctors, ['calendar_token'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_appointment_active_slot_uniq'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctorprofile',
+            name='bookings_version',
+            field=models.PositiveIntegerField(default=0, verbose_name='نسخة الحجوزات'),
+        ),
+        migrations.AddField(
+            model_name='doctorprofile',
+            name='calendar_token',
+            field=models.CharField(max_length=64, null=True, verbose_name='رمز التقويم'),
+        ),
+        migrations.RunPython(issue_calendar_tokens, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='doctorprofile',
+            name='calendar_token',
+            field=models.CharField(default=core.models.new_calendar_token, max_length=64, unique=True, verbose_name='رمز التقويم'),
+        ),
+    ]
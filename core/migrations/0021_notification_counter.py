@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_unread(apps, schema_editor):
+    # يملأ العدادات من الإشعارات غير المقروءة (فهرس notification_unread_idx)
+    Notification = apps.get_model('core', 'Notification')
+    NotificationCounter = apps.get_model('core', 'NotificationCounter')
+    unread = Notification.objects.filter(is_read=False).order_by().values('recipient').annotate(value=Count('id'))
+    NotificationCounter.objects.bulk_create(
+        (NotificationCounter(user_id=row['recipient'], unread=row['value']) for row in unread.iterator()), batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0020_job_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='notification_counter', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='المستخدم')),
+                ('unread', models.PositiveIntegerField(default=0, verbose_name='غير المقروءة')),
+            ],
+            options={
+                'verbose_name': 'عداد الإشعارات',
+                'verbose_name_plural': 'عدادات الإشعارات',
+            },
+        ),
+        migrations.RunPython(count_unread, migrations.RunPython.noop),
+    ]
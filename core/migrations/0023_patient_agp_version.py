@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_notification_digest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patientprofile',
+            name='agp_version',
+            field=models.PositiveIntegerField(default=0, verbose_name='نسخة الـ AGP'),
+        ),
+    ]
@@ -4,9 +4,11 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 import os
+import secrets
 from django.utils import timezone
 
 # --- دوال المسارات تبقى كما هي ---
@@ -20,6 +22,9 @@ def attachment_file_path(instance, filename):
     return f'attachments/patient_{instance.patient.id}/{filename}'
 
 
+def new_calendar_token():
+    return secrets.token_urlsafe(32)
+
 class DoctorProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='doctorprofile')
     specialty = models.CharField(max_length=255, verbose_name="التخصص")
@@ -28,13 +33,43 @@ class DoctorProfile(models.Model):
     bio = models.TextField(blank=True, null=True, verbose_name="نبذة عن الطبيب")
     working_hours = models.TextField(blank=True, null=True, verbose_name="ساعات العمل")
     average_rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.00, verbose_name="متوسط التقييم")
+    # مجموع وعدد التقييمات: تُحدّث مع كل تقييم بـ UPDATE واحد (core.ratings) ومنهما يُحسب average_rating
+    rating_total = models.PositiveIntegerField(default=0, verbose_name="مجموع التقييمات")
+    rating_count = models.PositiveIntegerField(default=0, verbose_name="عدد التقييمات")
+    # عدد المرضى الذين أضافوا الطبيب للمفضلة: يُحدّث بـ F() في favorite/unfavorite بدل COUNT لكل طبيب
+    favorites_count = models.PositiveIntegerField(default=0, verbose_name="عدد مرات الإضافة للمفضلة")
+    # رابط تقويم الحجوزات (bookings.ics) يُفتح بهذا الرمز بدل تسجيل الدخول، ويمكن تغييره لإلغاء الرابط القديم
+    calendar_token = models.CharField(max_length=64, unique=True, default=new_calendar_token, verbose_name="رمز التقويم")
+    # يزيد مع كل تغيير في حجوزات الطبيب: منه الـ ETag ومفتاح نسخة التقويم المخزنة (core.ical)
+    bookings_version = models.PositiveIntegerField(default=0, verbose_name="نسخة الحجوزات")
     is_available = models.BooleanField(default=True, verbose_name="متاح الآن")
 
     patients = models.ManyToManyField('PatientProfile', related_name='doctors', blank=True)
 
+    class Meta:
+        indexes = [
+            # ترتيب دليل الأطباء بالتقييم (?ordering=-average_rating) يقرأ الفهرس بدل ترتيب مؤقت
+            models.Index(fields=['average_rating', 'rating_count'], name='doctor_rating_idx'),
+        ]
+
     def __str__(self):
         return f"Dr. {self.user.first_name} {self.user.last_name} - {self.specialty}"
 
+# --- فهرس البحث في دليل الأطباء: جدول FTS5 افتراضي (ينشئه migration 0014) ---
+class DoctorSearch(models.Model):
+    # الـ rowid في جدول FTS5 هو id الطبيب، فيرتبط بـ DoctorProfile بـ JOIN على المفتاح الأساسي
+    doctor = models.OneToOneField(
+        DoctorProfile, primary_key=True, db_column='rowid', on_delete=models.DO_NOTHING,
+        db_constraint=False, related_name='search_entry',
+    )
+    # العمود المخفي الذي يحمل اسم الجدول: يستخدم فقط في شرط MATCH (core.search)
+    document = models.TextField(db_column='core_doctorsearch')
+    # ترتيب bm25 (بأوزان الأعمدة المحفوظة في إعدادات الجدول)، له قيمة فقط مع MATCH
+    rank = models.FloatField()
+    class Meta:
+        managed = False
+        db_table = 'core_doctorsearch'
+
 class FavoriteDoctor(models.Model):
     patient = models.ForeignKey('PatientProfile', on_delete=models.CASCADE, related_name='favorite_doctors')
     doctor = models.ForeignKey('DoctorProfile', on_delete=models.CASCADE, related_name='favorited_by_patients')
@@ -56,6 +91,8 @@ class PatientProfile(models.Model):
     diagnosis_date = models.DateField(blank=True, null=True)
     medical_notes = models.TextField(blank=True, null=True)
     profile_picture = models.ImageField(upload_to=patient_profile_picture_path, blank=True, null=True)
+    # يزيد مع كل تغيير يمس الـ AGP (قراءات داخل نوافذه أو النطاق المستهدف)، ومفتاح الـ cache يتضمنه
+    agp_version = models.PositiveIntegerField(default=0, verbose_name="نسخة الـ AGP")
     def __str__(self):
         return f"Patient Profile for {self.user.username}"
 
@@ -87,9 +124,83 @@ class BloodGlucoseReading(models.Model):
     reading_timestamp = models.DateTimeField(default=timezone.now)
     notes = models.TextField(blank=True, null=True)
     reading_type = models.CharField(max_length=20, choices=READING_TYPE_CHOICES, default='Random', verbose_name="نوع القراءة")
+    updated_at = models.DateTimeField(auto_now=True)
+    class Meta:
+        # فهارس مركبة تطابق ترتيب (reading_timestamp, id) المستخدم في ترقيم الصفحات بالـ cursor
+        indexes = [
+            models.Index(fields=['patient', 'reading_timestamp', 'id'], name='reading_patient_ts_idx'),
+            models.Index(fields=['reading_timestamp', 'id'], name='reading_ts_idx'),
+            models.Index(fields=['patient', 'updated_at'], name='reading_updated_idx'),
+        ]
     def __str__(self):
         return f"Glucose Reading for {self.patient.user.username}: {self.reading_value} at {self.reading_timestamp}"
 
+# --- جداول تجميع القراءات (Rollups) ---
+class GlucoseRollup(models.Model):
+    """
+    مجاميع قراءات المريض في فترة زمنية، تُحدّث تدريجياً مع كل قراءة جديدة
+    حتى لا تعيد لوحات المتابعة مسح جدول القراءات كاملاً.
+    """
+    count = models.PositiveIntegerField(default=0)
+    total = models.FloatField(default=0)
+    total_sq = models.FloatField(default=0)
+    min_value = models.FloatField(null=True, blank=True)
+    max_value = models.FloatField(null=True, blank=True)
+    below_count = models.PositiveIntegerField(default=0)
+    in_range_count = models.PositiveIntegerField(default=0)
+    above_count = models.PositiveIntegerField(default=0)
+    fasting_count = models.PositiveIntegerField(default=0)
+    after_meal_count = models.PositiveIntegerField(default=0)
+    random_count = models.PositiveIntegerField(default=0)
+    class Meta:
+        abstract = True
+
+class GlucoseHourlyRollup(GlucoseRollup):
+    patient = models.ForeignKey(PatientProfile, on_delete=models.CASCADE, related_name='hourly_glucose_rollups')
+    hour = models.DateTimeField(verbose_name="بداية الساعة")
+    class Meta:
+        unique_together = ('patient', 'hour')
+    def __str__(self):
+        return f"Hourly rollup for patient {self.patient_id} at {self.hour}"
+
+class GlucoseDailyRollup(GlucoseRollup):
+    patient = models.ForeignKey(PatientProfile, on_delete=models.CASCADE, related_name='daily_glucose_rollups')
+    day = models.DateField(verbose_name="اليوم")
+    class Meta:
+        unique_together = ('patient', 'day')
+    def __str__(self):
+        return f"Daily rollup for patient {self.patient_id} on {self.day}"
+
+# --- أرشيف القراءات القديمة: سجل واحد لكل (مريض، شهر) والبيانات نفسها في ملفات NumPy ---
+class ReadingArchive(models.Model):
+    patient = models.ForeignKey(PatientProfile, on_delete=models.CASCADE, related_name='reading_archives')
+    month = models.DateField(verbose_name="أول يوم في الشهر")
+    # رقم نسخة الملفات: الأرشفة تكتب نسخة جديدة ثم تعتمدها في نفس transaction حذف القراءات
+    generation = models.PositiveIntegerField(default=1)
+    count = models.PositiveIntegerField(default=0)
+    first_timestamp = models.DateTimeField()
+    last_timestamp = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now=True)
+    class Meta:
+        unique_together = ('patient', 'month')
+        verbose_name = "أرشيف قراءات"
+        verbose_name_plural = "أرشيف القراءات"
+    def __str__(self):
+        return f"Archived readings for {self.patient.user.username}: {self.month:%Y-%m} ({self.count})"
+
+# --- النطاق المستهدف للسكر لكل مريض (يحدده الطبيب) ---
+class GlucoseTarget(models.Model):
+    patient = models.OneToOneField(PatientProfile, on_delete=models.CASCADE, related_name='glucose_target')
+    low = models.FloatField(verbose_name="الحد الأدنى (mg/dL)")
+    high = models.FloatField(verbose_name="الحد الأعلى (mg/dL)")
+    set_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='glucose_targets_set')
+    updated_at = models.DateTimeField(auto_now=True)
+    class Meta:
+        verbose_name = "النطاق المستهدف"
+        verbose_name_plural = "النطاقات المستهدفة"
+    def __str__(self):
+        return f"Target {self.low}-{self.high} for {self.patient.user.username}"
+
 class Medication(models.Model):
     patient = models.ForeignKey(PatientProfile, on_delete=models.CASCADE, related_name='medications')
     name = models.CharField(max_length=255)
@@ -98,6 +209,13 @@ class Medication(models.Model):
     start_date = models.DateField(blank=True, null=True)
     end_date = models.DateField(blank=True, null=True)
     notes = models.TextField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient', 'start_date'], name='medication_patient_start_idx'),
+            models.Index(fields=['start_date'], name='medication_start_idx'),
+            models.Index(fields=['patient', 'updated_at'], name='medication_updated_idx'),
+        ]
     def __str__(self):
         return f"Medication for {self.patient.user.username}: {self.name}"
 
@@ -106,6 +224,13 @@ class DoctorNote(models.Model):
     doctor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='doctor_written_notes')
     note_text = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient', 'timestamp', 'id'], name='doctornote_patient_ts_idx'),
+            models.Index(fields=['timestamp', 'id'], name='doctornote_ts_idx'),
+            models.Index(fields=['patient', 'updated_at'], name='doctornote_updated_idx'),
+        ]
     def __str__(self):
         return f"Note for {self.patient.user.username} by Dr. {self.doctor.first_name} {self.doctor.last_name} on {self.timestamp.date()}"
 
@@ -114,6 +239,13 @@ class Attachment(models.Model):
     file = models.FileField(upload_to=attachment_file_path)
     description = models.TextField(blank=True, null=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient', 'uploaded_at', 'id'], name='attachment_patient_ts_idx'),
+            models.Index(fields=['uploaded_at', 'id'], name='attachment_ts_idx'),
+            models.Index(fields=['patient', 'updated_at'], name='attachment_updated_idx'),
+        ]
     def __str__(self):
         return f"Attachment for {self.patient.user.username}: {self.file.name}"
     def delete(self, *args, **kwargs):
@@ -131,8 +263,14 @@ class Consultation(models.Model):
     treatment = models.TextField(blank=True, null=True)
     notes = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     class Meta:
         ordering = ['-consultation_date', '-consultation_time']
+        indexes = [
+            models.Index(fields=['patient', 'consultation_date', 'consultation_time'], name='consultation_patient_date_idx'),
+            models.Index(fields=['consultation_date', 'consultation_time'], name='consultation_date_idx'),
+            models.Index(fields=['patient', 'updated_at'], name='consultation_updated_idx'),
+        ]
     def __str__(self):
         return f"Consultation for {self.patient.user.username} by Dr. {self.doctor.first_name if self.doctor else 'N/A'} on {self.consultation_date}"
 
@@ -156,9 +294,14 @@ class Alert(models.Model):
     recurrence = models.CharField(max_length=10, choices=RECURRENCE_CHOICES, default='Once', verbose_name="التكرار")
     is_active = models.BooleanField(default=True, verbose_name="مفعل")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="وقت الإنشاء")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="آخر تعديل")
     
     class Meta:
         ordering = ['alert_date', 'alert_time']
+        indexes = [
+            models.Index(fields=['patient', 'alert_date', 'alert_time'], name='alert_patient_date_idx'),
+            models.Index(fields=['patient', 'updated_at'], name='alert_updated_idx'),
+        ]
         verbose_name = "تنبيه"
         verbose_name_plural = "التنبيهات"
 
@@ -177,17 +320,114 @@ class Appointment(models.Model):
     ]
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='Pending')
     notes = models.TextField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
     class Meta:
         ordering = ['-appointment_date', '-appointment_time']
+        indexes = [
+            models.Index(fields=['patient', 'appointment_date', 'appointment_time'], name='appointment_patient_date_idx'),
+            models.Index(fields=['patient', 'updated_at'], name='appointment_updated_idx'),
+            # الطبيب يقرأ مواعيده حسب الحالة فقط: الطلبات المعلقة (القائمة الافتراضية) والحجوزات المؤكدة.
+            # فهرس جزئي لكل حالة أصغر من فهرس مركب على كل المواعيد، والمرفوضة لا تدخل أي منهما.
+            models.Index(
+                fields=['doctor', 'appointment_date', 'appointment_time'],
+                condition=models.Q(status='Pending'), name='appointment_pending_idx',
+            ),
+            models.Index(
+                fields=['doctor', 'appointment_date', 'appointment_time'],
+                condition=models.Q(status='Confirmed'), name='appointment_confirmed_idx',
+            ),
+            # أقرب موعد مؤكد لكل مريض في لوحة الطبيب (subquery لكل مريض): بدونه يمر SQLite
+            # على كل مواعيد الطبيب المؤكدة لكل مريض
+            models.Index(
+                fields=['patient', 'doctor', 'appointment_date', 'appointment_time'],
+                condition=models.Q(status='Confirmed'), name='appointment_patient_next_idx',
+            ),
+        ]
+        constraints = [
+            # موعد واحد فعّال (معلق أو مؤكد) لكل طبيب في نفس التاريخ والوقت: طلبان متزامنان
+            # على نفس الموعد لا ينجح منهما إلا واحد، والمرفوض لا يحجز شيئاً
+            models.UniqueConstraint(
+                fields=['doctor', 'appointment_date', 'appointment_time'],
+                condition=models.Q(status__in=['Pending', 'Confirmed']), name='appointment_active_slot_uniq',
+            ),
+        ]
         verbose_name = "موعد"
         verbose_name_plural = "المواعيد"
     def __str__(self):
         return f"Appointment for {self.patient.user.username} with Dr. {self.doctor.user.username} on {self.appointment_date}"
 
+# --- جدول عمل الطبيب الأسبوعي: فترات لكل يوم تُقسم إلى مواعيد بطول slot_minutes ---
+class DoctorSchedule(models.Model):
+    # بنفس ترقيم date.weekday() في بايثون
+    WEEKDAY_CHOICES = [
+        (0, 'الاثنين'),
+        (1, 'الثلاثاء'),
+        (2, 'الأربعاء'),
+        (3, 'الخميس'),
+        (4, 'الجمعة'),
+        (5, 'السبت'),
+        (6, 'الأحد'),
+    ]
+    doctor = models.ForeignKey(DoctorProfile, on_delete=models.CASCADE, related_name='schedules')
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES, verbose_name="اليوم")
+    start_time = models.TimeField(verbose_name="من")
+    end_time = models.TimeField(verbose_name="إلى")
+    slot_minutes = models.PositiveSmallIntegerField(
+        default=30, validators=[MinValueValidator(5), MaxValueValidator(240)], verbose_name="مدة الموعد (دقائق)"
+    )
+    class Meta:
+        ordering = ['weekday', 'start_time']
+        indexes = [
+            models.Index(fields=['doctor', 'weekday', 'start_time'], name='schedule_doctor_day_idx'),
+        ]
+        verbose_name = "فترة عمل"
+        verbose_name_plural = "جدول العمل"
+    def __str__(self):
+        return f"Dr. {self.doctor.user.username} {self.get_weekday_display()} {self.start_time}-{self.end_time}"
+
+# --- استثناءات الجدول (إجازة، عطلة): يوم كامل إذا لم تُحدد الساعات ---
+class ScheduleException(models.Model):
+    doctor = models.ForeignKey(DoctorProfile, on_delete=models.CASCADE, related_name='schedule_exceptions')
+    date = models.DateField(verbose_name="التاريخ")
+    start_time = models.TimeField(blank=True, null=True, verbose_name="من")
+    end_time = models.TimeField(blank=True, null=True, verbose_name="إلى")
+    reason = models.CharField(max_length=255, blank=True, verbose_name="السبب")
+    class Meta:
+        ordering = ['date', 'start_time']
+        indexes = [
+            models.Index(fields=['doctor', 'date'], name='schedule_exception_date_idx'),
+        ]
+        verbose_name = "استثناء من الجدول"
+        verbose_name_plural = "استثناءات الجدول"
+    def __str__(self):
+        return f"Dr. {self.doctor.user.username} off on {self.date}"
+
+# --- تقييمات الأطباء: تقييم واحد لكل (مريض، طبيب) بعد موعد مؤكد ---
+class DoctorReview(models.Model):
+    patient = models.ForeignKey(PatientProfile, on_delete=models.CASCADE, related_name='doctor_reviews')
+    doctor = models.ForeignKey(DoctorProfile, on_delete=models.CASCADE, related_name='reviews')
+    rating = models.PositiveSmallIntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)], verbose_name="التقييم")
+    comment = models.TextField(blank=True, null=True, verbose_name="التعليق")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    class Meta:
+        unique_together = ('patient', 'doctor')
+        indexes = [
+            models.Index(fields=['doctor', 'created_at'], name='review_doctor_created_idx'),
+        ]
+        verbose_name = "تقييم طبيب"
+        verbose_name_plural = "تقييمات الأطباء"
+    def __str__(self):
+        return f"{self.rating}/5 for Dr. {self.doctor.user.username} by {self.patient.user.username}"
+
 # --- NEW: Notification Model ---
 class Notification(models.Model):
     recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications', verbose_name="المستلم")
     message = models.TextField(verbose_name="نص الإشعار")
+    # نوع الحدث (مثل appointment.requested): الإشعارات المتكررة من نفس النوع تُدمج في صف واحد، انظر core/notifications.py
+    kind = models.CharField(max_length=50, blank=True, default='', verbose_name="النوع")
+    # عدد الأحداث المدمجة في هذا الصف (آخرها هو نص الإشعار)
+    count = models.PositiveIntegerField(default=1, verbose_name="العدد")
     is_read = models.BooleanField(default=False, verbose_name="تمت القراءة")
     timestamp = models.DateTimeField(auto_now_add=True, verbose_name="وقت الإشعار")
     
@@ -198,8 +438,87 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['recipient', 'timestamp', 'id'], name='notification_recipient_ts_idx'),
+            models.Index(
+                fields=['recipient', 'timestamp'],
+                condition=models.Q(is_read=False), name='notification_unread_idx',
+            ),
+            # الحذف الدوري يمر على المقروءة فقط بترتيب id، دون المرور على غير المقروءة القديمة التي تبقى دائماً
+            models.Index(fields=['id'], condition=models.Q(is_read=True), name='notification_read_idx'),
+        ]
         verbose_name = "إشعار"
         verbose_name_plural = "الإشعارات"
 
     def __str__(self):
         return f"Notification for {self.recipient.username}: {self.message[:30]}"
+
+class NotificationCounter(models.Model):
+    """
+    عدد الإشعارات غير المقروءة لكل مستخدم (شارة التطبيق) بدون COUNT على جدول الإشعارات.
+    يُحدث في core/notifications.py عند الإنشاء والقراءة، ويصحح الفرق reconcile_unread_counts.
+    عدم وجود صف يعني صفر.
+    """
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name='notification_counter', verbose_name="المستخدم"
+    )
+    unread = models.PositiveIntegerField(default=0, verbose_name="غير المقروءة")
+
+    class Meta:
+        verbose_name = "عداد الإشعارات"
+        verbose_name_plural = "عدادات الإشعارات"
+
+    def __str__(self):
+        return f"{self.user.username}: {self.unread}"
+
+# --- سجل الحذف للمزامنة (Tombstones) ---
+class SyncTombstone(models.Model):
+    """
+    كل سجل يُحذف من بيانات المريض يترك هنا أثراً (النوع + الـ id)،
+    حتى يعرف تطبيق الجوال ما يجب حذفه من نسخته المحلية في /api/sync/
+    """
+    patient = models.ForeignKey(PatientProfile, on_delete=models.CASCADE, related_name='sync_tombstones')
+    model_name = models.CharField(max_length=50)
+    object_id = models.PositiveIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient', 'deleted_at'], name='tombstone_patient_idx'),
+        ]
+
+    def __str__(self):
+        return f"Deleted {self.model_name} #{self.object_id} for {self.patient.user.username}"
+
+# --- طابور المهام الخلفية (core.jobs): الآثار الجانبية تُنفذ خارج الطلب بواسطة run_workers ---
+class Job(models.Model):
+    QUEUED, RUNNING, DONE, DEAD = 'queued', 'running', 'done', 'dead'
+    STATUS_CHOICES = [
+        (QUEUED, 'في الانتظار'),
+        (RUNNING, 'قيد التنفيذ'),
+        (DONE, 'تمت'),
+        # استنفدت كل المحاولات: تبقى للمراجعة ولا تُعاد إلا يدوياً
+        (DEAD, 'فشلت نهائياً'),
+    ]
+    kind = models.CharField(max_length=100, verbose_name="نوع المهمة")
+    payload = models.JSONField(default=dict, verbose_name="البيانات")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED, verbose_name="الحالة")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="عدد المحاولات")
+    max_attempts = models.PositiveSmallIntegerField(default=5, verbose_name="أقصى عدد محاولات")
+    # لا تُنفذ قبل هذا الوقت (التأخير بين المحاولات)
+    run_at = models.DateTimeField(default=timezone.now, verbose_name="موعد التنفيذ")
+    # وقت استلام worker للمهمة: مهمة قيد التنفيذ منذ زمن طويل تعني worker توقف فتُستعاد
+    locked_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True, verbose_name="آخر خطأ")
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    class Meta:
+        indexes = [
+            # الـ workers يقرؤون أقدم المهام المستحقة فقط، والمنتهية لا تدخل الفهرس
+            models.Index(fields=['run_at', 'id'], condition=models.Q(status='queued'), name='job_queued_idx'),
+            models.Index(fields=['locked_at'], condition=models.Q(status='running'), name='job_running_idx'),
+        ]
+        verbose_name = "مهمة خلفية"
+        verbose_name_plural = "المهام الخلفية"
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
@@ -0,0 +1,214 @@
+# core/notifications.py
+
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .jobs import enqueue, job
+from .models import DoctorProfile, Notification, NotificationCounter
+from .push import get_broker
+
+RECONCILE_CHUNK_SIZE = 500
+# عدد الإشعارات التي يقرأها ويحذفها purge_read_notifications في كل transaction
+PURGE_CHUNK_SIZE = 500
+# نوع الحدث -> نافذة الدمج: إشعار جديد من هذا النوع يُدمج مع إشعارات المستلم غير المقروءة من نفس الـ kind
+# تماماً داخل النافذة في صف واحد (count). الـ kind قد ينتهي بـ :<نطاق> (مثل glucose.hyper:<patient_id>)
+# فلا يُدمج إلا المتطابق. تنبيهات الانخفاض (hypo, sustained_low, rapid_fall) والأنواع الأخرى لا تُدمج أبداً.
+COALESCE_WINDOWS = {
+    'appointment.requested': timedelta(hours=1),
+    'glucose.hyper': timedelta(minutes=30),
+    'glucose.sustained_high': timedelta(minutes=30),
+    'glucose.rapid_rise': timedelta(minutes=30),
+}
+
+
+def coalesce_window(kind):
+    return COALESCE_WINDOWS.get(kind.partition(':')[0])
+
+
+def patient_recipients(patient):
+    """
+    المريض نفسه + مستخدمو الأطباء المرتبطين به (DoctorProfile.patients).
+    يرجع (user_id للمريض, قائمة user_id للأطباء).
+    """
+    doctor_ids = list(DoctorProfile.objects.filter(patients=patient).values_list('user_id', flat=True))
+    return patient.user_id, doctor_ids
+
+
+def notify(items, kind=''):
+    """
+    يرسل مجموعة إشعارات عبر طابور المهام بدل كتابتها داخل الطلب.
+    items قائمة (recipient_id, message, related_object أو None[, kind]) و kind نوع الحدث الافتراضي
+    لما ليس له kind خاص (انظر COALESCE_WINDOWS).
+    """
+    rows = []
+    content_types = {}
+    for recipient_id, message, related_object, *item_kind in items:
+        content_type_id = object_id = None
+        if related_object is not None:
+            model = type(related_object)
+            if model not in content_types:
+                content_types[model] = ContentType.objects.get_for_model(model).pk
+            content_type_id, object_id = content_types[model], related_object.pk
+        rows.append([recipient_id, message, content_type_id, object_id, item_kind[0] if item_kind else kind])
+    if rows:
+        enqueue('notifications.create', rows=rows)
+
+
+@job('notifications.create')
+def create_notifications(rows):
+    """
+    ينشئ الإشعارات بـ INSERT واحد بعد الدمج (coalesce).
+    rows قائمة [recipient_id, message, content_type_id, object_id, kind] (مهام أقدم بدون kind).
+    """
+    with transaction.atomic():
+        notifications, replaced = coalesce([
+            Notification(
+                recipient_id=row[0], message=row[1], content_type_id=row[2], object_id=row[3], kind=row[4] if len(row) > 4 else '',
+            )
+            for row in rows
+        ])
+        created = Notification.objects.bulk_create(notifications)
+        unread = Counter(notification.recipient_id for notification in created)
+        unread.subtract(replaced)
+        add_unread(unread)
+    get_broker().publish(created)
+    return created
+
+
+def coalesce(notifications):
+    """
+    يدمج الإشعارات من الأنواع في COALESCE_WINDOWS: لكل (مستلم، kind) صف واحد فقط، نصه وعنصره
+    من آخر حدث و count مجموع الأحداث، بما فيها صفوف غير مقروءة موجودة داخل النافذة (فهرس
+    notification_unread_idx). الصفوف القديمة تُحذف ويحل محلها الصف الجديد، فيصل عبر push كإشعار جديد.
+    يرجع (الإشعارات للإنشاء، {recipient_id: عدد الصفوف غير المقروءة المحذوفة}).
+    """
+    latest = {}
+    counts = Counter()
+    for notification in notifications:
+        if coalesce_window(notification.kind):
+            key = (notification.recipient_id, notification.kind)
+            latest[key] = notification
+            counts[key] += 1
+    replaced = Counter()
+    if latest:
+        now = timezone.now()
+        existing = Notification.objects.select_for_update().filter(
+            recipient_id__in={recipient_id for recipient_id, _ in latest},
+            is_read=False,
+            timestamp__gte=now - max(COALESCE_WINDOWS.values()),
+            kind__in={kind for _, kind in latest},
+        ).values_list('pk', 'recipient_id', 'kind', 'count', 'timestamp')
+        folded = []
+        for pk, recipient_id, kind, count, timestamp in existing:
+            if (recipient_id, kind) in latest and timestamp >= now - coalesce_window(kind):
+                counts[recipient_id, kind] += count
+                replaced[recipient_id] += 1
+                folded.append(pk)
+        if folded:
+            Notification.objects.filter(pk__in=folded).delete()
+        for key, notification in latest.items():
+            notification.count = counts[key]
+    return [
+        notification for notification in notifications
+        if not coalesce_window(notification.kind) or latest[notification.recipient_id, notification.kind] is notification
+    ], replaced
+
+
+def add_unread(counts):
+    """
+    يغير عدادات غير المقروءة: counts هو {user_id: الفرق}. UPDATE واحد لكل قيمة زيادة مختلفة
+    (غالباً واحد فقط)، والـ F() يجعل الزيادات المتزامنة صحيحة.
+    """
+    by_amount = defaultdict(list)
+    for user_id, amount in counts.items():
+        if amount:
+            by_amount[amount].append(user_id)
+    if not by_amount:
+        return
+    NotificationCounter.objects.bulk_create(
+        [NotificationCounter(user_id=user_id) for user_ids in by_amount.values() for user_id in user_ids], ignore_conflicts=True,
+    )
+    for amount, user_ids in by_amount.items():
+        # بعد الدمج قد يكون الفرق سالباً (صفوف محذوفة أكثر من الجديدة)
+        unread = F('unread') + amount if amount > 0 else Greatest(F('unread') + amount, 0)
+        NotificationCounter.objects.filter(user_id__in=user_ids).update(unread=unread)
+
+
+def mark_read(user, ids=None, until=None):
+    """
+    يعلم إشعارات المستخدم غير المقروءة كمقروءة بـ UPDATE واحد: كلها، أو ids فقط، أو حتى الوقت until (شامل).
+    ينقص العداد بعدد الصفوف التي تغيرت فعلاً. يرجع هذا العدد.
+    """
+    notifications = Notification.objects.filter(recipient=user, is_read=False)
+    if ids is not None:
+        notifications = notifications.filter(pk__in=ids)
+    if until is not None:
+        notifications = notifications.filter(timestamp__lte=until)
+    with transaction.atomic():
+        marked = notifications.update(is_read=True)
+        if marked:
+            NotificationCounter.objects.filter(user=user).update(unread=Greatest(F('unread') - marked, 0))
+    return marked
+
+
+def unread_count(user):
+    return NotificationCounter.objects.filter(user=user).values_list('unread', flat=True).first() or 0
+
+
+def reconcile_unread_counts(user_ids=None):
+    """
+    يعيد حساب عدادات غير المقروءة من جدول الإشعارات ويصحح فقط المختلف (بعد حذف إشعارات
+    أو تعديلها من لوحة الإدارة). يرجع ids المستخدمين الذين صُححوا.
+    """
+    unread = Notification.objects.filter(is_read=False)
+    counters = NotificationCounter.objects.order_by('pk')
+    if user_ids is not None:
+        unread = unread.filter(recipient_id__in=user_ids)
+        counters = counters.filter(pk__in=user_ids)
+    missing = unread.filter(recipient__notification_counter__isnull=True).order_by().values_list('recipient_id', flat=True).distinct()
+    NotificationCounter.objects.bulk_create(
+        [NotificationCounter(user_id=user_id) for user_id in missing], ignore_conflicts=True, batch_size=RECONCILE_CHUNK_SIZE,
+    )
+    actual = Coalesce(Subquery(
+        unread.filter(recipient=OuterRef('pk')).order_by().values('recipient').annotate(value=Count('id')).values('value')
+    ), 0)
+    drifted = list(counters.annotate(actual=actual).exclude(unread=F('actual')).values_list('pk', flat=True))
+    for start in range(0, len(drifted), RECONCILE_CHUNK_SIZE):
+        # القيمة تُحسب داخل الـ UPDATE نفسه، فلا تضيع زيادة حدثت بعد القراءة
+        NotificationCounter.objects.filter(pk__in=drifted[start:start + RECONCILE_CHUNK_SIZE]).update(unread=actual)
+    return drifted
+
+
+def purge_read_notifications(before, chunk_size=PURGE_CHUNK_SIZE, archive=None):
+    """
+    يحذف الإشعارات المقروءة الأقدم من before على دفعات، كل دفعة في transaction قصيرة حتى لا يُمسك
+    قفل الكتابة طويلاً. المرور على المقروءة فقط بترتيب id (الفهرس الجزئي notification_read_idx، والـ ids
+    تتبع ترتيب الإنشاء) بدل فهرس على الوقت، ويتوقف عند أول إشعار أحدث من before. غير المقروءة تبقى دائماً
+    ولا تُقرأ أصلاً، فتكلفة كل تشغيل بعدد المرشحين للحذف. archive (اختياري) يُستدعى بكل دفعة قبل حذفها.
+    يرجع عدد المحذوف.
+    """
+    deleted = 0
+    cursor = 0
+    while True:
+        batch = list(
+            Notification.objects.filter(is_read=True, pk__gt=cursor).order_by('pk').values_list('pk', 'timestamp')[:chunk_size]
+        )
+        if not batch:
+            break
+        cursor = batch[-1][0]
+        ids = [pk for pk, timestamp in batch if timestamp < before]
+        if ids:
+            with transaction.atomic():
+                rows = Notification.objects.filter(pk__in=ids, is_read=True)
+                if archive is not None:
+                    archive(rows)
+                deleted += rows.delete()[0]
+        if batch[-1][1] >= before:
+            break
+    return deleted
@@ -0,0 +1,138 @@
+# core/pagination.py
+
+import base64
+import datetime
+import json
+from functools import reduce
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(PageNumberPagination):
+    """
+    ترقيم الصفحات الافتراضي (page=) كما هو، مع وضع cursor يختاره العميل لكل طلب:
+    ?pagination=cursor للصفحة الأولى ثم روابط next/previous التي تحمل ?cursor=
+
+    وضع الـ cursor يعتمد على cursor_ordering في الـ ViewSet، مثلاً ('-reading_timestamp', '-id'):
+    الصفحة التالية تُجلب بـ WHERE (timestamp, id) < (آخر قيمة) بدل OFFSET، وبدون COUNT(*)،
+    فتبقى تكلفة الصفحة ثابتة مهما كان عمقها.
+    """
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    invalid_cursor_message = 'Invalid cursor.'
+
+    cursor_mode = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        ordering = getattr(view, 'cursor_ordering', None)
+        self.cursor_mode = bool(ordering) and (
+            self.cursor_query_param in request.query_params
+            or request.query_params.get(self.mode_query_param) == 'cursor'
+        )
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.ordering = ordering
+        self.page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request)
+
+        order = [self.flip(field) for field in ordering] if reverse else list(ordering)
+        queryset = queryset.order_by(*order)
+        if position is not None:
+            try:
+                queryset = queryset.filter(self.after(order, position))
+            except (TypeError, ValueError, DjangoValidationError):
+                self.invalid_cursor()
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.rows = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if not self.has_next or not self.rows:
+            return None
+        return self.cursor_link(self.rows[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.cursor_mode:
+            return super().get_previous_link()
+        if not self.has_previous or not self.rows:
+            return None
+        return self.cursor_link(self.rows[0], reverse=True)
+
+    # --- أدوات داخلية ---
+    @staticmethod
+    def flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def after(order, position):
+        """
+        شرط "بعد هذا الموقع" حسب الترتيب: (f1 > v1) OR (f1 = v1 AND f2 > v2) ...
+        مع < بدل > للحقول التنازلية. الشرط الإضافي f1 >= v1 مكرر منطقياً لكنه يسمح
+        لـ SQLite بالبدء من موقع الـ cursor في الفهرس بدل مسحه من أوله.
+        """
+        clauses = []
+        for i, field in enumerate(order):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            equal = {order[j].lstrip('-'): position[j] for j in range(i)}
+            clauses.append(Q(**equal, **{f'{name}__{lookup}': position[i]}))
+        first = order[0].lstrip('-')
+        bound = Q(**{f"{first}__{'lte' if order[0].startswith('-') else 'gte'}": position[0]})
+        return bound & reduce(lambda a, b: a | b, clauses)
+
+    def cursor_link(self, obj, reverse):
+        position = []
+        for field in self.ordering:
+            value = getattr(obj, field.lstrip('-'))
+            position.append(value.isoformat() if isinstance(value, (datetime.date, datetime.time)) else value)
+        token = base64.urlsafe_b64encode(json.dumps([position, reverse]).encode()).decode()
+        url = remove_query_param(self.request.build_absolute_uri(), self.mode_query_param)
+        return replace_query_param(url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+        try:
+            decoded = json.loads(base64.urlsafe_b64decode(token.encode()))
+        except (TypeError, ValueError):
+            self.invalid_cursor()
+        # الشكل الوحيد المقبول: [[قيمة لكل حقل ترتيب، كلها scalar], reverse]
+        if not (
+            isinstance(decoded, list) and len(decoded) == 2
+            and isinstance(decoded[0], list) and len(decoded[0]) == len(self.ordering)
+            and all(isinstance(value, (str, int, float)) for value in decoded[0])
+            and isinstance(decoded[1], bool)
+        ):
+            self.invalid_cursor()
+        position, reverse = decoded
+        return position, reverse
+
+    def invalid_cursor(self):
+        raise ValidationError({self.cursor_query_param: [self.invalid_cursor_message]})
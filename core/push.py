@@ -0,0 +1,180 @@
+# core/push.py
+
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import prefetch_related_objects
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+
+from .models import Notification
+from .serializers import NotificationSerializer, notification_related_prefetch
+
+logger = logging.getLogger(__name__)
+
+# الأحداث التي تنتظر اتصالاً بطيئاً: بعدها تُهمل الأقدم (العميل يسترجعها بـ Last-Event-ID عند إعادة الاتصال)
+SUBSCRIBER_QUEUE_SIZE = 100
+# أقصى عدد إشعارات تُقرأ في كل دورة من DatabaseBroker
+POLL_BATCH_SIZE = 500
+
+
+def notification_events(notifications):
+    """
+    أحداث SSE للإشعارات: يرجع (recipient_id, حدث) لكل إشعار. id الحدث هو id الإشعار حتى يستأنف
+    العميل منه بعد انقطاع الاتصال. التحويل بـ many=True مرة واحدة (serializer لكل إشعار أبطأ بكثير)،
+    والعناصر المرتبطة تُحمل باستعلام واحد لكل نوع.
+    """
+    notifications = list(notifications)
+    prefetch_related_objects(notifications, notification_related_prefetch())
+    events = []
+    for notification, data in zip(notifications, NotificationSerializer(notifications, many=True).data):
+        data = json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False)
+        events.append((notification.recipient_id, f'id: {notification.pk}\nevent: notification\ndata: {data}\n\n'))
+    return events
+
+
+class LocalBroker:
+    """
+    pub/sub داخل العملية: كل اتصال مفتوح (SSE) له queue في الـ event loop الخاص به.
+    publish آمن من أي thread (طلب أو worker)، لكنه لا يصل إلا للاتصالات في نفس العملية،
+    لذلك يناسب الاختبارات والتشغيل بعملية واحدة فقط.
+    """
+    def __init__(self):
+        self.subscribers = defaultdict(set)
+        self.lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self.lock:
+            self.subscribers[user_id].add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        with self.lock:
+            subscribers = self.subscribers.get(user_id, set())
+            subscribers.difference_update({entry for entry in subscribers if entry[1] is queue})
+            if not subscribers:
+                self.subscribers.pop(user_id, None)
+
+    def subscribed_users(self):
+        with self.lock:
+            return set(self.subscribers)
+
+    def deliver(self, user_id, event):
+        with self.lock:
+            subscribers = list(self.subscribers.get(user_id, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(offer, queue, event)
+            except RuntimeError:
+                # الـ event loop أُغلق قبل أن ينهي الاتصال unsubscribe
+                self.unsubscribe(user_id, queue)
+
+    def publish(self, notifications):
+        """
+        يُستدعى بعد إنشاء الإشعارات (core.notifications).
+        """
+        for user_id, event in notification_events(notifications):
+            self.deliver(user_id, event)
+
+
+class DatabaseBroker(LocalBroker):
+    """
+    pub/sub بين العمليات بدون خدمة إضافية: جدول الإشعارات نفسه هو القناة. كل عملية ASGI فيها مهمة
+    واحدة تقرأ الإشعارات الجديدة (id أكبر من آخر id) كل PUSH_POLL_INTERVAL ثانية وتوزعها على
+    اتصالاتها، فالاستعلامات لكل عملية وليس لكل عميل مفتوح، والإشعارات التي تنشئها run_workers تصل أيضاً.
+    """
+    def __init__(self):
+        super().__init__()
+        self.pollers = {}
+
+    def subscribe(self, user_id):
+        queue = super().subscribe(user_id)
+        loop = asyncio.get_running_loop()
+        poller = self.pollers.get(loop)
+        if poller is None or poller.done():
+            self.pollers[loop] = loop.create_task(self.poll())
+        return queue
+
+    def publish(self, notifications):
+        # الصفوف الجديدة تصل من poll
+        pass
+
+    async def poll(self):
+        last_id = None
+        while True:
+            users = self.subscribed_users()
+            if not users:
+                # لا اتصالات في هذه العملية: المهمة تنتهي وتبدأ من جديد مع أول اشتراك
+                return
+            events, backlog = [], False
+            try:
+                if last_id is None:
+                    last_id = await sync_to_async(latest_notification_id)()
+                else:
+                    events, last_id, backlog = await sync_to_async(new_notification_events)(last_id, users)
+            except Exception:
+                # خطأ مؤقت في قاعدة البيانات لا يوقف الـ push لكل اتصالات العملية:
+                # نسجله ونعيد المحاولة في الدورة التالية من نفس last_id فلا يضيع إشعار
+                logger.exception('Notification push poll failed; retrying in %ss', settings.PUSH_POLL_INTERVAL)
+            for user_id, event in events:
+                self.deliver(user_id, event)
+            if not backlog:
+                await asyncio.sleep(settings.PUSH_POLL_INTERVAL)
+
+
+def offer(queue, event):
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(event)
+
+
+def latest_notification_id():
+    return Notification.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def new_notification_events(last_id, users):
+    """
+    الإشعارات بعد last_id (على المفتاح الأساسي) لمن لديهم اتصال مفتوح.
+    يرجع (الأحداث، آخر id مقروء، هل بقي المزيد بعد هذه الدفعة).
+    """
+    rows = list(Notification.objects.filter(id__gt=last_id).order_by('id').values_list('id', 'recipient_id')[:POLL_BATCH_SIZE])
+    if not rows:
+        return [], last_id, False
+    wanted = [pk for pk, recipient_id in rows if recipient_id in users]
+    events = notification_events(Notification.objects.filter(pk__in=wanted).order_by('id')) if wanted else []
+    return events, rows[-1][0], len(rows) == POLL_BATCH_SIZE
+
+
+def missed_events(user_id, last_event_id):
+    """
+    ما فات العميل أثناء انقطاعه (Last-Event-ID)، بحد أقصى SUBSCRIBER_QUEUE_SIZE.
+    """
+    notifications = Notification.objects.filter(recipient_id=user_id, id__gt=last_event_id).order_by('id')[:SUBSCRIBER_QUEUE_SIZE]
+    return [event for _, event in notification_events(notifications)]
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """
+    الـ broker المحدد في PUSH_BROKER (مسار class)، نسخة واحدة لكل عملية.
+    """
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(settings.PUSH_BROKER)()
+        return _broker
+
+
+def reset_broker():
+    global _broker
+    with _broker_lock:
+        _broker = None
@@ -0,0 +1,57 @@
+# core/ratings.py
+
+from django.db.models import Count, DecimalField, F, FloatField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf, Round
+
+from .models import DoctorProfile, DoctorReview
+
+RECONCILE_CHUNK_SIZE = 1000
+
+
+def average_expression(total, count):
+    """
+    المتوسط من المجموع والعدد (أو 0 بدون تقييمات)، بنفس تقريب average_rating (منزلتان).
+    """
+    return Coalesce(
+        Round(Cast(total, FloatField()) / NullIf(count, Value(0)), 2),
+        Value(0.0), output_field=DecimalField(max_digits=3, decimal_places=2),
+    )
+
+
+def apply_rating(doctor_id, total_delta, count_delta):
+    """
+    يضيف تقييماً (أو تعديله أو حذفه) لمجاميع الطبيب بـ UPDATE واحد: المجموع والعدد والمتوسط
+    تُحسب كلها من القيم الحالية في نفس الصف، فلا يعاد تجميع التقييمات ولا تضيع كتابة متزامنة.
+    """
+    total = F('rating_total') + total_delta
+    count = F('rating_count') + count_delta
+    DoctorProfile.objects.filter(pk=doctor_id).update(
+        rating_total=total, rating_count=count, average_rating=average_expression(total, count),
+    )
+
+
+def reconcile_ratings(doctor_ids=None):
+    """
+    يعيد حساب مجاميع التقييمات من جدول DoctorReview ويصحح فقط الأطباء المختلفين
+    (بعد تعديلات يدوية أو update() لا تمر على الـ signals). يرجع ids الأطباء الذين صُححوا.
+    """
+    reviews = DoctorReview.objects.filter(doctor=OuterRef('pk')).order_by().values('doctor')
+    actual_total = Coalesce(Subquery(reviews.annotate(value=Sum('rating')).values('value')), 0)
+    actual_count = Coalesce(Subquery(reviews.annotate(value=Count('id')).values('value')), 0)
+    doctors = DoctorProfile.objects.order_by('pk')
+    if doctor_ids is not None:
+        doctors = doctors.filter(pk__in=doctor_ids)
+    drifted = list(
+        doctors.annotate(
+            actual_total=actual_total, actual_count=actual_count,
+            actual_average=average_expression(actual_total, actual_count),
+        ).exclude(
+            rating_total=F('actual_total'), rating_count=F('actual_count'), average_rating=F('actual_average'),
+        ).values_list('pk', flat=True)
+    )
+    for start in range(0, len(drifted), RECONCILE_CHUNK_SIZE):
+        DoctorProfile.objects.filter(pk__in=drifted[start:start + RECONCILE_CHUNK_SIZE]).update(
+            rating_total=actual_total, rating_count=actual_count,
+            average_rating=average_expression(actual_total, actual_count),
+        )
+    return drifted
@@ -0,0 +1,273 @@
+# core/rollups.py
+
+from collections import defaultdict
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Min, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, Least, TruncDate, TruncHour
+from django.utils import timezone
+
+from .archive import archived_segments, archived_values, load_segment, month_start, next_month, read_archived
+from .glucose import READING_TYPES, TARGET_HIGH, TARGET_LOW, TYPE_COUNT_FIELDS, aggregate_readings, bucket_edges
+from .models import BloodGlucoseReading, GlucoseDailyRollup, GlucoseHourlyRollup
+
+COUNTER_FIELDS = ['count', 'total', 'total_sq', 'below_count', 'in_range_count', 'above_count'] + TYPE_COUNT_FIELDS
+
+
+def rollup_aggregates():
+    """
+    نفس المجاميع المخزنة في جداول الـ rollup، محسوبة من جدول القراءات مباشرة.
+    """
+    value = F('reading_value')
+    aggregates = {
+        'count': Count('id'),
+        'total': Sum(value),
+        'total_sq': Sum(value * value),
+        'min_value': Min(value),
+        'max_value': Max(value),
+        'below_count': Count('id', filter=Q(reading_value__lt=TARGET_LOW)),
+        'in_range_count': Count('id', filter=Q(reading_value__gte=TARGET_LOW, reading_value__lte=TARGET_HIGH)),
+        'above_count': Count('id', filter=Q(reading_value__gt=TARGET_HIGH)),
+    }
+    for code, field in zip(READING_TYPES, TYPE_COUNT_FIELDS):
+        aggregates[field] = Count('id', filter=Q(reading_type=code))
+    return aggregates
+
+
+def hour_of(timestamp):
+    return timestamp.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def day_of(timestamp):
+    return timezone.localtime(timestamp).date()
+
+
+def day_bounds(day):
+    tz = timezone.get_current_timezone()
+    return datetime.combine(day, time.min, tzinfo=tz), datetime.combine(day + timedelta(days=1), time.min, tzinfo=tz)
+
+
+def reading_delta(reading):
+    value = reading.reading_value
+    delta = dict.fromkeys(COUNTER_FIELDS, 0)
+    delta.update(count=1, total=value, total_sq=value * value, min_value=value, max_value=value)
+    if value < TARGET_LOW:
+        delta['below_count'] = 1
+    elif value > TARGET_HIGH:
+        delta['above_count'] = 1
+    else:
+        delta['in_range_count'] = 1
+    delta[TYPE_COUNT_FIELDS[READING_TYPES.index(reading.reading_type)]] = 1
+    return delta
+
+
+def merge_delta(target, delta):
+    for field in COUNTER_FIELDS:
+        target[field] = target.get(field, 0) + delta[field]
+    target['min_value'] = min(target.get('min_value', delta['min_value']), delta['min_value'])
+    target['max_value'] = max(target.get('max_value', delta['max_value']), delta['max_value'])
+
+
+def increment_bucket(model, lookup, delta):
+    """
+    يضيف delta إلى bucket موجود بـ UPDATE واحد (F expressions)، أو ينشئه إذا لم يكن موجوداً.
+    """
+    updates = {field: F(field) + delta[field] for field in COUNTER_FIELDS}
+    updates['min_value'] = Least(Coalesce(F('min_value'), Value(delta['min_value'])), Value(delta['min_value']))
+    updates['max_value'] = Greatest(Coalesce(F('max_value'), Value(delta['max_value'])), Value(delta['max_value']))
+    if model.objects.filter(**lookup).update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **delta)
+    except IntegrityError:
+        # أنشأه طلب آخر في نفس اللحظة
+        model.objects.filter(**lookup).update(**updates)
+
+
+def apply_deltas(model, key_field, deltas):
+    """
+    يطبق deltas على شكل {(patient_id, key): delta}: الـ buckets الموجودة تُحدّث بـ UPDATE،
+    والجديدة تُنشأ كلها بـ INSERT متعدد الصفوف.
+    """
+    by_patient = defaultdict(dict)
+    for (patient_id, key), delta in deltas.items():
+        by_patient[patient_id][key] = delta
+
+    for patient_id, buckets in by_patient.items():
+        if len(buckets) == 1:
+            # مسار القراءة الواحدة: UPDATE مباشرة بدون استعلام فحص
+            [(key, delta)] = buckets.items()
+            increment_bucket(model, {'patient_id': patient_id, key_field: key}, delta)
+            continue
+        existing = set(
+            model.objects.filter(patient_id=patient_id, **{f'{key_field}__in': list(buckets)})
+            .values_list(key_field, flat=True)
+        )
+        for key in existing:
+            increment_bucket(model, {'patient_id': patient_id, key_field: key}, buckets[key])
+        new = {key: delta for key, delta in buckets.items() if key not in existing}
+        try:
+            with transaction.atomic():
+                model.objects.bulk_create([
+                    model(patient_id=patient_id, **{key_field: key}, **delta) for key, delta in new.items()
+                ])
+        except IntegrityError:
+            # طلب آخر أنشأ بعض هذه الـ buckets في نفس اللحظة، فنرجع للطريق الآمن bucket بـ bucket
+            for key, delta in new.items():
+                increment_bucket(model, {'patient_id': patient_id, key_field: key}, delta)
+
+
+def apply_new_readings(readings):
+    """
+    يحدّث الـ rollups لقراءات جديدة (من الإنشاء العادي أو المسار الجماعي).
+    القراءات تُجمع أولاً في الذاكرة، فيصبح عدد الاستعلامات بعدد الـ buckets الموجودة وليس بعدد القراءات.
+    """
+    hourly = defaultdict(dict)
+    daily = defaultdict(dict)
+    for reading in readings:
+        delta = reading_delta(reading)
+        merge_delta(hourly[(reading.patient_id, hour_of(reading.reading_timestamp))], delta)
+        merge_delta(daily[(reading.patient_id, day_of(reading.reading_timestamp))], delta)
+
+    with transaction.atomic():
+        apply_deltas(GlucoseHourlyRollup, 'hour', hourly)
+        apply_deltas(GlucoseDailyRollup, 'day', daily)
+
+
+def rollup_rows(aggregates):
+    """
+    يحول ناتج aggregate_readings إلى صفوف بأسماء أعمدة الـ rollup: [(رقم الـ bucket, القيم)] للـ buckets غير الفارغة.
+    """
+    rows = []
+    for i in np.flatnonzero(aggregates['count']):
+        row = {
+            'count': int(aggregates['count'][i]),
+            'total': float(aggregates['total'][i]),
+            'total_sq': float(aggregates['total_sq'][i]),
+            'min_value': float(aggregates['min'][i]),
+            'max_value': float(aggregates['max'][i]),
+            'below_count': int(aggregates['below'][i]),
+            'in_range_count': int(aggregates['in_range'][i]),
+            'above_count': int(aggregates['above'][i]),
+        }
+        for code, field in enumerate(TYPE_COUNT_FIELDS):
+            row[field] = int(aggregates['types'][i, code])
+        rows.append((i, row))
+    return rows
+
+
+def combine_rows(row, extra):
+    """
+    يجمع صفي rollup لنفس الـ bucket (مثلاً من الجدول الحي ومن الأرشيف).
+    """
+    combined = {field: (row.get(field) or 0) + extra[field] for field in COUNTER_FIELDS}
+    combined['min_value'] = min(v for v in (row.get('min_value'), extra['min_value']) if v is not None)
+    combined['max_value'] = max(v for v in (row.get('max_value'), extra['max_value']) if v is not None)
+    return combined
+
+
+def archived_rollup(patient_id, start, end):
+    """
+    مجاميع القراءات المؤرشفة في [start, end) كصف rollup واحد، أو None إذا لا يوجد أرشيف للفترة.
+    """
+    ts, values, types = read_archived(patient_id, start, end)
+    if not len(ts):
+        return None
+    edges = np.array([int(start.timestamp()), int(end.timestamp())])
+    [(_, row)] = rollup_rows(aggregate_readings(ts, values, types, edges))
+    return row
+
+
+def recompute_bucket(model, lookup, readings, archived=None):
+    """
+    يعيد حساب bucket واحد من القراءات الخام (والمؤرشفة إن وجدت). يُستخدم عند التعديل أو الحذف
+    لأن الحد الأدنى والأعلى لا يمكن طرحهما تدريجياً.
+    """
+    values = readings.aggregate(**rollup_aggregates())
+    if archived:
+        values = combine_rows(values, archived)
+    if not values['count']:
+        model.objects.filter(**lookup).delete()
+        return
+    model.objects.update_or_create(**lookup, defaults=values)
+
+
+def recompute_for_timestamps(patient_id, timestamps):
+    readings = BloodGlucoseReading.objects.filter(patient_id=patient_id)
+    with transaction.atomic():
+        for hour in {hour_of(ts) for ts in timestamps}:
+            end = hour + timedelta(hours=1)
+            recompute_bucket(
+                GlucoseHourlyRollup, {'patient_id': patient_id, 'hour': hour},
+                readings.filter(reading_timestamp__gte=hour, reading_timestamp__lt=end),
+                archived_rollup(patient_id, hour, end),
+            )
+        for day in {day_of(ts) for ts in timestamps}:
+            start, end = day_bounds(day)
+            recompute_bucket(
+                GlucoseDailyRollup, {'patient_id': patient_id, 'day': day},
+                readings.filter(reading_timestamp__gte=start, reading_timestamp__lt=end),
+                archived_rollup(patient_id, start, end),
+            )
+
+
+def archived_buckets(patient_ids):
+    """
+    مجاميع الساعات والأيام من الأشهر المؤرشفة: ({(patient_id, hour): row}, {(patient_id, day): row}).
+    """
+    hourly = {}
+    daily = {}
+    for patient_id in patient_ids:
+        for segment in archived_segments(patient_id):
+            columns = load_segment(segment)
+            ts = (columns['ts'] + 500_000) // 1_000_000
+            values, types = archived_values(columns['value']), columns['type']
+            start, end = month_start(segment.month), month_start(next_month(segment.month))
+            # بداية الشهر المحلي تقع دائماً على بداية ساعة UTC (فرق التوقيت ساعات كاملة)
+            hour_edges = np.arange(int(start.timestamp()), int(end.timestamp()) + 1, 3600)
+            for i, row in rollup_rows(aggregate_readings(ts, values, types, hour_edges)):
+                hourly[(patient_id, datetime.fromtimestamp(hour_edges[i], dt_timezone.utc))] = row
+            day_edges, days = bucket_edges(start, end, 'day')
+            for i, row in rollup_rows(aggregate_readings(ts, values, types, day_edges)):
+                daily[(patient_id, days[i])] = row
+    return hourly, daily
+
+
+def merge_archived(rows, archived):
+    by_key = {(row['patient_id'], row['bucket']): row for row in rows}
+    for (patient_id, bucket), extra in archived.items():
+        row = by_key.get((patient_id, bucket))
+        by_key[(patient_id, bucket)] = dict(
+            combine_rows(row or {}, extra), patient_id=patient_id, bucket=bucket
+        )
+    return list(by_key.values())
+
+
+def rebuild_patients(patient_ids):
+    """
+    يعيد بناء الـ rollups لمجموعة مرضى من الصفر باستعلامي GROUP BY، مع إضافة الأشهر المؤرشفة.
+    """
+    readings = BloodGlucoseReading.objects.filter(patient_id__in=patient_ids)
+    hourly = (
+        readings.annotate(bucket=TruncHour('reading_timestamp', tzinfo=dt_timezone.utc))
+        .values('patient_id', 'bucket').annotate(**rollup_aggregates()).order_by()
+    )
+    daily = (
+        readings.annotate(bucket=TruncDate('reading_timestamp'))
+        .values('patient_id', 'bucket').annotate(**rollup_aggregates()).order_by()
+    )
+    archived_hourly, archived_daily = archived_buckets(patient_ids)
+    hourly = merge_archived(hourly, archived_hourly)
+    daily = merge_archived(daily, archived_daily)
+    with transaction.atomic():
+        GlucoseHourlyRollup.objects.filter(patient_id__in=patient_ids).delete()
+        GlucoseDailyRollup.objects.filter(patient_id__in=patient_ids).delete()
+        GlucoseHourlyRollup.objects.bulk_create(
+            [GlucoseHourlyRollup(hour=row.pop('bucket'), **row) for row in hourly], batch_size=500
+        )
+        GlucoseDailyRollup.objects.bulk_create(
+            [GlucoseDailyRollup(day=row.pop('bucket'), **row) for row in daily], batch_size=500
+        )
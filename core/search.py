@@ -0,0 +1,117 @@
+# core/search.py
+
+import re
+
+from django.db import connection
+from django.db.models import Lookup
+
+from .models import DoctorProfile, DoctorSearch
+
+SEARCH_TABLE = DoctorSearch._meta.db_table
+SEARCH_COLUMNS = ('name', 'specialty', 'bio', 'address')
+# أوزان bm25 بنفس ترتيب الأعمدة: تطابق الاسم أهم من التخصص، ثم العنوان، ثم النبذة
+RANK_WEIGHTS = (10.0, 5.0, 1.0, 2.0)
+INDEX_CHUNK_SIZE = 1000
+
+# التشكيل والتطويل لا يدخلان في الفهرس، والحروف التي تُكتب بأكثر من شكل توحَّد
+ARABIC_MARKS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+ARABIC_LETTERS = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي', 'ؤ': 'و', 'ة': 'ه',
+})
+# "ال" التعريف وما يسبقها: "القلب" و "بالقلب" تُفهرس أيضاً كـ "قلب" حتى يطابقها البحث عن "قلب"
+ARABIC_ARTICLES = ('وال', 'بال', 'كال', 'فال', 'لل', 'ال')
+WORD = re.compile(r'\w+')
+
+
+def normalize(text):
+    return ARABIC_MARKS.sub('', (text or '').lower()).translate(ARABIC_LETTERS)
+
+
+def strip_article(word):
+    for article in ARABIC_ARTICLES:
+        if word.startswith(article) and len(word) - len(article) >= 2:
+            return word[len(article):]
+    return word
+
+
+def document_text(text):
+    """
+    النص كما يُخزن في الفهرس: موحد، مع نسخة بدون "ال" لكل كلمة معرّفة.
+    """
+    text = normalize(text)
+    words = WORD.findall(text)
+    stems = [stem for stem in dict.fromkeys(map(strip_article, words)) if stem not in words]
+    return ' '.join([text] + stems)
+
+
+def match_expression(query):
+    """
+    يحول نص البحث إلى استعلام FTS5: كل كلمة بادئة ("كلمة"*) والكلمات كلها مطلوبة (AND).
+    يرجع None إذا لم يكن في النص أي كلمة.
+    """
+    words = [strip_article(word) for word in WORD.findall(normalize(query))]
+    return ' '.join(f'"{word}"*' for word in words) or None
+
+
+class Match(Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+DoctorSearch._meta.get_field('document').register_lookup(Match)
+
+
+def search_doctors(queryset, query):
+    """
+    يقيد queryset الأطباء بنتائج البحث مرتبة بالأقرب (bm25). الـ JOIN يبدأ من جدول FTS5،
+    فتكلفة البحث بعدد النتائج وليس بعدد الأطباء.
+    """
+    expression = match_expression(query)
+    if expression is None:
+        return queryset.none()
+    return queryset.filter(search_entry__document__match=expression).order_by('search_entry__rank', 'pk')
+
+
+def index_doctors(doctor_ids):
+    """
+    يعيد كتابة صفوف الفهرس لهؤلاء الأطباء من DoctorProfile و User.
+    """
+    rows = DoctorProfile.objects.filter(pk__in=doctor_ids).values_list(
+        'pk', 'user__first_name', 'user__last_name', 'specialty', 'bio', 'address'
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT OR REPLACE INTO {SEARCH_TABLE} (rowid, {', '.join(SEARCH_COLUMNS)}) VALUES (%s, %s, %s, %s, %s)",
+            [
+                (pk, document_text(f'{first_name} {last_name}'), document_text(specialty),
+                 document_text(bio), document_text(address))
+                for pk, first_name, last_name, specialty, bio, address in rows
+            ],
+        )
+
+
+def remove_doctor(doctor_id):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [doctor_id])
+
+
+def rebuild_doctor_index():
+    """
+    يبني الفهرس من الصفر (بعد إدخال أطباء بـ bulk_create أو update() لا تمر على الـ signals).
+    أوزان bm25 تُحفظ في إعدادات الجدول، فيحسبها عمود rank مباشرة.
+    """
+    weights = ', '.join(map(str, RANK_WEIGHTS))
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}, rank) VALUES ('rank', %s)", [f'bm25({weights})'])
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+    ids = list(DoctorProfile.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(ids), INDEX_CHUNK_SIZE):
+        index_doctors(ids[start:start + INDEX_CHUNK_SIZE])
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+    return len(ids)
@@ -6,9 +6,10 @@ from rest_framework.authtoken.models import Token
 from .models import (
     PatientProfile, BloodGlucoseReading, Medication, DoctorNote,
     Attachment, Consultation, Alert, DoctorProfile, FavoriteDoctor,
-    Appointment, Notification
+    Appointment, Notification, GlucoseTarget, DoctorReview, DoctorSchedule, ScheduleException
 )
 from django.contrib.auth import authenticate
+from django.contrib.contenttypes.prefetch import GenericPrefetch
 
 # --- AuthToken Serializer ---
 class AuthTokenSerializer(serializers.Serializer):
@@ -104,6 +105,33 @@ class PatientListForDoctorSerializer(serializers.ModelSerializer):
         model = PatientProfile
         fields = ['id', 'full_name', 'phone_number', 'diabetes_type']
 
+# --- لوحة مرضى الطبيب: الحقول كلها annotations من core.dashboard.caseload ---
+class PatientDashboardSerializer(serializers.ModelSerializer):
+    full_name = serializers.CharField(source='user.get_full_name', read_only=True)
+    last_reading_value = serializers.FloatField(read_only=True)
+    last_reading_at = serializers.DateTimeField(read_only=True)
+    week_count = serializers.IntegerField(read_only=True)
+    week_mean = serializers.FloatField(read_only=True)
+    time_in_range = serializers.FloatField(read_only=True)
+    risk = serializers.FloatField(read_only=True)
+    next_appointment_date = serializers.DateField(read_only=True)
+    next_appointment_time = serializers.TimeField(read_only=True)
+
+    class Meta:
+        model = PatientProfile
+        fields = [
+            'id', 'full_name', 'phone_number', 'diabetes_type',
+            'last_reading_value', 'last_reading_at', 'week_count', 'week_mean', 'time_in_range', 'risk',
+            'next_appointment_date', 'next_appointment_time',
+        ]
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        for field in ('week_mean', 'time_in_range', 'risk'):
+            if data[field] is not None:
+                data[field] = round(data[field], 1)
+        return data
+
 # --- PatientMedicalData Serializer ---
 class PatientMedicalDataSerializer(serializers.ModelSerializer):
     class Meta:
@@ -118,6 +146,37 @@ class BloodGlucoseReadingSerializer(serializers.ModelSerializer):
         fields = ['id', 'patient', 'patient_name', 'reading_value', 'reading_timestamp', 'reading_type', 'notes']
         read_only_fields = ['id', 'patient', 'reading_timestamp', 'patient_name']
 
+# --- Serializer لعنصر واحد في دفعة المزامنة من جهاز القياس ---
+class BloodGlucoseReadingBulkItemSerializer(serializers.ModelSerializer):
+    """
+    الجهاز يرسل وقت القياس الفعلي، لذلك reading_timestamp هنا قابل للكتابة (اختياري).
+    """
+    class Meta:
+        model = BloodGlucoseReading
+        fields = ['reading_value', 'reading_timestamp', 'reading_type', 'notes']
+
+    def validate_reading_value(self, value):
+        if value <= 0:
+            raise serializers.ValidationError('Reading value must be positive.')
+        return value
+
+# --- النطاق المستهدف للسكر (يحدده الطبيب) ---
+class GlucoseTargetSerializer(serializers.ModelSerializer):
+    set_by_name = serializers.CharField(source='set_by.get_full_name', read_only=True, default=None)
+    class Meta:
+        model = GlucoseTarget
+        fields = ['low', 'high', 'set_by', 'set_by_name', 'updated_at']
+        read_only_fields = ['set_by', 'set_by_name', 'updated_at']
+
+    def validate(self, data):
+        low = data.get('low', getattr(self.instance, 'low', None))
+        high = data.get('high', getattr(self.instance, 'high', None))
+        if low is None or high is None:
+            raise serializers.ValidationError('Both low and high are required.')
+        if low <= 0 or low >= high:
+            raise serializers.ValidationError('Expected 0 < low < high.')
+        return data
+
 # --- Medication Serializer ---
 class MedicationSerializer(serializers.ModelSerializer):
     patient_name = serializers.CharField(source='patient.user.first_name', read_only=True)
@@ -196,11 +255,71 @@ class AlertSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'patient', 'patient_name', 'created_at']
 
 # --- Notification Serializer ---
+class AppointmentSummarySerializer(serializers.ModelSerializer):
+    doctor_name = serializers.CharField(source='doctor.user.get_full_name', read_only=True)
+    patient_name = serializers.CharField(source='patient.user.get_full_name', read_only=True)
+
+    class Meta:
+        model = Appointment
+        fields = ['id', 'appointment_date', 'appointment_time', 'status', 'doctor_name', 'patient_name']
+
+class ConsultationSummarySerializer(serializers.ModelSerializer):
+    doctor_name = serializers.CharField(source='doctor.get_full_name', read_only=True, default=None)
+
+    class Meta:
+        model = Consultation
+        fields = ['id', 'consultation_date', 'consultation_time', 'doctor_name']
+
+class ReadingSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BloodGlucoseReading
+        fields = ['id', 'reading_value', 'reading_timestamp', 'reading_type']
+
+# model -> (الـ serializer المختصر، الـ queryset الذي يحمل ما يحتاجه في نفس الاستعلام)
+RELATED_SUMMARIES = {
+    Appointment: (AppointmentSummarySerializer, Appointment.objects.select_related('doctor__user', 'patient__user')),
+    Consultation: (ConsultationSummarySerializer, Consultation.objects.select_related('doctor')),
+    BloodGlucoseReading: (ReadingSummarySerializer, BloodGlucoseReading.objects.all()),
+}
+
+def notification_related_prefetch():
+    """
+    يحمل related_object لصفحة إشعارات كاملة باستعلام واحد لكل نوع (content type) بدل استعلام لكل إشعار:
+    queryset.prefetch_related(notification_related_prefetch()) أو prefetch_related_objects(قائمة، ...).
+    """
+    return GenericPrefetch('related_object', [queryset for _, queryset in RELATED_SUMMARIES.values()])
+
 class NotificationSerializer(serializers.ModelSerializer):
+    # ملخص العنصر المرتبط (موعد، استشارة، قراءة) حتى لا يطلبه العميل بطلب منفصل لكل إشعار
+    related = serializers.SerializerMethodField()
+
     class Meta:
         model = Notification
-        fields = ['id', 'recipient', 'message', 'is_read', 'timestamp']
-        read_only_fields = ['id', 'recipient', 'message', 'timestamp']
+        fields = ['id', 'recipient', 'message', 'kind', 'count', 'is_read', 'timestamp', 'related']
+        read_only_fields = ['id', 'recipient', 'message', 'kind', 'count', 'timestamp']
+
+    def get_related(self, obj):
+        if obj.content_type_id is None:
+            return None
+        related = obj.related_object
+        if related is None:
+            # العنصر حُذف بعد الإشعار
+            return None
+        summary = RELATED_SUMMARIES.get(type(related))
+        data = summary[0](related).data if summary else {'id': related.pk}
+        return {'type': related._meta.model_name, **data}
+
+class NotificationMarkReadSerializer(serializers.Serializer):
+    """
+    مدخلات mark-read: قائمة ids أو وقت until (كل ما قبله وحتى هو)، واحد منهما فقط.
+    """
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=1000, required=False)
+    until = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        if ('ids' in attrs) == ('until' in attrs):
+            raise serializers.ValidationError("Provide exactly one of 'ids' or 'until'.")
+        return attrs
 
 # --- NEW: Serializer for Doctor's Personal Data ONLY ---
 class DoctorProfileSerializer(serializers.ModelSerializer):
@@ -254,14 +373,12 @@ class DoctorProfileDetailSerializer(serializers.ModelSerializer):
         model = DoctorProfile
         fields = [
             'id', 'user', 'specialty', 'address', 'phone_number',
-            'bio', 'working_hours', 'is_available', 'average_rating', 'is_favorited'
+            'bio', 'working_hours', 'is_available', 'average_rating', 'rating_count', 'is_favorited'
         ]
-        read_only_fields = ['id', 'user', 'is_available', 'average_rating', 'is_favorited']
+        read_only_fields = ['id', 'user', 'is_available', 'average_rating', 'rating_count', 'is_favorited']
     def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated and hasattr(request.user, 'patientprofile'):
-            return FavoriteDoctor.objects.filter(patient=request.user.patientprofile, doctor=obj).exists()
-        return False
+        # مفضلة المريض تُحمّل مرة واحدة لكل طلب (DoctorViewSet.get_serializer_context) بدل exists() لكل طبيب
+        return obj.pk in self.context.get('favorite_doctor_ids', ())
 class DoctorCreateSerializer(serializers.ModelSerializer):
     # نستقبل بيانات إنشاء المستخدم الأساسي مع البروفايل في طلب واحد
     user = UserSerializer()
@@ -414,12 +531,9 @@ class DoctorBookingsSerializer(serializers.ModelSerializer):
 
 class FavoriteDoctorListSerializer(serializers.ModelSerializer):
     full_name = serializers.CharField(source='user.get_full_name', read_only=True)
-    favorites_count = serializers.SerializerMethodField()
     class Meta:
         model = DoctorProfile
         fields = ['id', 'full_name', 'address', 'phone_number', 'favorites_count']
-    def get_favorites_count(self, obj):
-        return obj.favorited_by_patients.count()
 
 class FavoriteDoctorSerializer(serializers.ModelSerializer):
     doctor = FavoriteDoctorListSerializer(read_only=True)
@@ -434,6 +548,7 @@ class DoctorProfileListSerializer(serializers.ModelSerializer):
     تم تعديله ليعرض الاسم الكامل وحقل المؤهلات (bio).
     """
     full_name = serializers.CharField(source='user.get_full_name', read_only=True)
+    is_favorited = serializers.SerializerMethodField()
 
     class Meta:
         model = DoctorProfile
@@ -444,5 +559,58 @@ class DoctorProfileListSerializer(serializers.ModelSerializer):
             'address', 
             'phone_number',
             'is_available', 
-            'average_rating'
-        ]
\ No newline at end of file
+            'average_rating',
+            'rating_count',
+            'is_favorited'
+        ]
+
+    def get_is_favorited(self, obj):
+        return obj.pk in self.context.get('favorite_doctor_ids', ())
+
+# --- تقييم المريض للطبيب ---
+class DoctorReviewSerializer(serializers.ModelSerializer):
+    patient_name = serializers.CharField(source='patient.user.get_full_name', read_only=True)
+    class Meta:
+        model = DoctorReview
+        fields = ['id', 'patient_name', 'rating', 'comment', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'patient_name', 'created_at', 'updated_at']
+
+# --- جدول عمل الطبيب ---
+class DoctorScheduleSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DoctorSchedule
+        fields = ['id', 'weekday', 'start_time', 'end_time', 'slot_minutes']
+        read_only_fields = ['id']
+
+    def validate(self, data):
+        weekday = data.get('weekday', getattr(self.instance, 'weekday', None))
+        start_time = data.get('start_time', getattr(self.instance, 'start_time', None))
+        end_time = data.get('end_time', getattr(self.instance, 'end_time', None))
+        if start_time >= end_time:
+            raise serializers.ValidationError({'end_time': "'end_time' must be later than 'start_time'."})
+        # حساب المواعيد المتاحة (core.slots) يفترض أن فترات اليوم الواحد لا تتداخل
+        overlapping = DoctorSchedule.objects.filter(
+            doctor=self.context['request'].user.doctorprofile, weekday=weekday,
+            start_time__lt=end_time, end_time__gt=start_time,
+        )
+        if self.instance is not None:
+            overlapping = overlapping.exclude(pk=self.instance.pk)
+        if overlapping.exists():
+            raise serializers.ValidationError('This period overlaps another period on the same day.')
+        return data
+
+class ScheduleExceptionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ScheduleException
+        fields = ['id', 'date', 'start_time', 'end_time', 'reason']
+        read_only_fields = ['id']
+
+    def validate(self, data):
+        start_time = data.get('start_time', getattr(self.instance, 'start_time', None))
+        end_time = data.get('end_time', getattr(self.instance, 'end_time', None))
+        # بدون ساعات = اليوم كله
+        if (start_time is None) != (end_time is None):
+            raise serializers.ValidationError("Provide both 'start_time' and 'end_time', or neither for a full day.")
+        if start_time is not None and start_time >= end_time:
+            raise serializers.ValidationError({'end_time': "'end_time' must be later than 'start_time'."})
+        return data
@@ -0,0 +1,128 @@
+# core/series.py
+
+from datetime import datetime
+
+import numpy as np
+from django.utils import timezone
+
+from .glucose import EpochSeconds, fetch_patient_readings
+from .models import GlucoseHourlyRollup
+
+DEFAULT_POINTS = 500
+MAX_POINTS = 5000
+ALGORITHMS = ('lttb', 'minmax')
+HOUR = 3600
+
+
+def lttb(ts, values, threshold):
+    """
+    Largest-Triangle-Three-Buckets: يقسم النقاط (ما عدا الأولى والأخيرة) إلى threshold - 2 مجموعة،
+    ويختار من كل مجموعة النقطة التي تصنع أكبر مثلث مع النقطة المختارة قبلها ومتوسط المجموعة التالية،
+    فتبقى القمم والانخفاضات ظاهرة في الرسم. يرجع مواقع النقاط المختارة.
+    """
+    n = len(ts)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = (ts - ts[0]).astype(np.float64)
+    y = values.astype(np.float64)
+
+    # حدود المجموعات الداخلية، كل مجموعة [edges[i], edges[i + 1])
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    counts = np.diff(edges)
+    # متوسط كل مجموعة محسوب مرة واحدة، والنقطة الأخيرة تلعب دور "المجموعة التالية" للمجموعة الأخيرة
+    avg_x = np.append(np.add.reduceat(x[:n - 1], edges[:-1]) / counts, x[-1])
+    avg_y = np.append(np.add.reduceat(y[:n - 1], edges[:-1]) / counts, y[-1])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    for i in range(threshold - 2):
+        a = selected[i]
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs((x[a] - avg_x[i + 1]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y[i + 1] - y[a]))
+        selected[i + 1] = lo + np.argmax(area)
+    return selected
+
+
+def minmax(values, threshold):
+    """
+    يقسم النقاط إلى threshold / 2 مجموعة متساوية العدد ويحتفظ بأصغر وأكبر قيمة في كل مجموعة.
+    بدون حلقات: ترتيب واحد بـ (المجموعة، القيمة) ثم أول وآخر عنصر في كل مجموعة.
+    """
+    n = len(values)
+    if threshold >= n or threshold < 2:
+        return np.arange(n)
+    groups = threshold // 2
+    group = np.arange(n) * groups // n
+    order = np.lexsort((values, group))
+    starts = np.searchsorted(group, np.arange(groups))
+    ends = np.append(starts[1:], n) - 1
+    return np.unique(np.concatenate([order[starts], order[ends]]))
+
+
+def rollup_group_seconds(start, end, points):
+    """
+    عرض مجموعة minmax بالثواني (ساعات كاملة) إذا أمكن الإجابة من GlucoseHourlyRollup:
+    الفترة على رأس الساعة وكل مجموعة ساعة أو أكثر. غير ذلك None.
+    """
+    seconds = (end - start).total_seconds()
+    if start.timestamp() % HOUR or end.timestamp() % HOUR or seconds / (points // 2) < HOUR:
+        return None
+    return -(-seconds // (points // 2) // HOUR) * HOUR
+
+
+def minmax_from_rollups(patient_id, start, end, width):
+    """
+    minmax بمجموعات زمنية من width ثانية، من أدنى وأعلى قيمة في صفوف الـ rollup الساعية
+    (تشمل الأشهر المؤرشفة)، فالتكلفة بعدد الساعات وليس بعدد القراءات. الـ rollup لا يعرف دقيقة القراءة،
+    فوقت النقطة بداية الساعة التي فيها القيمة. يرجع (ts, values, عدد القراءات الكلي).
+    """
+    rows = np.array(list(
+        GlucoseHourlyRollup.objects.filter(patient_id=patient_id, hour__gte=start, hour__lt=end)
+        .annotate(epoch=EpochSeconds('hour')).order_by('hour')
+        .values_list('epoch', 'min_value', 'max_value', 'count')
+    ), dtype='f8').reshape(-1, 4)
+    if not len(rows):
+        return np.empty(0, np.int64), np.empty(0, np.float64), 0
+    hours, low, high, count = rows.T
+    group = ((hours - start.timestamp()) // width).astype(np.int64)
+    # أول صف في كل مجموعة بعد الترتيب بـ (المجموعة، القيمة) هو الأدنى، وآخر صف هو الأعلى
+    by_low = np.lexsort((low, group))
+    by_high = np.lexsort((high, group))
+    starts = np.unique(group[by_low], return_index=True)[1]
+    ends = np.append(starts[1:], len(group)) - 1
+    lowest, highest = by_low[starts], by_high[ends]
+    # ساعة فيها قراءة واحدة: الأدنى والأعلى نفس النقطة
+    keep = (lowest != highest) | (low[lowest] != high[highest])
+    ts = np.concatenate([hours[lowest], hours[highest][keep]]).astype(np.int64)
+    values = np.concatenate([low[lowest], high[highest][keep]])
+    order = np.argsort(ts, kind='stable')
+    return ts[order], values[order], int(count.sum())
+
+
+def glucose_series(patient_id, start, end, points=DEFAULT_POINTS, algorithm='lttb'):
+    """
+    سلسلة قراءات مخففة للرسم البياني في [start, end) بحوالي points نقطة.
+    minmax بمجموعات ساعة أو أكثر يُقرأ من الـ rollups الساعية، وغير ذلك تُجلب القراءات باستعلام واحد:
+    LTTB يختار قراءات فعلية حسب شكل المنحنى، فيحتاجها كلها.
+    """
+    width = rollup_group_seconds(start, end, points) if algorithm == 'minmax' else None
+    if width:
+        ts, values, total = minmax_from_rollups(patient_id, start, end, width)
+    else:
+        ts, values, _ = fetch_patient_readings(patient_id, start, end)
+        total = len(ts)
+        selected = minmax(values, points) if algorithm == 'minmax' else lttb(ts, values, points)
+        ts, values = ts[selected], values[selected]
+    tz = timezone.get_current_timezone()
+    return {
+        'from': start,
+        'to': end,
+        'algorithm': algorithm,
+        'total': total,
+        'count': len(ts),
+        'series': [
+            {'timestamp': datetime.fromtimestamp(t, tz), 'value': v}
+            # القراءات المؤرشفة مخزنة float32، فنقرب حتى لا تظهر كسور عشوائية
+            for t, v in zip(ts.tolist(), np.round(values, 2).tolist())
+        ],
+    }
@@ -0,0 +1,148 @@
+# core/signals.py
+
+from django.contrib.auth.models import User
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .detection import process_new_readings
+from .ical import touch_patient_bookings
+from .agp import invalidate_agp
+from .archive import remove_generations
+from .models import BloodGlucoseReading, DoctorProfile, DoctorReview, PatientProfile, ReadingArchive, SyncTombstone
+from .ratings import apply_rating
+from .rollups import apply_new_readings, recompute_for_timestamps
+from .search import index_doctors, remove_doctor
+from .sync import SYNC_KEYS
+
+
+# --- تحديث جداول الـ rollup والـ AGP المخزن مع كل إنشاء/تعديل/حذف لقراءة، وكشف القراءات الخطرة عند الإنشاء ---
+@receiver(pre_save, sender=BloodGlucoseReading)
+def remember_previous_timestamp(sender, instance, **kwargs):
+    # عند التعديل نحتاج الوقت القديم لنعيد حساب الـ bucket الذي خرجت منه القراءة
+    if instance.pk:
+        instance._previous_timestamp = (
+            BloodGlucoseReading.objects.filter(pk=instance.pk).values_list('reading_timestamp', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=BloodGlucoseReading)
+def update_rollups_on_save(sender, instance, created, **kwargs):
+    if created:
+        apply_new_readings([instance])
+        process_new_readings(instance.patient, [instance])
+        invalidate_agp(instance.patient_id, [instance.reading_timestamp])
+        return
+    timestamps = [instance.reading_timestamp]
+    previous = getattr(instance, '_previous_timestamp', None)
+    if previous is not None:
+        timestamps.append(previous)
+    recompute_for_timestamps(instance.patient_id, timestamps)
+    invalidate_agp(instance.patient_id, timestamps)
+
+
+def deleting_patient(origin):
+    """
+    هل الحذف بدأ من المريض نفسه (أو حسابه)؟ عندها تُحذف كل بياناته وجداول الـ rollup بالتسلسل.
+    """
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return origin_model in (PatientProfile, User)
+
+
+@receiver(post_delete, sender=BloodGlucoseReading)
+def update_rollups_on_delete(sender, instance, origin=None, **kwargs):
+    if deleting_patient(origin):
+        return
+    recompute_for_timestamps(instance.patient_id, [instance.reading_timestamp])
+    invalidate_agp(instance.patient_id, [instance.reading_timestamp])
+
+
+# --- Tombstones للمزامنة: كل حذف من بيانات المريض يُسجل ليصل لتطبيق الجوال ---
+def record_tombstone(sender, instance, origin=None, **kwargs):
+    # لا يبقى من يزامن بيانات مريض محذوف
+    if deleting_patient(origin):
+        return
+    SyncTombstone.objects.create(patient_id=instance.patient_id, model_name=SYNC_KEYS[sender], object_id=instance.pk)
+
+
+for model in SYNC_KEYS:
+    post_delete.connect(record_tombstone, sender=model, dispatch_uid=f'sync_tombstone_{model.__name__}')
+
+
+# --- ملفات الأرشيف تُحذف مع سجلها (مثلاً عند حذف المريض) ---
+@receiver(post_delete, sender=ReadingArchive)
+def remove_archive_files(sender, instance, **kwargs):
+    remove_generations(instance.patient_id, instance.month, keep=None)
+
+
+# --- فهرس البحث في دليل الأطباء يتبع DoctorProfile واسم المستخدم ---
+# الحقول التي تدخل الفهرس، حتى لا يُعاد فهرسة الطبيب عند حفظ حقول أخرى (مثل last_login عند الدخول)
+SEARCH_PROFILE_FIELDS = {'specialty', 'bio', 'address'}
+SEARCH_USER_FIELDS = {'first_name', 'last_name'}
+
+
+def touches(update_fields, fields):
+    return update_fields is None or bool(fields & set(update_fields))
+
+
+@receiver(post_save, sender=DoctorProfile)
+def index_doctor_profile(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or not touches(update_fields, SEARCH_PROFILE_FIELDS):
+        return
+    index_doctors([instance.pk])
+
+
+@receiver(post_save, sender=User)
+def index_doctor_name(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # المستخدم الجديد يُفهرس عند إنشاء DoctorProfile له، والمرضى لا يدخلون الفهرس
+    if created or raw or not instance.is_staff or not touches(update_fields, SEARCH_USER_FIELDS):
+        return
+    index_doctors(DoctorProfile.objects.filter(user=instance).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=DoctorProfile)
+def remove_doctor_from_search(sender, instance, **kwargs):
+    remove_doctor(instance.pk)
+
+
+# --- تقويم حجوزات الطبيب يعرض اسم المريض، فيُعاد بناؤه عند تغير الاسم ---
+@receiver(pre_save, sender=User)
+def remember_previous_name(sender, instance, raw=False, update_fields=None, **kwargs):
+    if instance.pk and not raw and touches(update_fields, SEARCH_USER_FIELDS):
+        instance._previous_name = User.objects.filter(pk=instance.pk).values_list('first_name', 'last_name').first()
+
+
+@receiver(post_save, sender=User)
+def refresh_patient_bookings(sender, instance, created, **kwargs):
+    previous = instance.__dict__.pop('_previous_name', None)
+    if created or previous is None or previous == (instance.first_name, instance.last_name):
+        return
+    touch_patient_bookings(instance)
+
+
+# --- مجاميع تقييم الطبيب تتبع كل تقييم جديد أو معدل أو محذوف ---
+@receiver(pre_save, sender=DoctorReview)
+def remember_previous_rating(sender, instance, **kwargs):
+    if instance.pk:
+        instance._previous_rating = (
+            DoctorReview.objects.filter(pk=instance.pk).values_list('doctor_id', 'rating').first()
+        )
+
+
+@receiver(post_save, sender=DoctorReview)
+def update_rating_on_save(sender, instance, created, **kwargs):
+    previous = None if created else getattr(instance, '_previous_rating', None)
+    if previous is None:
+        apply_rating(instance.doctor_id, instance.rating, 1)
+        return
+    previous_doctor, previous_rating = previous
+    if previous_doctor != instance.doctor_id:
+        apply_rating(previous_doctor, -previous_rating, -1)
+        apply_rating(instance.doctor_id, instance.rating, 1)
+    elif previous_rating != instance.rating:
+        apply_rating(instance.doctor_id, instance.rating - previous_rating, 0)
+
+
+@receiver(post_delete, sender=DoctorReview)
+def update_rating_on_delete(sender, instance, **kwargs):
+    apply_rating(instance.doctor_id, -instance.rating, -1)
@@ -0,0 +1,158 @@
+# core/slots.py
+
+from collections import defaultdict
+from datetime import time, timedelta
+from heapq import merge
+
+from django.db.models import DateField, F, IntegerField, TimeField, Value
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+from .models import Appointment, DoctorSchedule, ScheduleException
+
+DEFAULT_SLOT_DAYS = 14
+MAX_SLOT_DAYS = 62
+DAY_MINUTES = 24 * 60
+# المواعيد التي تحجز وقتاً من الجدول (المرفوضة لا تحجز شيئاً)
+BLOCKING_STATUSES = ('Pending', 'Confirmed')
+# مدة الموعد خارج أي فترة عمل (موعد قديم قبل إدخال الجدول مثلاً)
+DEFAULT_APPOINTMENT_MINUTES = 30
+
+SCHEDULE, EXCEPTION, APPOINTMENT = 0, 1, 2
+
+
+def parse_slot_range(params):
+    """
+    يقرأ from/to (YYYY-MM-DD، شاملين) من الـ query params. الافتراضي DEFAULT_SLOT_DAYS يوماً من اليوم،
+    والأيام الماضية لا تدخل. يرجع (first_day, last_day).
+    """
+    today = timezone.localdate()
+
+    def parse(name):
+        raw = params.get(name)
+        if not raw:
+            return None
+        try:
+            day = parse_date(raw)
+        except ValueError:
+            day = None
+        if day is None:
+            raise ValidationError({name: 'Expected a date (YYYY-MM-DD).'})
+        return day
+
+    first_day = max(parse('from') or today, today)
+    last_day = parse('to') or first_day + timedelta(days=DEFAULT_SLOT_DAYS - 1)
+    if last_day < first_day:
+        raise ValidationError({'to': "'to' must not be earlier than 'from' (or today)."})
+    if (last_day - first_day).days >= MAX_SLOT_DAYS:
+        raise ValidationError({'to': f'The range can cover at most {MAX_SLOT_DAYS} days.'})
+    return first_day, last_day
+
+
+def minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def schedule_rows(doctor_id, first_day, last_day):
+    """
+    الجدول والاستثناءات والمواعيد في استعلام واحد (UNION ALL) مرتبة بـ (النوع، اليوم، الوقت):
+    كل نوع يصل مرتباً فيُدمج بعدها بمرور خطي واحد. المواعيد فرعان حتى يقرأ كل منهما
+    فهرسه الجزئي (appointment_pending_idx / appointment_confirmed_idx).
+    """
+    null = lambda field: Value(None, output_field=field)
+    schedules = DoctorSchedule.objects.filter(doctor_id=doctor_id).order_by().values(
+        kind=Value(SCHEDULE), day=null(DateField()), dow=F('weekday'),
+        start=F('start_time'), end=F('end_time'), length=F('slot_minutes'),
+    )
+    exceptions = ScheduleException.objects.filter(
+        doctor_id=doctor_id, date__range=(first_day, last_day),
+    ).order_by().values(
+        kind=Value(EXCEPTION), day=F('date'), dow=null(IntegerField()),
+        start=F('start_time'), end=F('end_time'), length=null(IntegerField()),
+    )
+    appointments = [
+        Appointment.objects.filter(
+            doctor_id=doctor_id, status=status, appointment_date__range=(first_day, last_day),
+        ).order_by().values(
+            kind=Value(APPOINTMENT), day=F('appointment_date'), dow=null(IntegerField()),
+            start=F('appointment_time'), end=null(TimeField()), length=null(IntegerField()),
+        )
+        for status in BLOCKING_STATUSES
+    ]
+    return schedules.union(exceptions, *appointments, all=True).order_by('kind', 'day', 'dow', 'start').values_list(
+        'kind', 'day', 'dow', 'start', 'end', 'length'
+    )
+
+
+def busy_intervals(blocks, exceptions, appointments):
+    """
+    أوقات اليوم المحجوزة كفترات [من، إلى) بالدقائق، مدموجة وغير متداخلة ومرتبة.
+    الاستثناء بدون ساعات يحجز اليوم كله، والموعد يحجز مدة موعد الفترة التي يقع فيها.
+    """
+    closed = [
+        (minutes(start) if start is not None else 0, minutes(end) if end is not None else DAY_MINUTES)
+        for start, end in exceptions
+    ]
+    booked = []
+    position = 0
+    for start in appointments:
+        start = minutes(start)
+        # المواعيد والفترات مرتبة، فالبحث عن فترة الموعد لا يرجع للخلف
+        while position < len(blocks) and blocks[position][1] <= start:
+            position += 1
+        inside = position < len(blocks) and blocks[position][0] <= start
+        booked.append((start, start + (blocks[position][2] if inside else DEFAULT_APPOINTMENT_MINUTES)))
+
+    merged = []
+    for start, end in merge(sorted(closed), booked):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def free_slots(doctor_id, first_day, last_day):
+    """
+    المواعيد المتاحة للطبيب من first_day إلى last_day (شاملين): فترات الجدول الأسبوعي مقسمة
+    بطول slot_minutes، ناقص الاستثناءات والمواعيد المعلقة والمؤكدة. استعلام واحد ثم مرور
+    خطي على كل يوم بمؤشرين (الـ slots والفترات المحجوزة كلاهما مرتب).
+    يرجع قائمة {'date', 'start', 'end'}.
+    """
+    blocks = defaultdict(list)
+    exceptions = defaultdict(list)
+    appointments = defaultdict(list)
+    for kind, day, dow, start, end, length in schedule_rows(doctor_id, first_day, last_day):
+        if kind == SCHEDULE:
+            blocks[dow].append((minutes(start), minutes(end), length))
+        elif kind == EXCEPTION:
+            exceptions[day].append((start, end))
+        else:
+            appointments[day].append(start)
+
+    now = timezone.localtime()
+    slots = []
+    day = first_day
+    while day <= last_day:
+        day_blocks = blocks.get(day.weekday())
+        if day_blocks:
+            busy = busy_intervals(day_blocks, exceptions.get(day, ()), appointments.get(day, ()))
+            # ما مضى من اليوم الحالي محجوز أيضاً
+            earliest = minutes(now) + 1 if day == now.date() else 0
+            position = 0
+            for block_start, block_end, length in day_blocks:
+                start = block_start
+                while start + length <= block_end:
+                    end = start + length
+                    while position < len(busy) and busy[position][1] <= start:
+                        position += 1
+                    if start >= earliest and (position == len(busy) or busy[position][0] >= end):
+                        slots.append({
+                            'date': day,
+                            'start': time(start // 60, start % 60),
+                            'end': time(end // 60, end % 60),
+                        })
+                    start = end
+        day += timedelta(days=1)
+    return slots
@@ -0,0 +1,157 @@
+# core/sync.py
+
+import base64
+import json
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from .models import (
+    Alert, Appointment, Attachment, BloodGlucoseReading, Consultation, DoctorNote, Medication, SyncTombstone
+)
+from .serializers import (
+    AlertSerializer, AttachmentSerializer, BloodGlucoseReadingSerializer, ConsultationSerializer,
+    DoctorNoteSerializer, MedicationSerializer, PatientAppointmentSerializer
+)
+
+# (المفتاح في الاستجابة, الموديل, الـ serializer, العلاقات التي يحتاجها الـ serializer)
+SYNC_SOURCES = [
+    ('readings', BloodGlucoseReading, BloodGlucoseReadingSerializer, ['patient__user']),
+    ('medications', Medication, MedicationSerializer, ['patient__user']),
+    ('alerts', Alert, AlertSerializer, ['patient__user']),
+    ('appointments', Appointment, PatientAppointmentSerializer, ['doctor__user']),
+    ('doctor_notes', DoctorNote, DoctorNoteSerializer, ['patient__user', 'doctor']),
+    ('attachments', Attachment, AttachmentSerializer, ['patient__user']),
+    ('consultations', Consultation, ConsultationSerializer, ['doctor']),
+]
+SYNC_KEYS = {model: key for key, model, _, _ in SYNC_SOURCES}
+
+# الـ token يرجع قليلاً للخلف: كتابة بدأت قبل المزامنة ولم تُثبّت بعد قد تحمل updated_at أقدم من لحظة الاستعلام.
+# الثمن أن تغييرات آخر ثانيتين قد تصل مرتين، والعميل يطبقها كـ upsert.
+SYNC_OVERLAP = timedelta(seconds=2)
+
+
+# عدد الصفوف (من كل الأنواع معاً) في كل صفحة من /api/sync/
+SYNC_PAGE_SIZE = 1000
+# الـ tombstones أقدم من هذا تُحذف (purge_sync_tombstones). token أقدم منه لا يُقبل، والعميل يبدأ بنسخة كاملة
+TOMBSTONE_RETENTION = timedelta(days=90)
+
+
+def encode_token(moment):
+    return base64.urlsafe_b64encode(json.dumps({'t': moment.isoformat()}).encode()).decode()
+
+
+def decode_token(token):
+    try:
+        moment = parse_datetime(json.loads(base64.urlsafe_b64decode(token.encode()))['t'])
+    except (TypeError, ValueError, KeyError):
+        moment = None
+    if moment is None:
+        raise ValidationError({'since': 'Invalid sync token.'})
+    if moment < timezone.now() - TOMBSTONE_RETENTION:
+        # المحذوفات قبل هذا لم تعد محفوظة: الفرق قد ينقصه حذف، فالعميل يعيد المزامنة من الصفر
+        raise ValidationError({'since': 'Sync token expired; request a full snapshot.'})
+    return moment
+
+
+def encode_cursor(since, token, source, last):
+    """
+    موضع الصفحة التالية: نقطة البداية (since، أو null للنسخة الكاملة)، الـ token النهائي المحسوب في الصفحة الأولى،
+    رقم النوع في SYNC_SOURCES (وبعدها الـ tombstones)، وآخر (الوقت، id) أُرسل منه.
+    """
+    state = {
+        't': since.isoformat() if since else None,
+        'r': token,
+        's': source,
+        'u': last[0].isoformat() if last else None,
+        'i': last[1] if last else None,
+    }
+    return base64.urlsafe_b64encode(json.dumps(state).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        since = parse_datetime(state['t']) if state['t'] is not None else None
+        token, source = state['r'], state['s']
+        last = (parse_datetime(state['u']), state['i']) if state['u'] is not None else None
+        valid = (
+            isinstance(token, str) and type(source) is int and 0 <= source <= len(SYNC_SOURCES)
+            and (last is None or (last[0] is not None and type(last[1]) is int))
+            and (since is not None or state['t'] is None)
+        )
+    except (TypeError, ValueError, KeyError, AttributeError):
+        valid = False
+    if not valid:
+        raise ValidationError({'cursor': 'Invalid sync cursor.'})
+    return since, token, source, last
+
+
+def after(rows, field, last):
+    # keyset على (field, id): الصفحات لا تتكرر ولا تتخطى صفاً مهما تغير الجدول بينها
+    if last is None:
+        return rows
+    return rows.filter(Q(**{f'{field}__gt': last[0]}) | Q(**{field: last[0], 'id__gt': last[1]}))
+
+
+def patient_changes(patient, since=None, context=None, cursor=None, page_size=None):
+    """
+    بيانات المريض التي أُنشئت أو عُدلت بعد since، مع ids المحذوفات لكل نوع، على صفحات من page_size صف (SYNC_PAGE_SIZE)
+    (كل نوع على فهرس (patient, updated_at) مرتباً بـ (updated_at, id)). بدون since نسخة كاملة.
+    إذا كان next غير null يطلب العميل ?cursor=<next> ويطبق الصفحات بالترتيب، و token (للمزامنة التالية)
+    يصل فقط مع الصفحة الأخيرة.
+    """
+    if cursor is not None:
+        since, token, source, last = decode_cursor(cursor)
+    else:
+        token, source, last = encode_token(timezone.now() - SYNC_OVERLAP), 0, None
+    changes = {key: [] for key, _, _, _ in SYNC_SOURCES}
+    deleted = {key: [] for key, _, _, _ in SYNC_SOURCES}
+    remaining = page_size or SYNC_PAGE_SIZE
+    next_cursor = None
+    for index in range(source, len(SYNC_SOURCES) + 1):
+        start = last if index == source else None
+        if index < len(SYNC_SOURCES):
+            key, model, serializer_class, related = SYNC_SOURCES[index]
+            rows = model.objects.filter(patient=patient).select_related(*related).order_by('updated_at', 'id')
+            if since is not None:
+                rows = rows.filter(updated_at__gt=since)
+            rows = list(after(rows, 'updated_at', start)[:remaining + 1])
+            page, more = rows[:remaining], len(rows) > remaining
+            changes[key] = serializer_class(page, many=True, context=context).data
+            end = (page[-1].updated_at, page[-1].pk) if page else start
+        else:
+            if since is None:
+                break
+            tombstones = SyncTombstone.objects.filter(patient=patient, deleted_at__gt=since).order_by('deleted_at', 'id')
+            rows = list(after(tombstones, 'deleted_at', start).values_list('deleted_at', 'id', 'model_name', 'object_id')[:remaining + 1])
+            page, more = rows[:remaining], len(rows) > remaining
+            for _, _, key, object_id in page:
+                deleted[key].append(object_id)
+            end = page[-1][:2] if page else start
+        if more:
+            next_cursor = encode_cursor(since, token, index, end)
+            break
+        remaining -= len(page)
+    return {
+        'token': token if next_cursor is None else None,
+        'next': next_cursor,
+        'full': since is None,
+        'changes': changes,
+        'deleted': deleted,
+    }
+
+
+def purge_tombstones(before, chunk_size=1000):
+    """
+    يحذف الـ tombstones الأقدم من before على دفعات (كل دفعة DELETE قصير). يرجع عدد المحذوف.
+    """
+    deleted = 0
+    while True:
+        ids = list(SyncTombstone.objects.filter(deleted_at__lt=before).order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return deleted
+        deleted += SyncTombstone.objects.filter(pk__in=ids).delete()[0]
@@ -1,3 +1,1496 @@
-from django.test import TestCase
+import asyncio
+import base64
+import csv
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+from unittest import mock
+from datetime import datetime, time, timedelta
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, IntegrityError, connection, connections
+from asgiref.sync import sync_to_async
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from .models import (
+    Alert, Appointment, Attachment, BloodGlucoseReading, Consultation, DoctorNote, DoctorProfile, DoctorSchedule,
+    FavoriteDoctor, GlucoseDailyRollup, GlucoseHourlyRollup, Job, Medication, Notification, NotificationCounter,
+    PatientProfile, ReadingArchive, SyncTombstone
+)
+from .jobs import HANDLERS, LOCK_TIMEOUT, enqueue, job, purge_jobs, run_pending_jobs
+from .notifications import create_notifications, purge_read_notifications, reconcile_unread_counts
+from . import push
+from .push import reset_broker
+from .agp import glucose_agp
+from .detection import process_new_readings
+from .exports import chunked, export_rows, stream_ndjson
+from .glucose import READING_TYPES, fetch_patient_readings, fetch_readings, parse_range
+from .ratings import reconcile_ratings
+from .rollups import rebuild_patients
+from .series import ALGORITHMS, MAX_POINTS, lttb, minmax
+from .slots import free_slots
+from .sync import encode_token, patient_changes, purge_tombstones
+from .views import (
+    UserViewSet, PatientProfileViewSet, BloodGlucoseReadingViewSet, MedicationViewSet,
+    DoctorNoteViewSet, AttachmentViewSet, ConsultationViewSet, AlertViewSet, DoctorViewSet,
+    AppointmentViewSet, NotificationViewSet
+)
+
+
+# --- خطة الاستعلام لكل ViewSet ---
+class QueryPlanTests(TestCase):
+    """
+    يشغل EXPLAIN QUERY PLAN على get_queryset() لكل ViewSet (للمريض وللطبيب)
+    ويفشل إذا رجع الاستعلام لمسح الجدول كاملاً أو لترتيب مؤقت (USE TEMP B-TREE).
+    """
+    # (ViewSet, action, الدور) — الدور يحدد أي فرع من get_queryset يُختبر
+    CASES = [
+        (UserViewSet, 'list', 'patient'),
+        (PatientProfileViewSet, 'list', 'patient'),
+        (PatientProfileViewSet, 'list', 'doctor'),
+        (BloodGlucoseReadingViewSet, 'list', 'patient'),
+        (BloodGlucoseReadingViewSet, 'list', 'doctor'),
+        (MedicationViewSet, 'list', 'patient'),
+        (MedicationViewSet, 'list', 'doctor'),
+        (DoctorNoteViewSet, 'list', 'patient'),
+        (DoctorNoteViewSet, 'list', 'doctor'),
+        (AttachmentViewSet, 'list', 'patient'),
+        (AttachmentViewSet, 'list', 'doctor'),
+        (ConsultationViewSet, 'list', 'patient'),
+        (ConsultationViewSet, 'list', 'doctor'),
+        (AlertViewSet, 'list', 'patient'),
+        (DoctorViewSet, 'list', 'patient'),
+        (AppointmentViewSet, 'list', 'patient'),
+        (AppointmentViewSet, 'past', 'patient'),
+        (AppointmentViewSet, 'list', 'doctor'),
+        (NotificationViewSet, 'list', 'patient'),
+        (NotificationViewSet, 'list', 'doctor'),
+    ]
+    # قوائم كاملة بدون أي شرط (كل الأطباء، كل المرضى للطبيب) مرتبة بالمفتاح الأساسي:
+    # المرور على الجدول هنا هو المقصود، و LIMIT الصفحة يوقفه مبكراً.
+    FULL_LISTINGS = {
+        (PatientProfileViewSet, 'doctor'),
+        (DoctorViewSet, 'patient'),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = {
+            'patient': User.objects.create(username='plan_patient'),
+            'doctor': User.objects.create(username='plan_doctor', is_staff=True),
+        }
+
+    def get_queryset(self, viewset_class, action, user):
+        request = Request(APIRequestFactory().get('/'))
+        request.user = user
+        view = viewset_class(request=request, action=action, format_kwarg=None, args=(), kwargs={})
+        return view.get_queryset()
+
+    def test_querysets_use_indexes(self):
+        for viewset_class, action, role in self.CASES:
+            with self.subTest(viewset=viewset_class.__name__, action=action, role=role):
+                queryset = self.get_queryset(viewset_class, action, self.users[role])
+                plan = queryset.explain()
+                self.assertNotIn('USE TEMP B-TREE', plan, plan)
+                if (viewset_class, role) in self.FULL_LISTINGS:
+                    self.assertEqual(queryset.query.order_by, ('pk',))
+                    continue
+                full_scans = [line for line in plan.splitlines() if re.search(r'\bSCAN \w+$', line)]
+                self.assertEqual(full_scans, [], plan)
+
+
+# --- عدد الاستعلامات لكل endpoint قائمة ---
+class QueryCountTests(TestCase):
+    """
+    يضيف صفوفاً لكل قائمة ثم يتأكد أن عدد الاستعلامات لم يتغير: أي serializer يقرأ علاقة
+    (patient.user, doctor.user ...) بدون select_related/prefetch في الـ ViewSet يفشل هنا.
+    عدد الصفوف يبقى أقل من حجم الصفحة حتى يظهر كل صف إضافي في الرد.
+    """
+    ENDPOINTS = [
+        ('doctor', '/api/patients/'),
+        ('patient', '/api/readings/'),
+        ('doctor', '/api/readings/'),
+        ('patient', '/api/medications/'),
+        ('doctor', '/api/medications/'),
+        ('patient', '/api/doctor-notes/'),
+        ('doctor', '/api/doctor-notes/'),
+        ('patient', '/api/attachments/'),
+        ('doctor', '/api/attachments/'),
+        ('patient', '/api/consultations/'),
+        ('doctor', '/api/consultations/'),
+        ('patient', '/api/alerts/'),
+        ('patient', '/api/doctors/'),
+        ('doctor', '/api/doctors/my-patients/'),
+        ('doctor', '/api/doctors/my-patients/dashboard/'),
+        ('patient', '/api/doctors/favorites/'),
+        ('patient', '/api/appointments/'),
+        ('patient', '/api/appointments/past/'),
+        ('doctor', '/api/appointments/'),
+        ('doctor', '/api/appointments/bookings/'),
+        ('patient', '/api/notifications/'),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = User.objects.create(username='count_patient', first_name='Patient')
+        cls.doctor = User.objects.create(username='count_doctor', first_name='Doctor', is_staff=True)
+        cls.serial = 0
+
+    def add_rows(self, n):
+        patient, doctor = self.patient.patientprofile, self.doctor.doctorprofile
+        now = timezone.now()
+        today = timezone.localdate()
+        for _ in range(n):
+            QueryCountTests.serial += 1
+            i = self.serial
+            other_patient = User.objects.create(username=f'count_patient_{i}').patientprofile
+            other_doctor = User.objects.create(username=f'count_doctor_{i}', is_staff=True).doctorprofile
+            doctor.patients.add(other_patient)
+            FavoriteDoctor.objects.create(patient=patient, doctor=other_doctor)
+            reading = BloodGlucoseReading.objects.create(patient=patient, reading_value=100 + i, reading_timestamp=now - timedelta(minutes=i))
+            Medication.objects.create(patient=patient, name=f'Medication {i}')
+            DoctorNote.objects.create(patient=patient, doctor=self.doctor, note_text=f'Note {i}')
+            Attachment.objects.create(patient=patient, file=f'attachments/file_{i}.pdf')
+            consultation = Consultation.objects.create(patient=patient, doctor=self.doctor, consultation_date=today, consultation_time=time(9))
+            Alert.objects.create(patient=patient, name=f'Alert {i}', alert_date=today, alert_time=time(8))
+            for days, hour, status in ((i, 10, 'Pending'), (i, 11, 'Confirmed'), (-i, 10, 'Confirmed')):
+                appointment = Appointment.objects.create(
+                    patient=patient, doctor=other_doctor if days < 0 else doctor, status=status,
+                    appointment_date=today + timedelta(days=days), appointment_time=time(hour),
+                )
+            # إشعار لكل نوع عنصر مرتبط، وواحد بدونه
+            for related_object in (None, appointment, consultation, reading):
+                Notification.objects.create(recipient=self.patient, message=f'Notification {i}', related_object=related_object)
+
+    def count_queries(self, role, url):
+        client = APIClient()
+        # مستخدم جديد من قاعدة البيانات في كل طلب، حتى لا تنتقل العلاقات المخزنة فيه بين القياسات
+        client.force_authenticate(User.objects.get(pk=getattr(self, role).pk))
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.add_rows(2)
+        before = {(role, url): self.count_queries(role, url) for role, url in self.ENDPOINTS}
+        self.add_rows(5)
+        for role, url in self.ENDPOINTS:
+            with self.subTest(role=role, url=url):
+                self.assertEqual(self.count_queries(role, url), before[(role, url)])
+
+
+# --- البحث في دليل الأطباء (FTS5) ---
+class DoctorSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = User.objects.create(username='search_patient')
+        doctors = [
+            ('مُحمّد', 'الخطيب', 'أمراض القلب', 'استشاري قسطرة', 'غزة', True),
+            ('Lina', 'Haddad', 'Endocrinology', 'Insulin pumps and diabetes care', 'Ramallah', True),
+            ('سارة', 'النجار', 'الغدد الصماء', 'علاج السكري عند الأطفال', 'خان يونس', False),
+        ]
+        cls.doctors = []
+        for i, (first, last, specialty, bio, address, available) in enumerate(doctors):
+            profile = User.objects.create(username=f'search_doctor_{i}', first_name=first, last_name=last, is_staff=True).doctorprofile
+            profile.specialty, profile.bio, profile.address, profile.is_available = specialty, bio, address, available
+            profile.save()
+            cls.doctors.append(profile)
+
+    def search(self, **params):
+        client = APIClient()
+        client.force_authenticate(self.patient)
+        response = client.get('/api/doctors/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [doctor['id'] for doctor in response.json()['results']]
+
+    def test_arabic_and_latin_prefixes(self):
+        cardiologist, endocrinologist, pediatric = [doctor.pk for doctor in self.doctors]
+        self.assertEqual(self.search(q='محمد'), [cardiologist])
+        self.assertEqual(self.search(q='خطي'), [cardiologist])
+        self.assertEqual(self.search(q='قلب غزة'), [cardiologist])
+        self.assertEqual(self.search(q='INSUL'), [endocrinologist])
+        self.assertEqual(self.search(q='السكر'), [pediatric])
+        self.assertEqual(self.search(q='غدد'), [pediatric])
+        self.assertEqual(self.search(q='سكري', is_available='true'), [])
+        self.assertEqual(self.search(q='diabetes', specialty='Endocrinology'), [endocrinologist])
+        self.assertEqual(self.search(q='"*'), [])
+
+    def test_index_follows_saves(self):
+        doctor = self.doctors[1]
+        doctor.user.first_name = 'Rana'
+        doctor.user.save()
+        self.assertEqual(self.search(q='rana'), [doctor.pk])
+        self.assertEqual(self.search(q='lina'), [])
+        doctor.address = 'نابلس'
+        doctor.save()
+        self.assertEqual(self.search(q='نابلس'), [doctor.pk])
+        doctor.user.delete()
+        self.assertEqual(self.search(q='rana'), [])
+
+
+# --- تقييمات الأطباء ---
+class DoctorReviewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = User.objects.create(username='review_doctor', is_staff=True).doctorprofile
+        cls.patients = [User.objects.create(username=f'review_patient_{i}') for i in range(3)]
+        for hour, user in enumerate(cls.patients[:2], start=10):
+            Appointment.objects.create(
+                patient=user.patientprofile, doctor=cls.doctor, status='Confirmed',
+                appointment_date=timezone.localdate(), appointment_time=time(hour),
+            )
+
+    def review(self, user, method='post', **data):
+        client = APIClient()
+        client.force_authenticate(user)
+        return getattr(client, method)(f'/api/doctors/{self.doctor.pk}/reviews/', data, format='json')
+
+    def assertRating(self, average, count):
+        self.doctor.refresh_from_db()
+        self.assertEqual((float(self.doctor.average_rating), self.doctor.rating_count), (average, count))
+
+    def test_running_average(self):
+        first, second, stranger = self.patients
+        self.assertEqual(self.review(stranger, rating=5).status_code, 403)
+        self.assertEqual(self.review(first, rating=6).status_code, 400)
+        self.assertEqual(self.review(first, rating=5).status_code, 201)
+        self.assertEqual(self.review(second, rating=2, comment='long wait').status_code, 201)
+        self.assertRating(3.5, 2)
+        self.assertEqual(self.review(second, rating=4).status_code, 200)
+        self.assertRating(4.5, 2)
+        self.assertEqual(self.review(first, method='delete').status_code, 204)
+        self.assertRating(4.0, 1)
+        self.assertEqual(len(self.review(stranger, method='get').json()['results']), 1)
+
+    def test_reconcile_fixes_drift(self):
+        self.review(self.patients[0], rating=3)
+        DoctorProfile.objects.filter(pk=self.doctor.pk).update(rating_total=40, rating_count=9, average_rating=4.44)
+        self.assertEqual(reconcile_ratings(), [self.doctor.pk])
+        self.assertRating(3.0, 1)
+        self.assertEqual(reconcile_ratings(), [])
+
+
+# --- المفضلة ---
+class FavoriteDoctorTests(TestCase):
+    def test_counter_and_is_favorited(self):
+        doctors = [User.objects.create(username=f'fav_doctor_{i}', is_staff=True).doctorprofile for i in range(2)]
+        patients = [User.objects.create(username=f'fav_patient_{i}') for i in range(2)]
+        client = APIClient()
+        for user in patients:
+            client.force_authenticate(user)
+            self.assertEqual(client.post(f'/api/doctors/{doctors[0].pk}/favorite/').status_code, 201)
+        self.assertEqual(client.post(f'/api/doctors/{doctors[0].pk}/favorite/').status_code, 200)
+        self.assertEqual(client.post(f'/api/doctors/{doctors[1].pk}/unfavorite/').status_code, 404)
+        doctors[0].refresh_from_db()
+        self.assertEqual(doctors[0].favorites_count, 2)
+
+        self.assertEqual(client.post(f'/api/doctors/{doctors[0].pk}/unfavorite/').status_code, 200)
+        client.force_authenticate(patients[0])
+        listed = {row['id']: row['is_favorited'] for row in client.get('/api/doctors/').json()['results']}
+        self.assertEqual(listed, {doctors[0].pk: True, doctors[1].pk: False})
+        favorites = client.get('/api/doctors/favorites/').json()
+        self.assertEqual(favorites[0]['doctor']['favorites_count'], 1)
+
+
+# --- المواعيد المتاحة ---
+class DoctorSlotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor_user = User.objects.create(username='slot_doctor', is_staff=True)
+        cls.doctor = cls.doctor_user.doctorprofile
+        cls.patient = User.objects.create(username='slot_patient')
+        # أول يوم اثنين بعد اليوم
+        today = timezone.localdate()
+        cls.monday = today + timedelta(days=7 - today.weekday())
+
+    def get(self, user, url, **params):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.get(url, params)
+
+    def test_slots_merge_schedule_exceptions_and_appointments(self):
+        client = APIClient()
+        client.force_authenticate(self.doctor_user)
+        for start, end in (('09:00', '11:00'), ('13:00', '14:00')):
+            self.assertEqual(client.post('/api/schedules/', {'weekday': 0, 'start_time': start, 'end_time': end}).status_code, 201)
+        self.assertEqual(client.post('/api/schedules/', {'weekday': 0, 'start_time': '10:30', 'end_time': '12:00'}).status_code, 400)
+        self.assertEqual(client.post('/api/schedules/', {'weekday': 2, 'start_time': '09:00', 'end_time': '10:00', 'slot_minutes': 60}).status_code, 201)
+        wednesday = self.monday + timedelta(days=2)
+        self.assertEqual(client.post('/api/schedule-exceptions/', {'date': wednesday, 'reason': 'عطلة'}).status_code, 201)
+        self.assertEqual(client.post('/api/schedule-exceptions/', {'date': self.monday, 'start_time': '13:00'}).status_code, 400)
+        client.post('/api/schedule-exceptions/', {'date': self.monday, 'start_time': '13:30', 'end_time': '14:00'})
+        for when, state in ((time(9), 'Pending'), (time(10, 15), 'Confirmed'), (time(9, 30), 'Rejected')):
+            Appointment.objects.create(
+                patient=self.patient.patientprofile, doctor=self.doctor, status=state,
+                appointment_date=self.monday, appointment_time=when,
+            )
+
+        with self.assertNumQueries(1):
+            slots = free_slots(self.doctor.pk, self.monday, wednesday)
+        self.assertEqual(
+            [(slot['date'], slot['start'].strftime('%H:%M')) for slot in slots],
+            [(self.monday, '09:30'), (self.monday, '13:00')],
+        )
+
+        response = self.get(self.patient, f'/api/doctors/{self.doctor.pk}/slots/', **{'from': self.monday, 'to': wednesday})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['slots'][0], {'date': str(self.monday), 'start': '09:30:00', 'end': '10:00:00'})
+        self.assertEqual(self.get(self.patient, f'/api/doctors/{self.doctor.pk}/slots/', to='yesterday').status_code, 400)
+        self.assertEqual(self.get(self.patient, '/api/doctors/999999/slots/').status_code, 404)
+
+
+# --- الحجز المتزامن على نفس الموعد ---
+class ConcurrentBookingTests(TransactionTestCase):
+    THREADS = 16
+
+    def test_one_booking_wins(self):
+        doctor = User.objects.create(username='race_doctor', is_staff=True).doctorprofile
+        patients = [User.objects.create(username=f'race_patient_{i}') for i in range(self.THREADS)]
+        payload = {'doctor': doctor.pk, 'appointment_date': timezone.localdate() + timedelta(days=1), 'appointment_time': '10:00'}
+        barrier = threading.Barrier(self.THREADS)
+        statuses = []
+
+        def book(user):
+            client = APIClient()
+            client.force_authenticate(user)
+            try:
+                barrier.wait()
+                statuses.append(client.post('/api/appointments/', payload, format='json').status_code)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=book, args=(user,)) for user in patients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(statuses), [201] + [409] * (self.THREADS - 1))
+        self.assertEqual(Appointment.objects.filter(doctor=doctor).count(), 1)
+        # إشعار الطبيب مهمة في الطابور، والطلبات الخاسرة لم تترك مهام
+        self.assertEqual(Job.objects.filter(kind='notifications.create').count(), 1)
+        self.assertEqual(run_pending_jobs(), (1, 0))
+        self.assertEqual(Notification.objects.filter(recipient=doctor.user).count(), 1)
+
+        # الطبيب ينقل موعداً آخر إلى الوقت المحجوز
+        client = APIClient()
+        client.force_authenticate(patients[0])
+        later = client.post('/api/appointments/', {**payload, 'appointment_time': '11:00'}, format='json')
+        self.assertEqual(later.status_code, 201)
+        client.force_authenticate(doctor.user)
+        moved = Appointment.objects.get(doctor=doctor, appointment_time=time(11))
+        response = client.patch(f'/api/appointments/{moved.pk}/', {'appointment_time': '10:00'}, format='json')
+        self.assertEqual(response.status_code, 409)
+
+
+# --- أخطاء الحجز: فقط تعارض الموعد يصبح 409 ---
+class BookingConflictTests(TestCase):
+    def setUp(self):
+        self.doctor = User.objects.create(username='conflict_doctor', is_staff=True).doctorprofile
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='conflict_patient'))
+        self.payload = {'doctor': self.doctor.pk, 'appointment_date': timezone.localdate() + timedelta(days=1), 'appointment_time': '10:00'}
+
+    def test_taken_slot_is_409(self):
+        self.assertEqual(self.client.post('/api/appointments/', self.payload, format='json').status_code, 201)
+        response = self.client.post('/api/appointments/', self.payload, format='json')
+        self.assertEqual(response.status_code, 409)
+
+    def test_other_integrity_errors_are_not_hidden(self):
+        with mock.patch('core.views.notify', side_effect=IntegrityError('NOT NULL constraint failed: core_job.kind')):
+            with self.assertRaises(IntegrityError):
+                self.client.post('/api/appointments/', self.payload, format='json')
+        self.assertFalse(Appointment.objects.exists())
+
+
+# --- تقويم الحجوزات ---
+class BookingsCalendarTests(TestCase):
+    def setUp(self):
+        # مفتاح التقويم (الطبيب، النسخة) يتكرر بين الاختبارات بعد إعادة قاعدة البيانات
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_feed_etag_follows_bookings(self):
+        doctor = User.objects.create(username='ics_doctor', is_staff=True)
+        patient = User.objects.create(username='ics_patient', first_name='سارة', last_name='الخطيب')
+        for hour, state in ((9, 'Confirmed'), (10, 'Pending')):
+            Appointment.objects.create(
+                patient=patient.patientprofile, doctor=doctor.doctorprofile, status=state, notes='متابعة; قياس',
+                appointment_date=timezone.localdate() + timedelta(days=1), appointment_time=time(hour),
+            )
+        api = APIClient()
+        api.force_authenticate(doctor)
+        url = api.get('/api/appointments/bookings-feed/').json()['url']
+
+        client = APIClient()
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        body = response.content.decode()
+        self.assertEqual(body.count('BEGIN:VEVENT'), 1)
+        self.assertIn('SUMMARY:سارة الخطيب', body)
+        self.assertIn(r'DESCRIPTION:متابعة\; قياس', body)
+        etag = response['ETag']
+        with self.assertNumQueries(1):
+            self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        pending = Appointment.objects.get(status='Pending')
+        api.post(f'/api/appointments/{pending.pk}/respond/', {'accepted': True}, format='json')
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.content.decode().count('BEGIN:VEVENT'), 2)
+
+        new_url = api.post('/api/appointments/bookings-feed/').json()['url']
+        self.assertEqual(client.get(url).status_code, 404)
+        self.assertEqual(client.get(new_url).status_code, 200)
+
+    def test_event_length_and_name_follow_schedule_and_patient(self):
+        doctor = User.objects.create(username='ics_sized', is_staff=True)
+        patient = User.objects.create(username='ics_renamed', first_name='منى', last_name='حداد')
+        day = timezone.localdate() + timedelta(days=1)
+        DoctorSchedule.objects.create(
+            doctor=doctor.doctorprofile, weekday=day.weekday(), start_time=time(9), end_time=time(12), slot_minutes=60,
+        )
+        for hour in (10, 14):
+            Appointment.objects.create(
+                patient=patient.patientprofile, doctor=doctor.doctorprofile, status='Confirmed',
+                appointment_date=day, appointment_time=time(hour),
+            )
+        api = APIClient()
+        api.force_authenticate(doctor)
+        url = api.get('/api/appointments/bookings-feed/').json()['url']
+        response = APIClient().get(url)
+        events = response.content.decode().split('BEGIN:VEVENT')[1:]
+        lengths = []
+        for event in events:
+            fields = dict(line.split(':', 1) for line in event.split('\r\n') if ':' in line)
+            start, end = (datetime.strptime(fields[key], '%Y%m%dT%H%M%SZ') for key in ('DTSTART', 'DTEND'))
+            lengths.append(end - start)
+        # موعد العاشرة داخل فترة الستين دقيقة، وموعد الثانية خارج الجدول فيأخذ المدة الافتراضية
+        self.assertEqual(lengths, [timedelta(minutes=60), timedelta(minutes=30)])
+
+        patient.last_login = timezone.now()
+        patient.save(update_fields=['last_login'])
+        self.assertEqual(APIClient().get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        patient.last_name = 'الحداد'
+        patient.save()
+        renamed = APIClient().get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(renamed.status_code, 200)
+        self.assertIn('SUMMARY:منى الحداد', renamed.content.decode())
+
+
+# --- طابور المهام ---
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.calls = []
+
+        @job('tests.flaky')
+        def flaky(fail_times):
+            self.calls.append(fail_times)
+            if len(self.calls) <= fail_times:
+                raise RuntimeError('delivery failed')
+        self.addCleanup(HANDLERS.pop, 'tests.flaky')
+
+    def run_due(self):
+        # يقدم موعد المهام المؤجلة بدل انتظار التأخير بين المحاولات
+        Job.objects.filter(status=Job.QUEUED).update(run_at=timezone.now())
+        return run_pending_jobs()
+
+    def test_retry_then_dead_letter(self):
+        retried = enqueue('tests.flaky', fail_times=1)
+        dead = enqueue('tests.flaky', fail_times=99)
+        Job.objects.filter(pk=dead.pk).update(max_attempts=2)
+        self.assertEqual(run_pending_jobs(), (0, 2))
+        retried.refresh_from_db()
+        self.assertEqual((retried.status, retried.attempts), (Job.QUEUED, 1))
+        self.assertGreater(retried.run_at, timezone.now())
+        self.assertIn('delivery failed', retried.last_error)
+        self.assertEqual(run_pending_jobs(), (0, 0))
+
+        self.assertEqual(self.run_due(), (1, 1))
+        self.assertEqual(Job.objects.get(pk=retried.pk).status, Job.DONE)
+        self.assertEqual(Job.objects.get(pk=dead.pk).status, Job.DEAD)
+
+    def test_abandoned_last_attempt_is_dead_lettered(self):
+        # worker سقط أثناء التنفيذ: المهمة عالقة في running
+        stale = timezone.now() - LOCK_TIMEOUT - timedelta(minutes=1)
+        poison = enqueue('tests.flaky', fail_times=0)
+        retried = enqueue('tests.flaky', fail_times=0)
+        Job.objects.filter(pk=poison.pk).update(status=Job.RUNNING, locked_at=stale, attempts=5)
+        Job.objects.filter(pk=retried.pk).update(status=Job.RUNNING, locked_at=stale, attempts=1)
+        self.assertEqual(run_pending_jobs(), (1, 0))
+        self.assertEqual(Job.objects.get(pk=poison.pk).status, Job.DEAD)
+        self.assertEqual(Job.objects.get(pk=retried.pk).status, Job.DONE)
+
+        Job.objects.filter(pk=retried.pk).update(finished_at=timezone.now() - timedelta(days=8))
+        self.assertEqual(purge_jobs(timezone.now() - timedelta(days=7)), 1)
+        self.assertEqual(list(Job.objects.values_list('pk', flat=True)), [poison.pk])
+
+    def test_enqueue_follows_transaction(self):
+        doctor = User.objects.create(username='job_doctor', is_staff=True)
+        patient = User.objects.create(username='job_patient')
+        consultation = Consultation.objects.create(
+            patient=patient.patientprofile, doctor=doctor, consultation_date=timezone.localdate(), consultation_time=time(9),
+        )
+        client = APIClient()
+        client.force_authenticate(doctor)
+        response = client.post(f'/api/consultations/{consultation.pk}/diagnose/', {'diagnosis': 'x', 'treatment': 'y'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(run_pending_jobs(), (1, 0))
+        notification = Notification.objects.get()
+        self.assertEqual((notification.recipient, notification.related_object), (patient, consultation))
+
+        with self.settings(JOBS_RUN_EAGERLY=True), self.captureOnCommitCallbacks(execute=True):
+            enqueue('notifications.create', rows=[[patient.pk, 'eager', None, None]])
+        self.assertTrue(Notification.objects.filter(message='eager').exists())
+
+
+# --- الإشعارات الفورية (SSE) ---
+class NotificationStreamTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='push_patient')
+        self.other = User.objects.create(username='push_other')
+        self.token = Token.objects.create(user=self.user)
+        reset_broker()
+        self.addCleanup(reset_broker)
+
+    async def next_event(self, stream):
+        return await asyncio.wait_for(anext(stream), timeout=5)
+
+    async def receive_new_notifications(self):
+        response = await AsyncClient().get('/api/notifications/stream/', {'token': self.token.key})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        try:
+            self.assertTrue((await self.next_event(stream)).startswith(b'retry:'))
+            await sync_to_async(create_notifications)([[self.other.pk, 'ليس لك', None, None], [self.user.pk, 'موعدك غداً', None, None]])
+            event = (await self.next_event(stream)).decode()
+        finally:
+            await stream.aclose()
+        notification = await Notification.objects.aget(recipient=self.user)
+        self.assertTrue(event.startswith(f'id: {notification.pk}\nevent: notification\n'))
+        self.assertIn('موعدك غداً', event)
+
+    @override_settings(PUSH_BROKER='core.push.LocalBroker')
+    async def test_local_broker_pushes_to_recipient(self):
+        await self.receive_new_notifications()
+
+    @override_settings(PUSH_BROKER='core.push.DatabaseBroker', PUSH_POLL_INTERVAL=0.01)
+    async def test_database_broker_pushes_to_recipient(self):
+        await self.receive_new_notifications()
+
+    @override_settings(PUSH_BROKER='core.push.DatabaseBroker', PUSH_POLL_INTERVAL=0.01)
+    async def test_database_broker_survives_poll_errors(self):
+        real = push.new_notification_events
+        calls = []
+
+        def flaky(last_id, users):
+            calls.append(last_id)
+            if len(calls) <= 2:
+                raise DatabaseError('database is locked')
+            return real(last_id, users)
+
+        with mock.patch('core.push.new_notification_events', flaky), self.assertLogs('core.push', 'ERROR') as logs:
+            await self.receive_new_notifications()
+        self.assertEqual(len(logs.records), 2)
+        # بعد الخطأ تستأنف الدورة من نفس آخر id
+        self.assertEqual(calls[0], calls[2])
+
+    @override_settings(PUSH_BROKER='core.push.LocalBroker')
+    async def test_token_required_and_last_event_id_replay(self):
+        self.assertEqual((await AsyncClient().get('/api/notifications/stream/', {'token': 'x'})).status_code, 401)
+        self.assertEqual((await AsyncClient().get('/api/notifications/stream/')).status_code, 401)
+
+        seen, missed = await sync_to_async(create_notifications)([[self.user.pk, 'قديم', None, None], [self.user.pk, 'فاتك', None, None]])
+        response = await AsyncClient().get(
+            '/api/notifications/stream/', headers={'Authorization': f'Token {self.token.key}', 'Last-Event-ID': str(seen.pk)},
+        )
+        stream = aiter(response.streaming_content)
+        try:
+            await self.next_event(stream)
+            event = (await self.next_event(stream)).decode()
+        finally:
+            await stream.aclose()
+        self.assertTrue(event.startswith(f'id: {missed.pk}\n'))
+        self.assertIn('فاتك', event)
+
+
+# --- حالة القراءة وعداد غير المقروءة ---
+class NotificationReadStateTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='read_patient')
+        self.other = User.objects.create(username='read_other')
+        create_notifications([[self.user.pk, f'إشعار {i}', None, None] for i in range(5)] + [[self.other.pk, 'آخر', None, None]])
+        self.ids = list(Notification.objects.filter(recipient=self.user).order_by('id').values_list('pk', flat=True))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def unread(self):
+        with self.assertNumQueries(1):
+            return self.client.get('/api/notifications/unread-count/').json()['unread']
+
+    def test_mark_read_updates_counter(self):
+        self.assertEqual(self.unread(), 5)
+        response = self.client.post('/api/notifications/mark-read/', {'ids': self.ids[:2] + [self.ids[0], 999999]}, format='json')
+        self.assertEqual(response.json(), {'marked': 2, 'unread': 3})
+        self.assertEqual(self.client.post(f'/api/notifications/{self.ids[0]}/mark-as-read/').status_code, 200)
+        self.assertEqual(self.client.post(f'/api/notifications/{self.ids[0] + 99}/mark-as-read/').status_code, 404)
+        self.assertEqual(self.client.post(f'/api/notifications/{self.ids[2]}/mark-as-read/').status_code, 200)
+        self.assertEqual(self.unread(), 2)
+
+        until = Notification.objects.get(pk=self.ids[3]).timestamp
+        Notification.objects.filter(pk=self.ids[4]).update(timestamp=until + timedelta(minutes=1))
+        self.assertEqual(self.client.post('/api/notifications/mark-read/', {'until': until.isoformat()}, format='json').json()['marked'], 1)
+        self.assertEqual(self.client.post('/api/notifications/mark-read/', {}, format='json').status_code, 400)
+        self.assertEqual(self.client.post('/api/notifications/mark-all-read/').json(), {'marked': 1, 'unread': 0})
+        self.assertFalse(Notification.objects.filter(recipient=self.user, is_read=False).exists())
+        self.assertFalse(Notification.objects.get(recipient=self.other).is_read)
+
+    def test_reconcile_fixes_drift(self):
+        Notification.objects.filter(pk=self.ids[0]).delete()
+        NotificationCounter.objects.filter(user=self.other).delete()
+        self.assertEqual(sorted(reconcile_unread_counts()), sorted([self.user.pk, self.other.pk]))
+        self.assertEqual(self.unread(), 4)
+        self.assertEqual(NotificationCounter.objects.get(user=self.other).unread, 1)
+        self.assertEqual(reconcile_unread_counts(), [])
+
+
+# --- دمج الإشعارات وحذف القديم ---
+class NotificationRetentionTests(TestCase):
+    def setUp(self):
+        self.doctor = User.objects.create(username='digest_doctor', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.doctor)
+
+    def request(self, name):
+        return [self.doctor.pk, f'لديك طلب موعد جديد من المريض: {name}', None, None, 'appointment.requested']
+
+    def test_same_kind_folds_into_digest(self):
+        create_notifications([self.request('أ'), self.request('ب'), [self.doctor.pk, 'رسالة', None, None]])
+        create_notifications([self.request('ج')])
+        digest = Notification.objects.get(kind='appointment.requested')
+        self.assertEqual((digest.count, digest.message), (3, 'لديك طلب موعد جديد من المريض: ج'))
+        self.assertEqual(self.client.get('/api/notifications/unread-count/').json(), {'unread': 2})
+
+        # بعد قراءته أو خارج النافذة يبدأ صف جديد
+        self.client.post('/api/notifications/mark-all-read/')
+        create_notifications([self.request('د')])
+        Notification.objects.filter(is_read=False).update(timestamp=timezone.now() - timedelta(hours=2))
+        create_notifications([self.request('هـ')])
+        self.assertEqual(
+            list(Notification.objects.filter(kind='appointment.requested').order_by('id').values_list('count', flat=True)),
+            [3, 1, 1],
+        )
+        self.assertEqual(self.client.get('/api/notifications/unread-count/').json(), {'unread': 2})
+        self.assertEqual(reconcile_unread_counts(), [])
+
+    def add_readings(self, patient, values):
+        # قراءة كل ساعة: لا تغير سريع بين قراءتين (RATE_WINDOW_MINUTES)
+        start = timezone.now() - timedelta(hours=len(values))
+        for i, value in enumerate(values):
+            BloodGlucoseReading.objects.create(patient=patient, reading_value=value, reading_timestamp=start + timedelta(hours=i))
+        run_pending_jobs()
+
+    def test_glucose_alerts_fold_only_identical_events(self):
+        patients = [User.objects.create(username=f'digest_patient_{i}', first_name=f'P{i}') for i in range(2)]
+        for patient in patients:
+            self.doctor.doctorprofile.patients.add(patient.patientprofile)
+        first = patients[0].patientprofile
+        self.add_readings(first, [100, 50, 250, 150, 260])
+        self.add_readings(patients[1].patientprofile, [100, 260])
+
+        alerts = Notification.objects.filter(recipient=patients[0]).order_by('id')
+        self.assertEqual(
+            [(kind, count) for kind, count in alerts.values_list('kind', 'count')],
+            [(f'glucose.hypo:{first.pk}', 1), (f'glucose.hyper:{first.pk}', 2)],
+        )
+        self.assertIn('منخفضة (50', alerts[0].message)
+        self.assertIn('مرتفعة (260', alerts[1].message)
+
+        # عند الطبيب: صف لكل (حدث، مريض) وكل صف يشير لقراءة مريضه
+        doctor_alerts = Notification.objects.filter(recipient=self.doctor, kind__startswith='glucose.hyper:')
+        self.assertEqual(doctor_alerts.count(), 2)
+        for notification in doctor_alerts:
+            self.assertEqual(notification.kind, f'glucose.hyper:{notification.related_object.patient_id}')
+        self.assertTrue(Notification.objects.filter(recipient=self.doctor, kind=f'glucose.hypo:{first.pk}').exists())
+
+    def test_hypo_alerts_never_fold(self):
+        patient = User.objects.create(username='hypo_patient').patientprofile
+        self.add_readings(patient, [100, 50, 100, 45])
+        self.assertEqual(
+            list(Notification.objects.filter(recipient=patient.user).values_list('count', flat=True)), [1, 1],
+        )
+
+    def test_purge_keeps_unread_and_recent(self):
+        create_notifications([[self.doctor.pk, f'قديم {i}', None, None] for i in range(7)] + [[self.doctor.pk, 'حديث', None, None]])
+        old = Notification.objects.exclude(message='حديث')
+        old.update(timestamp=timezone.now() - timedelta(days=100))
+        Notification.objects.exclude(pk=old.order_by('id')[0].pk).update(is_read=True)
+        archived = []
+        deleted = purge_read_notifications(
+            timezone.now() - timedelta(days=90), chunk_size=3, archive=lambda rows: archived.extend(rows.values_list('pk', flat=True)),
+        )
+        self.assertEqual(deleted, 6)
+        self.assertEqual(len(archived), 6)
+        self.assertEqual(sorted(Notification.objects.values_list('message', flat=True)), ['حديث', 'قديم 0'])
+
+    def test_purge_skips_retained_unread_rows(self):
+        create_notifications([[self.doctor.pk, f'غير مقروء {i}', None, None] for i in range(5)])
+        Notification.objects.update(timestamp=timezone.now() - timedelta(days=100))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(purge_read_notifications(timezone.now() - timedelta(days=90)), 0)
+        # استعلام واحد على الفهرس الجزئي للمقروءة يرجع فارغاً: غير المقروءة القديمة لا تُقرأ
+        self.assertEqual(len(queries), 1)
+        plan = Notification.objects.filter(is_read=True, pk__gt=0).order_by('pk').values_list('pk', 'timestamp')[:10].explain()
+        self.assertIn('notification_read_idx', plan)
+
+
+# --- مزامنة دفعة قراءات من الجهاز ---
+class BulkIngestTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='bulk_patient')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.start = timezone.now() - timedelta(days=2)
+
+    def item(self, minutes, value=120, **extra):
+        return {'reading_value': value, 'reading_timestamp': (self.start + timedelta(minutes=minutes)).isoformat(), **extra}
+
+    def test_partial_rejection_keeps_valid_items(self):
+        items = [self.item(0), self.item(5, value=-3), 'not an object', self.item(10, reading_type='Sideways'), self.item(15, 95)]
+        response = self.client.post('/api/readings/bulk/', items, format='json')
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual((body['accepted'], body['rejected']), (2, 3))
+        self.assertEqual([result['status'] for result in body['results']], ['accepted', 'rejected', 'rejected', 'rejected', 'accepted'])
+        self.assertEqual([result['index'] for result in body['results']], list(range(5)))
+        self.assertIn('reading_value', body['results'][1]['errors'])
+        self.assertIn('non_field_errors', body['results'][2]['errors'])
+        self.assertIn('reading_type', body['results'][3]['errors'])
+
+        readings = BloodGlucoseReading.objects.filter(patient=self.user.patientprofile)
+        self.assertEqual(sorted(readings.values_list('pk', flat=True)), sorted(r['id'] for r in body['results'] if r['status'] == 'accepted'))
+        self.assertEqual(sorted(readings.values_list('reading_value', flat=True)), [95, 120])
+        # bulk_create لا يطلق الـ signals، والإدخال يحدث الـ rollups بنفسه
+        self.assertEqual(sum(GlucoseDailyRollup.objects.filter(patient=self.user.patientprofile).values_list('count', flat=True)), 2)
+
+    def test_ndjson_with_broken_line(self):
+        lines = [json.dumps(self.item(0)), '{broken', '', json.dumps(self.item(1, 80))]
+        response = self.client.generic('POST', '/api/readings/bulk/', '\n'.join(lines), content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([result['status'] for result in response.json()['results']], ['accepted', 'rejected', 'accepted'])
+
+    def test_whole_batch_errors(self):
+        cases = [
+            ({'reading_value': 100}, 400),
+            ([self.item(0, value=0)], 400),
+        ]
+        with mock.patch('core.views.MAX_BULK_ITEMS', 2):
+            cases.append(([self.item(i) for i in range(3)], 400))
+            for payload, expected in cases:
+                with self.subTest(payload=payload):
+                    self.assertEqual(self.client.post('/api/readings/bulk/', payload, format='json').status_code, expected)
+        self.assertFalse(BloodGlucoseReading.objects.exists())
+
+        doctor = User.objects.create(username='bulk_doctor', is_staff=True)
+        self.client.force_authenticate(doctor)
+        self.assertEqual(self.client.post('/api/readings/bulk/', [self.item(0)], format='json').status_code, 403)
+
+
+# --- كشف القراءات الخطرة ---
+class GlucoseDetectionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='detect_patient')
+        self.patient = self.user.patientprofile
+        self.now = timezone.now()
+
+    def detect(self, points):
+        # bulk_create لا يطلق الـ signals: الكشف يُستدعى مرة واحدة على الدفعة
+        readings = BloodGlucoseReading.objects.bulk_create(
+            BloodGlucoseReading(patient=self.patient, reading_value=value, reading_timestamp=self.now - timedelta(minutes=ago))
+            for ago, value in points
+        )
+        return [kind for kind, _, _ in process_new_readings(self.patient, readings)]
+
+    def test_episode_start_sustained_and_rapid(self):
+        self.assertEqual(self.detect([(30, 100), (0, 55)]), ['hypo'])
+        self.assertEqual(self.detect([(300, 120), (200, 200)]), ['hyper'])
+        # نوبة ارتفاع متواصلة تعبر SUSTAINED_MINUTES مرة واحدة
+        self.assertEqual(self.detect([(140, 190), (90, 195), (60, 200)]), ['sustained_high'])
+
+    def test_rapid_rise_alerts_once(self):
+        self.assertEqual(self.detect([(40, 100), (30, 140), (20, 175)]), ['rapid_rise'])
+
+    def test_backfilled_history_does_not_alert(self):
+        day = 24 * 60
+        self.assertEqual(self.detect([(10 * day, 40), (10 * day - 60, 300), (2 * day, 50)]), [])
+        # رفع دفعة قديمة من الجهاز عبر الـ API: لا إشعارات، والـ rollups تُحدث
+        client = APIClient()
+        client.force_authenticate(self.user)
+        old = self.now - timedelta(days=30)
+        response = client.post('/api/readings/bulk/', [
+            {'reading_value': 45, 'reading_timestamp': old.isoformat()},
+            {'reading_value': 320, 'reading_timestamp': (old + timedelta(hours=1)).isoformat()},
+        ], format='json')
+        self.assertEqual(response.json()['accepted'], 2)
+        # قراءة واحدة قديمة عبر الـ signal
+        BloodGlucoseReading.objects.create(patient=self.patient, reading_value=42, reading_timestamp=old - timedelta(days=1))
+        run_pending_jobs()
+        self.assertFalse(Notification.objects.exists())
+        # يوما الانخفاض القديمان من الـ API والـ signal في الـ rollups
+        self.assertEqual(GlucoseDailyRollup.objects.filter(patient=self.patient, below_count=1).count(), 2)
+
+    def test_mixed_batch_alerts_only_recent_readings(self):
+        # دفعة فيها سجل قديم وقراءات حديثة: الانخفاض القديم بلا تنبيه، والارتفاع الحديث ينبه
+        self.assertEqual(self.detect([(26 * 60, 50), (25 * 60, 48), (60, 100), (0, 250)]), ['hyper'])
+
+
+# --- ملخص العنصر المرتبط في الإشعار ---
+class NotificationRelatedTests(TestCase):
+    def test_related_summary(self):
+        doctor = User.objects.create(username='related_doctor', first_name='سامي', is_staff=True)
+        patient = User.objects.create(username='related_patient', first_name='ليلى')
+        appointment = Appointment.objects.create(
+            patient=patient.patientprofile, doctor=doctor.doctorprofile,
+            appointment_date=timezone.localdate() + timedelta(days=1), appointment_time=time(9),
+        )
+        reading = BloodGlucoseReading.objects.create(patient=patient.patientprofile, reading_value=55)
+        for related_object in (appointment, reading, None):
+            Notification.objects.create(recipient=patient, message='x', related_object=related_object)
+        reading.delete()
+        client = APIClient()
+        client.force_authenticate(patient)
+        results = client.get('/api/notifications/').json()['results']
+        related = sorted((item['related'] for item in results), key=lambda item: item is not None)
+        self.assertEqual(related[:2], [None, None])
+        self.assertEqual(related[2], {
+            'type': 'appointment', 'id': appointment.pk, 'appointment_date': str(appointment.appointment_date),
+            'appointment_time': '09:00:00', 'status': 'Pending', 'doctor_name': 'سامي', 'patient_name': 'ليلى',
+        })
+
+
+# --- الـ AGP المخزن ---
+class AgpCacheTests(TestCase):
+    def setUp(self):
+        self.patient = User.objects.create(username='agp_patient').patientprofile
+        BloodGlucoseReading.objects.create(patient=self.patient, reading_value=120, reading_timestamp=timezone.now() - timedelta(days=1))
+        self.version = PatientProfile.objects.get(pk=self.patient.pk).agp_version
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_cache_hit_then_invalidated_by_version(self):
+        self.assertEqual(glucose_agp(self.patient.pk, 14)['readings'], 1)
+        with self.assertNumQueries(1):  # نسخة الـ AGP فقط
+            self.assertEqual(glucose_agp(self.patient.pk, 14)['readings'], 1)
+
+        # القراءة تزيد النسخة في قاعدة البيانات: كل عملية تحسب من جديد، لا فقط التي حذفت من الـ cache المحلي
+        BloodGlucoseReading.objects.create(patient=self.patient, reading_value=140, reading_timestamp=timezone.now() - timedelta(hours=2))
+        self.patient.refresh_from_db()
+        self.assertEqual(self.patient.agp_version, self.version + 1)
+        self.assertEqual(glucose_agp(self.patient.pk, 14)['readings'], 2)
+
+        reading = BloodGlucoseReading.objects.filter(patient=self.patient).earliest('reading_timestamp')
+        reading.delete()
+        self.assertEqual(glucose_agp(self.patient.pk, 14)['readings'], 1)
+
+    def test_reading_outside_windows_keeps_cache(self):
+        glucose_agp(self.patient.pk, 90)
+        BloodGlucoseReading.objects.create(patient=self.patient, reading_value=90, reading_timestamp=timezone.now() - timedelta(days=200))
+        self.patient.refresh_from_db()
+        self.assertEqual(self.patient.agp_version, self.version)
+        with self.assertNumQueries(1):
+            glucose_agp(self.patient.pk, 90)
+
+
+def rollup_snapshot(patient):
+    fields = ['count', 'total', 'total_sq', 'min_value', 'max_value', 'below_count', 'in_range_count', 'above_count',
+              'fasting_count', 'after_meal_count', 'random_count']
+    return (
+        list(GlucoseHourlyRollup.objects.filter(patient=patient).order_by('hour').values_list('hour', *fields)),
+        list(GlucoseDailyRollup.objects.filter(patient=patient).order_by('day').values_list('day', *fields)),
+    )
+
+
+# --- الـ rollups التدريجية تساوي إعادة الحساب الكاملة ---
+class GlucoseRollupTests(TestCase):
+    def setUp(self):
+        self.patient = User.objects.create(username='rollup_patient').patientprofile
+        start = (timezone.now() - timedelta(days=3)).replace(minute=0, second=0, microsecond=0)
+        self.readings = [
+            BloodGlucoseReading.objects.create(
+                patient=self.patient, reading_value=value, reading_type=('Fasting', 'After Meal', 'Random')[i % 3],
+                reading_timestamp=start + timedelta(minutes=25 * i),
+            )
+            for i, value in enumerate([65, 95, 140, 185, 210, 120])
+        ]
+
+    def assertMatchesRebuild(self):
+        incremental = rollup_snapshot(self.patient)
+        rebuild_patients([self.patient.pk])
+        self.assertEqual(incremental, rollup_snapshot(self.patient))
+
+    def test_create(self):
+        self.assertEqual(sum(row[1] for row in rollup_snapshot(self.patient)[0]), 6)
+        self.assertMatchesRebuild()
+
+    def test_update_value_and_move_to_another_day(self):
+        reading = self.readings[2]
+        reading.reading_value = 50
+        reading.save()
+        self.assertMatchesRebuild()
+        # نقل القراءة ليوم آخر: الـ bucket القديم يُعاد حسابه أيضاً
+        reading.reading_timestamp -= timedelta(days=1, minutes=10)
+        reading.reading_type = 'Random'
+        reading.save()
+        self.assertMatchesRebuild()
+
+    def test_delete(self):
+        self.readings[0].delete()
+        self.readings[3].delete()
+        self.assertMatchesRebuild()
+        # حذف آخر قراءة في الساعة يحذف صفها
+        for reading in self.readings[1:3]:
+            reading.delete()
+        self.assertMatchesRebuild()
+
+
+# --- إحصائيات السكر بـ NumPy ---
+class GlucoseStatisticsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='numpy_patient')
+        self.patient = self.user.patientprofile
+        self.day = timezone.localdate() - timedelta(days=3)
+        tz = timezone.get_current_timezone()
+        self.at = lambda day, hour: datetime.combine(day, time(hour), tzinfo=tz)
+        for day, hour, value, reading_type in [
+            (self.day, 20, 200, 'Random'), (self.day, 8, 60, 'Fasting'), (self.day, 12, 100, 'After Meal'),
+            (self.day + timedelta(days=1), 9, 150, 'Fasting'),
+        ]:
+            BloodGlucoseReading.objects.create(
+                patient=self.patient, reading_value=value, reading_type=reading_type, reading_timestamp=self.at(day, hour),
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def stats(self, **params):
+        response = self.client.get('/api/readings/stats/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_fetch_readings_columns(self):
+        readings = BloodGlucoseReading.objects.filter(patient=self.patient)
+        ts, values, types = fetch_readings(readings)
+        self.assertEqual((ts.dtype, values.dtype, types.dtype), (np.dtype('i8'), np.dtype('f8'), np.dtype('i1')))
+        self.assertEqual(values.tolist(), [60, 100, 200, 150])
+        self.assertEqual(ts.tolist(), [int(self.at(self.day, hour).timestamp()) for hour in (8, 12, 20)] + [int(self.at(self.day + timedelta(days=1), 9).timestamp())])
+        self.assertEqual([READING_TYPES[code] for code in types], ['Fasting', 'After Meal', 'Random', 'Fasting'])
+        # [start, end)
+        ts, values, _ = fetch_readings(readings, self.at(self.day, 12), self.at(self.day, 20))
+        self.assertEqual(values.tolist(), [100])
+
+    def test_daily_metrics(self):
+        body = self.stats(**{'from': self.day.isoformat(), 'to': self.day.isoformat()})
+        self.assertEqual(len(body['buckets']), 1)
+        bucket = body['buckets'][0]
+        self.assertEqual(bucket['start'], self.day.isoformat())
+        self.assertEqual(
+            {key: bucket[key] for key in ('count', 'mean', 'sd', 'cv', 'min', 'max', 'gmi', 'estimated_hba1c')},
+            {'count': 3, 'mean': 120.0, 'sd': 58.9, 'cv': 49.1, 'min': 60.0, 'max': 200.0, 'gmi': 6.18, 'estimated_hba1c': 5.81},
+        )
+        self.assertEqual((bucket['time_below_range'], bucket['time_in_range'], bucket['time_above_range']), (33.3, 33.3, 33.3))
+        self.assertEqual(bucket['reading_types'], {'Fasting': 1, 'After Meal': 1, 'Random': 1})
+
+    def test_rollups_and_raw_readings_agree(self):
+        days = {'from': self.day.isoformat(), 'to': (self.day + timedelta(days=1)).isoformat()}
+        # حدود ليست على رأس اليوم/الساعة: القراءات الخام بدل الـ rollups
+        raw = {'from': (self.at(self.day, 7) + timedelta(minutes=30)).isoformat(), 'to': self.at(self.day + timedelta(days=1), 23).isoformat()}
+        with mock.patch('core.glucose.fetch_patient_readings', wraps=fetch_patient_readings) as fetch:
+            by_rollup = self.stats(**days)
+            self.assertFalse(fetch.called)
+            by_reading = self.stats(**raw)
+            self.assertTrue(fetch.called)
+        self.assertEqual(by_rollup['summary'], by_reading['summary'])
+        self.assertEqual(by_rollup['buckets'], by_reading['buckets'])
+        self.assertEqual([bucket['count'] for bucket in by_rollup['buckets']], [3, 1])
+
+        week = self.stats(bucket='week', **days)
+        self.assertEqual(sum(bucket['count'] for bucket in week['buckets']), 4)
+        self.assertEqual(self.client.get('/api/readings/stats/', {'bucket': 'month'}).status_code, 400)
+
+
+# --- تخفيف سلسلة القراءات للرسم ---
+class GlucoseSeriesTests(TestCase):
+    def setUp(self):
+        self.ts = np.arange(1000, dtype=np.int64) * 300
+        self.values = 140 + 40 * np.sin(np.arange(1000) / 50)
+        self.values[437] = 390  # قمة واحدة يجب ألا تضيع
+        self.values[712] = 35
+
+    def test_lttb_keeps_ends_and_extremes(self):
+        selected = lttb(self.ts, self.values, 50)
+        self.assertEqual(len(selected), 50)
+        self.assertEqual((selected[0], selected[-1]), (0, 999))
+        self.assertTrue((np.diff(selected) > 0).all())
+        self.assertIn(437, selected)
+        self.assertIn(712, selected)
+        self.assertEqual(lttb(self.ts[:10], self.values[:10], 50).tolist(), list(range(10)))
+
+    def test_minmax_keeps_each_group_extremes(self):
+        selected = minmax(self.values, 40)
+        self.assertLessEqual(len(selected), 40)
+        self.assertTrue((np.diff(selected) > 0).all())
+        for group in np.array_split(np.arange(1000), 20):
+            chosen = set(selected.tolist()) & set(group.tolist())
+            self.assertIn(group[np.argmin(self.values[group])], chosen)
+            self.assertIn(group[np.argmax(self.values[group])], chosen)
+
+    def test_parse_range(self):
+        tz = timezone.get_current_timezone()
+        start, end = parse_range({'from': '2026-03-01', 'to': '2026-03-07'})
+        # تاريخ to يشمل اليوم كاملاً
+        self.assertEqual((start, end), (datetime(2026, 3, 1, tzinfo=tz), datetime(2026, 3, 8, tzinfo=tz)))
+        start, end = parse_range({'from': '2026-03-01T06:30:00', 'to': '2026-03-01T08:00:00+00:00'})
+        self.assertEqual(start, datetime(2026, 3, 1, 6, 30, tzinfo=tz))
+        self.assertEqual(end.utcoffset(), timedelta(0))
+        start, end = parse_range({})
+        self.assertEqual(end, datetime.combine(timezone.localdate() + timedelta(days=1), time.min, tzinfo=tz))
+        self.assertEqual(timezone.localtime(end).date() - timezone.localtime(start).date(), timedelta(days=30))
+        for params in ({'from': '2026-03-07', 'to': '2026-03-01'}, {'from': 'yesterday'}, {'to': '2026-02-30'}):
+            with self.subTest(params=params):
+                with self.assertRaises(ValidationError):
+                    parse_range(params)
+
+    def test_wide_minmax_reads_hourly_rollups(self):
+        user = User.objects.create(username='rollup_series_patient')
+        day = timezone.localdate() - timedelta(days=10)
+        start = datetime.combine(day, time.min, tzinfo=timezone.get_current_timezone())
+        BloodGlucoseReading.objects.bulk_create(
+            BloodGlucoseReading(patient=user.patientprofile, reading_value=float(value), reading_timestamp=start + timedelta(minutes=15 * i))
+            for i, value in enumerate(self.values[:800])
+        )
+        rebuild_patients([user.patientprofile.pk])
+        client = APIClient()
+        client.force_authenticate(user)
+        params = {'from': day.isoformat(), 'to': (day + timedelta(days=9)).isoformat(), 'algorithm': 'minmax', 'points': 20}
+        with mock.patch('core.series.fetch_patient_readings', wraps=fetch_patient_readings) as fetch:
+            body = client.get('/api/readings/series/', params).json()
+            self.assertFalse(fetch.called)
+            # مجموعات أقصر من ساعة أو LTTB: القراءات الخام
+            client.get('/api/readings/series/', {**params, 'points': 1000})
+            client.get('/api/readings/series/', {**params, 'algorithm': 'lttb'})
+            self.assertEqual(fetch.call_count, 2)
+        self.assertEqual(body['total'], 800)
+        self.assertLessEqual(body['count'], 20)
+        values = [point['value'] for point in body['series']]
+        self.assertEqual((min(values), max(values)), (35, 390))
+        timestamps = [point['timestamp'] for point in body['series']]
+        self.assertEqual(timestamps, sorted(timestamps))
+        # نقطة الأدنى في بداية الساعة التي فيها القراءة
+        lowest = timezone.localtime(start + timedelta(minutes=15 * 712)).replace(minute=0)
+        self.assertIn(lowest.isoformat(), timestamps)
+
+    def test_series_endpoint(self):
+        user = User.objects.create(username='series_patient')
+        start = timezone.now() - timedelta(days=1)
+        BloodGlucoseReading.objects.bulk_create(
+            BloodGlucoseReading(patient=user.patientprofile, reading_value=float(value), reading_timestamp=start + timedelta(minutes=5 * i))
+            for i, value in enumerate(self.values[:200])
+        )
+        rebuild_patients([user.patientprofile.pk])
+        client = APIClient()
+        client.force_authenticate(user)
+        for algorithm in ALGORITHMS:
+            with self.subTest(algorithm=algorithm):
+                body = client.get('/api/readings/series/', {'points': 20, 'algorithm': algorithm}).json()
+                self.assertEqual(body['total'], 200)
+                self.assertLessEqual(body['count'], 20)
+                self.assertEqual(body['count'], len(body['series']))
+        for params in ({'points': 2}, {'points': MAX_POINTS + 1}, {'points': 'x'}, {'algorithm': 'avg'}):
+            with self.subTest(params=params):
+                self.assertEqual(client.get('/api/readings/series/', params).status_code, 400)
+
+
+# --- استيراد ملفات CSV من الأجهزة ---
+class ImportReadingsTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.patient = User.objects.create(username='import_patient').patientprofile
+
+    def write(self, text):
+        path = os.path.join(self.root, 'export.csv')
+        with open(path, 'w', encoding='utf-8') as handle:
+            handle.write(text)
+        return path
+
+    def test_vendor_columns_units_and_rejects(self):
+        path = self.write(
+            'User,Time,Glucose,Unit,Type\n'
+            'import_patient,2026-03-01 08:00,110,mg/dL,Fasting\n'
+            'import_patient,2026-03-01 10:00,"5,5",mmol/L,صائم\n'
+            'import_patient,2026-03-01T12:00:00+00:00,6.0,mmol,after_meal\n'
+            'import_patient,yesterday,120,mg/dL,\n'
+            'ghost,2026-03-01 13:00,120,mg/dL,\n'
+            'import_patient,2026-03-01 14:00,1200,mg/dL,\n'
+            'import_patient,2026-03-01 15:00,130,mg/dL,Sideways\n'
+            'import_patient,2026-03-01 16:00,140,,\n'
+        )
+        out = io.StringIO()
+        call_command(
+            'import_readings', path, column=['patient=User', 'timestamp=Time', 'value=Glucose', 'unit=Unit', 'type=Type'],
+            patient_field='username', batch_size=2, transaction_rows=3, stdout=out,
+        )
+        self.assertIn('Imported 4 readings, rejected 4 rows', out.getvalue())
+
+        readings = BloodGlucoseReading.objects.filter(patient=self.patient).order_by('reading_timestamp')
+        self.assertEqual(
+            [(timezone.localtime(r.reading_timestamp).strftime('%H:%M'), r.reading_value, r.reading_type) for r in readings],
+            [('08:00', 110, 'Fasting'), ('10:00', 99.1, 'Fasting'), ('14:00', 108.1, 'After Meal'), ('16:00', 140, 'Random')],
+        )
+        with open(f'{path}.rejects.csv', encoding='utf-8') as handle:
+            rejects = list(csv.reader(handle))
+        self.assertEqual(rejects[0], ['line', 'error', 'User', 'Time', 'Glucose', 'Unit', 'Type'])
+        errors = {int(row[0]): row[1] for row in rejects[1:]}
+        self.assertEqual(sorted(errors), [5, 6, 7, 8])
+        self.assertEqual(errors[6], "unknown patient 'ghost'")
+        self.assertIn('out of range', errors[7])
+        self.assertEqual(errors[8], "unknown reading type 'sideways'")
+
+        # الـ rollups محدثة، والسجل التاريخي لا يطلق تنبيهات
+        self.assertEqual(GlucoseDailyRollup.objects.get(patient=self.patient).count, 4)
+        self.assertFalse(Job.objects.exists())
+
+    def test_fixed_patient_and_missing_columns(self):
+        path = self.write('timestamp,value\n2026-03-01 08:00,100\n')
+        call_command('import_readings', path, patient=str(self.patient.pk), stdout=io.StringIO())
+        self.assertEqual(BloodGlucoseReading.objects.filter(patient=self.patient).count(), 1)
+        # بدون مرفوضات لا يبقى ملف rejects
+        self.assertFalse(os.path.exists(f'{path}.rejects.csv'))
+        with self.assertRaisesMessage(CommandError, 'missing column(s) patient'):
+            call_command('import_readings', path, stdout=io.StringIO())
+        with self.assertRaises(CommandError):
+            call_command('import_readings', path, column=['glucose=value'], stdout=io.StringIO())
+        empty = self.write('')
+        with self.assertRaisesMessage(CommandError, 'is empty'):
+            call_command('import_readings', empty, stdout=io.StringIO())
+        # ملف لم يُستورد لا يترك ملف مرفوضات فارغاً
+        self.assertEqual(os.listdir(self.root), ['export.csv'])
+
+
+# --- لوحة مرضى الطبيب ---
+class CaseloadDashboardTests(TestCase):
+    def setUp(self):
+        self.doctor = User.objects.create(username='caseload_doctor', is_staff=True)
+        other_doctor = User.objects.create(username='caseload_other_doctor', is_staff=True).doctorprofile
+        self.patients = {}
+        recent = timezone.now() - timedelta(hours=1)
+        for name, values in (('low', [50, 100]), ('high', [200, 100]), ('steady', [100, 120]), ('silent', [])):
+            patient = User.objects.create(username=f'caseload_{name}', first_name=name).patientprofile
+            self.doctor.doctorprofile.patients.add(patient)
+            for minutes, value in enumerate(values):
+                BloodGlucoseReading.objects.create(patient=patient, reading_value=value, reading_timestamp=recent + timedelta(minutes=minutes))
+            self.patients[name] = patient
+        other_doctor.patients.add(User.objects.create(username='caseload_stranger').patientprofile)
+        # فقط أقرب موعد مؤكد قادم مع هذا الطبيب
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        for hour, (patient, doctor, day, status) in enumerate((
+            ('steady', self.doctor.doctorprofile, tomorrow + timedelta(days=2), 'Confirmed'),
+            ('steady', self.doctor.doctorprofile, tomorrow, 'Confirmed'),
+            ('high', self.doctor.doctorprofile, tomorrow, 'Pending'),
+            ('low', other_doctor, tomorrow, 'Confirmed'),
+            ('silent', self.doctor.doctorprofile, tomorrow - timedelta(days=3), 'Confirmed'),
+        ), start=9):
+            Appointment.objects.create(patient=self.patients[patient], doctor=doctor, status=status, appointment_date=day, appointment_time=time(hour))
+        self.tomorrow = tomorrow
+        self.client = APIClient()
+        self.client.force_authenticate(self.doctor)
+
+    def rows(self, ordering=None):
+        response = self.client.get('/api/doctors/my-patients/dashboard/', {'ordering': ordering} if ordering else {})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['results']
+
+    def test_metrics_and_default_risk_order(self):
+        rows = {row['full_name']: row for row in self.rows()}
+        self.assertEqual(list(rows), ['low', 'high', 'steady', 'silent'])
+        self.assertEqual(
+            {name: (row['week_count'], row['week_mean'], row['time_in_range'], row['risk']) for name, row in rows.items()},
+            {'low': (2, 75.0, 50.0, 120.0), 'high': (2, 150.0, 50.0, 40.0), 'steady': (2, 110.0, 100.0, 0.0), 'silent': (None, None, None, None)},
+        )
+        self.assertEqual(rows['high']['last_reading_value'], 100)
+        self.assertIsNone(rows['silent']['last_reading_at'])
+        self.assertEqual(
+            {name: row['next_appointment_date'] for name, row in rows.items()},
+            {'low': None, 'high': None, 'steady': self.tomorrow.isoformat(), 'silent': None},
+        )
+
+    def test_orderings_keep_missing_data_last(self):
+        self.assertEqual([row['full_name'] for row in self.rows('risk')], ['steady', 'high', 'low', 'silent'])
+        self.assertEqual([row['full_name'] for row in self.rows('-time_in_range')], ['steady', 'low', 'high', 'silent'])
+        self.assertEqual([row['full_name'] for row in self.rows('mean')], ['low', 'steady', 'high', 'silent'])
+        self.assertEqual([row['full_name'] for row in self.rows('next_appointment')][0], 'steady')
+        self.assertEqual([row['full_name'] for row in self.rows('name')], ['high', 'low', 'silent', 'steady'])
+
+    def test_invalid_ordering_and_non_doctor(self):
+        self.assertEqual(self.client.get('/api/doctors/my-patients/dashboard/', {'ordering': 'password'}).status_code, 400)
+        self.client.force_authenticate(self.patients['low'].user)
+        self.assertEqual(self.client.get('/api/doctors/my-patients/dashboard/').status_code, 403)
+
+
+# --- صلاحيات إحصائيات القراءات ---
+class GlucosePatientAccessTests(TestCase):
+    def setUp(self):
+        self.patient = User.objects.create(username='stats_patient').patientprofile
+        BloodGlucoseReading.objects.create(patient=self.patient, reading_value=120, reading_timestamp=timezone.now() - timedelta(hours=1))
+        self.client = APIClient()
+
+    def stats(self, user, **params):
+        self.client.force_authenticate(user)
+        return self.client.get('/api/readings/stats/', params)
+
+    def test_doctor_selects_existing_patient(self):
+        doctor = User.objects.create(username='stats_doctor', is_staff=True)
+        self.assertEqual(self.stats(doctor, patient=self.patient.pk).status_code, 200)
+        self.assertEqual(self.stats(doctor).status_code, 400)
+        self.assertEqual(self.stats(doctor, patient=self.patient.pk + 1000).status_code, 404)
+
+    def test_patient_sees_only_own_readings(self):
+        other = User.objects.create(username='stats_other')
+        # ?patient= يُتجاهل للمريض
+        self.assertIsNone(self.stats(other, patient=self.patient.pk).json()['summary'])
+        self.assertEqual(self.stats(self.patient.user).json()['summary']['count'], 1)
+
+    def test_user_without_profile_is_forbidden(self):
+        user = User.objects.create(username='stats_nobody')
+        user.patientprofile.delete()
+        user = User.objects.get(pk=user.pk)
+        self.assertEqual(self.stats(user, patient=self.patient.pk).status_code, 403)
+
+
+# --- تصدير القراءات ---
+class ReadingExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='export_patient')
+        start = timezone.now() - timedelta(days=3)
+        for i in range(5):
+            BloodGlucoseReading.objects.create(
+                patient=self.user.patientprofile, reading_value=100 + i, reading_timestamp=start + timedelta(hours=5 - i),
+                notes='بعد الغداء' if i == 0 else None,
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def export(self, params=None, **headers):
+        response = self.client.get('/api/readings/export/', params, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_is_the_default(self):
+        lines = self.export().splitlines()
+        self.assertEqual(lines[0], 'reading_timestamp,reading_value,reading_type,notes')
+        # ترتيب زمني تصاعدي
+        self.assertEqual([line.split(',')[1] for line in lines[1:]], ['104.0', '103.0', '102.0', '101.0', '100.0'])
+        self.assertTrue(lines[-1].endswith('بعد الغداء'))
+
+    def test_ndjson_by_format_or_accept(self):
+        for params, headers in (({'format': 'ndjson'}, {}), (None, {'Accept': 'application/x-ndjson'})):
+            with self.subTest(params=params):
+                rows = [json.loads(line) for line in self.export(params, **headers).splitlines()]
+                self.assertEqual([row['reading_value'] for row in rows], [104, 103, 102, 101, 100])
+                self.assertEqual(set(rows[0]), {'reading_timestamp', 'reading_value', 'reading_type', 'notes'})
+
+    def test_json_gets_a_readable_406(self):
+        for params, headers in ((None, {'Accept': 'application/json'}), ({'format': 'json'}, {})):
+            with self.subTest(params=params):
+                response = self.client.get('/api/readings/export/', params, headers=headers)
+                self.assertEqual(response.status_code, 406)
+                self.assertEqual(response['Content-Type'], 'application/json')
+                self.assertIn('csv, ndjson', response.json()['error'])
+
+    def test_rows_are_streamed_in_chunks(self):
+        readings = BloodGlucoseReading.objects.filter(patient=self.user.patientprofile).order_by('reading_timestamp')
+        with self.assertNumQueries(0):
+            stream = stream_ndjson(export_rows(readings, self.user.patientprofile.pk))
+        chunks = list(chunked(map(str, range(5)), size=2))
+        self.assertEqual(chunks, ['01', '23', '4'])
+        self.assertEqual(len(''.join(stream).splitlines()), 5)
+
+
+# --- مزامنة تطبيق الجوال ---
+class SyncTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='sync_patient')
+        self.patient = self.user.patientprofile
+        start = timezone.now() - timedelta(days=1)
+        self.readings = [
+            BloodGlucoseReading.objects.create(patient=self.patient, reading_value=100 + i, reading_timestamp=start + timedelta(minutes=i))
+            for i in range(5)
+        ]
+        self.medications = [Medication.objects.create(patient=self.patient, name=f'دواء {i}') for i in range(3)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def all_pages(self, params):
+        pages = [self.client.get('/api/sync/', params).json()]
+        while pages[-1]['next']:
+            pages.append(self.client.get('/api/sync/', {'cursor': pages[-1]['next']}).json())
+        return pages
+
+    def test_snapshot_pages_cover_every_row_once(self):
+        with mock.patch('core.sync.SYNC_PAGE_SIZE', 3):
+            pages = self.all_pages({})
+        self.assertEqual(len(pages), 3)
+        self.assertEqual([page['token'] is None for page in pages], [True, True, False])
+        self.assertTrue(all(page['full'] for page in pages))
+        readings = [row['id'] for page in pages for row in page['changes']['readings']]
+        medications = [row['id'] for page in pages for row in page['changes']['medications']]
+        self.assertEqual(readings, [reading.pk for reading in self.readings])
+        self.assertEqual(medications, [medication.pk for medication in self.medications])
+
+    def test_delta_with_tombstones(self):
+        token = self.all_pages({})[-1]['token']
+        # الـ token يرجع SYNC_OVERLAP للخلف: نقدم ما سبق حتى لا يعود في الفرق
+        BloodGlucoseReading.objects.filter(patient=self.patient).update(updated_at=timezone.now() - timedelta(minutes=5))
+        Medication.objects.filter(patient=self.patient).update(updated_at=timezone.now() - timedelta(minutes=5))
+        self.readings[0].reading_value = 90
+        self.readings[0].save()
+        deleted_id = self.medications[1].pk
+        self.medications[1].delete()
+
+        pages = patient_changes(self.patient, cursor=None, since=timezone.now() - timedelta(minutes=1), page_size=1)
+        self.assertEqual([row['id'] for row in pages['changes']['readings']], [self.readings[0].pk])
+        self.assertIsNotNone(pages['next'])
+        delta = self.all_pages({'since': token})[-1]
+        self.assertFalse(delta['full'])
+        self.assertEqual(delta['deleted']['medications'], [deleted_id])
+
+    def test_invalid_or_expired_tokens(self):
+        for params in ({'cursor': 'bm9wZQ=='}, {'cursor': 'WzEsMl0='}, {'since': 'x'},
+                       {'since': encode_token(timezone.now() - timedelta(days=365))}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/api/sync/', params).status_code, 400)
+
+    def test_purge_tombstones(self):
+        self.medications[0].delete()
+        SyncTombstone.objects.update(deleted_at=timezone.now() - timedelta(days=100))
+        kept = self.medications[2].pk
+        self.medications[2].delete()
+        self.assertEqual(purge_tombstones(timezone.now() - timedelta(days=90), chunk_size=1), 1)
+        self.assertEqual(SyncTombstone.objects.get().object_id, kept)
+
+
+# --- ترقيم الصفحات بالـ cursor ---
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        user = User.objects.create(username='cursor_patient')
+        start = timezone.now() - timedelta(days=1)
+        # قراءتان لكل وقت: الترتيب الثانوي (id) يفصل بينهما
+        BloodGlucoseReading.objects.bulk_create(
+            BloodGlucoseReading(patient=user.patientprofile, reading_value=100 + i, reading_timestamp=start + timedelta(minutes=i // 2))
+            for i in range(25)
+        )
+        self.expected = list(
+            BloodGlucoseReading.objects.order_by('-reading_timestamp', '-id').values_list('pk', flat=True)
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+    def ids(self, response):
+        self.assertEqual(response.status_code, 200, response.content)
+        return [row['id'] for row in response.json()['results']]
+
+    def test_forward_and_reverse_round_trip(self):
+        response = self.client.get('/api/readings/', {'pagination': 'cursor'})
+        pages = [self.ids(response)]
+        self.assertIsNone(response.json()['previous'])
+        while response.json()['next']:
+            response = self.client.get(response.json()['next'])
+            pages.append(self.ids(response))
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual([pk for page in pages for pk in page], self.expected)
+
+        response = self.client.get(response.json()['previous'])
+        self.assertEqual(self.ids(response), pages[1])
+        response = self.client.get(response.json()['previous'])
+        self.assertEqual(self.ids(response), pages[0])
+        self.assertIsNone(response.json()['previous'])
+
+    def test_malformed_cursor_is_400(self):
+        encode = lambda value: base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+        for cursor in (
+            'not base64!', encode({'a': 1, 'b': 2}), encode([[[1], {'x': 1}], False]), encode([['x', 1], False]),
+            encode([[1], False]), encode([['2026-01-01T00:00:00', 1], 'yes']), encode([[None, 1], False]), encode(7),
+        ):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get('/api/readings/', {'cursor': cursor}).status_code, 400)
+
+
+# --- أرشفة القراءات القديمة ---
+class ReadingArchiveTests(TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        settings = override_settings(GLUCOSE_ARCHIVE_ROOT=root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.patient = User.objects.create(username='archive_patient').patientprofile
+        old = timezone.now() - timedelta(days=500)
+        for i in range(6):
+            BloodGlucoseReading.objects.create(
+                patient=self.patient, reading_value=60 + 40 * i, reading_type=('Fasting', 'After Meal', 'Random')[i % 3],
+                reading_timestamp=(old + timedelta(days=20 * i, minutes=7 * i)).replace(second=0, microsecond=0),
+            )
+        # الملاحظات لا تدخل ملفات الأرشيف
+        self.noted = BloodGlucoseReading.objects.create(
+            patient=self.patient, reading_value=150, notes='بعد الرياضة', reading_timestamp=old.replace(second=0, microsecond=0),
+        )
+        BloodGlucoseReading.objects.create(
+            patient=self.patient, reading_value=110, reading_timestamp=(timezone.now() - timedelta(days=2)).replace(second=0, microsecond=0),
+        )
+
+    def test_archive_round_trip(self):
+        before = fetch_patient_readings(self.patient.pk)
+        call_command('archive_readings', months=6, stdout=io.StringIO())
+
+        self.assertEqual(
+            list(BloodGlucoseReading.objects.filter(patient=self.patient).order_by('reading_timestamp').values_list('reading_value', flat=True)),
+            [150, 110],
+        )
+        self.assertEqual(sum(ReadingArchive.objects.filter(patient=self.patient).values_list('count', flat=True)), 6)
+        # الحذف المباشر لا يمر بالـ signals: لا tombstones للمزامنة
+        self.assertFalse(SyncTombstone.objects.exists())
+        after = fetch_patient_readings(self.patient.pk)
+        for expected, actual in zip(before, after):
+            self.assertEqual(expected.tolist(), actual.tolist())
+
+        # إعادة التشغيل لا تكرر شيئاً
+        call_command('archive_readings', months=6, stdout=io.StringIO())
+        self.assertEqual(fetch_patient_readings(self.patient.pk)[0].tolist(), before[0].tolist())
+
+    def test_rollups_merge_archived_months(self):
+        before = rollup_snapshot(self.patient)
+        call_command('archive_readings', months=6, stdout=io.StringIO())
+        self.assertEqual(rollup_snapshot(self.patient), before)
+        # إعادة البناء من الصفر تجمع الجدول الحي والأشهر المؤرشفة
+        rebuild_patients([self.patient.pk])
+        self.assertEqual(rollup_snapshot(self.patient), before)
@@ -12,10 +12,15 @@ from .views import (
     ConsultationViewSet,
     AlertViewSet,
     DoctorViewSet,
+    DoctorScheduleViewSet,
+    ScheduleExceptionViewSet,
     AppointmentViewSet,
     NotificationViewSet, 
     CustomAuthToken,
-    generate_pdf_report
+    generate_pdf_report,
+    notification_stream,
+    bookings_ics,
+    sync
 )
 
 router = DefaultRouter()
@@ -28,11 +33,17 @@ router.register(r'attachments', AttachmentViewSet, basename='attachment')
 router.register(r'consultations', ConsultationViewSet, basename='consultation')
 router.register(r'alerts', AlertViewSet, basename='alert')
 router.register(r'doctors', DoctorViewSet, basename='doctor')
+router.register(r'schedules', DoctorScheduleViewSet, basename='doctorschedule')
+router.register(r'schedule-exceptions', ScheduleExceptionViewSet, basename='scheduleexception')
 router.register(r'appointments', AppointmentViewSet, basename='appointment')
 router.register(r'notifications', NotificationViewSet, basename='notification') 
 
 urlpatterns = [
+    # قبل الـ router: وإلا يُفهم appointments/bookings.ics كـ action الحجوزات بصيغة ics
+    path('appointments/bookings.ics', bookings_ics, name='bookings_ics'),
+    path('notifications/stream/', notification_stream, name='notification_stream'),
     path('', include(router.urls)),
     path('token/auth/', CustomAuthToken.as_view(), name='token_auth'),
     path('consultations/<int:consultation_id>/report/', generate_pdf_report, name='pdf_report'),
+    path('sync/', sync, name='sync'),
 ]
\ No newline at end of file
@@ -5,13 +5,23 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
 from django.shortcuts import get_object_or_404
 from django.template.loader import render_to_string
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseNotFound, HttpResponseNotModified, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_GET
 from weasyprint import HTML, CSS
 from django.utils import timezone
+import asyncio
 import os
 
 
@@ -19,13 +29,14 @@ from rest_framework.decorators import api_view, authentication_classes, permissi
 from rest_framework.authentication import TokenAuthentication, SessionAuthentication
 from rest_framework import serializers
 from rest_framework import mixins
-from drf_spectacular.utils import extend_schema
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter, extend_schema
 
 
 from .models import (
     PatientProfile, BloodGlucoseReading, Medication, DoctorNote, Attachment,
     Consultation, Alert, User, DoctorProfile, FavoriteDoctor, Appointment,
-    Notification 
+    Notification, GlucoseTarget, DoctorReview, DoctorSchedule, ScheduleException, new_calendar_token
 )
 from .serializers import (
     UserSerializer, PatientProfileSerializer, BloodGlucoseReadingSerializer,
@@ -33,13 +44,29 @@ from .serializers import (
     AuthTokenSerializer, 
     ConsultationSerializer, AlertSerializer,
     FavoriteDoctorSerializer, AppointmentSerializer,
-    NotificationSerializer, PatientMedicalDataSerializer,
+    NotificationSerializer, NotificationMarkReadSerializer, PatientMedicalDataSerializer,
     AppointmentCreateSerializer, PatientListForDoctorSerializer,
     DoctorProfileSerializer,
     DoctorProfileListSerializer, 
     FavoriteDoctorListSerializer, PatientAppointmentSerializer, DoctorAppointmentListSerializer, DoctorAppointmentUpdateSerializer,
-    AppointmentRespondSerializer, ConsultationDiagnoseSerializer, DoctorBookingsSerializer  
+    AppointmentRespondSerializer, ConsultationDiagnoseSerializer, DoctorBookingsSerializer,
+    BloodGlucoseReadingBulkItemSerializer, GlucoseTargetSerializer, PatientDashboardSerializer,
+    DoctorReviewSerializer, DoctorScheduleSerializer, ScheduleExceptionSerializer, notification_related_prefetch
 )
+from .parsers import NDJSONParser
+from .ingest import MAX_BULK_ITEMS, validate_reading_batch, insert_readings
+from .glucose import BUCKETS, TARGET_HIGH, TARGET_LOW, parse_range, glucose_statistics
+from .series import ALGORITHMS, DEFAULT_POINTS, MAX_POINTS, glucose_series
+from .renderers import CSVRenderer, NDJSONRenderer
+from .exports import STREAMERS, export_rows
+from .sync import decode_token, patient_changes
+from .agp import AGP_WINDOWS, clear_agp, glucose_agp
+from .dashboard import DASHBOARD_ORDERING, DEFAULT_DASHBOARD_ORDERING, caseload
+from .search import search_doctors
+from .slots import free_slots, parse_slot_range
+from .ical import bookings_calendar, bookings_etag, touch_bookings
+from .notifications import mark_read, notify, unread_count
+from .push import get_broker, missed_events
 
 from .permissions import IsDoctor, IsPatientOwner, IsOwnerOrDoctor, IsPatientOwnerOrDoctor, IsProfileOwner, IsPatient, IsDoctorOrReadOnly, IsPatientOwnerOfConsultation
 
@@ -98,9 +125,9 @@ class PatientProfileViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin,
         user = self.request.user
         if user.is_authenticated:
             if hasattr(user, 'patientprofile'):
-                return PatientProfile.objects.filter(user=user)
+                return PatientProfile.objects.filter(user=user).select_related('user')
             elif user.is_staff:
-                return PatientProfile.objects.all()
+                return PatientProfile.objects.select_related('user').order_by('pk')
         return PatientProfile.objects.none()
 
     def perform_create(self, serializer):
@@ -118,17 +145,51 @@ class PatientProfileViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin,
             serializer.save()
             return Response(serializer.data)
 
+    @action(detail=True, methods=['get', 'put', 'patch'], url_path='glucose-target', serializer_class=GlucoseTargetSerializer)
+    def glucose_target(self, request, pk=None):
+        """
+        النطاق المستهدف للسكر الذي تُكشف على أساسه القراءات المنخفضة/المرتفعة.
+        المريض يعرضه فقط، والطبيب يعدله. بدون تعديل يُستخدم النطاق الافتراضي.
+        """
+        patient_profile = self.get_object()
+        target = GlucoseTarget.objects.filter(patient=patient_profile).first()
+        if request.method == 'GET':
+            if target is None:
+                return Response({'low': TARGET_LOW, 'high': TARGET_HIGH, 'set_by': None, 'set_by_name': None, 'updated_at': None})
+            return Response(self.get_serializer(target).data)
+        if not request.user.is_staff:
+            return Response({'error': 'Only doctors can change the target range.'}, status=status.HTTP_403_FORBIDDEN)
+        serializer = self.get_serializer(target, data=request.data, partial=request.method == 'PATCH')
+        serializer.is_valid(raise_exception=True)
+        serializer.save(patient=patient_profile, set_by=request.user)
+        # الـ AGP المخزن يتضمن النطاق المستهدف
+        clear_agp(patient_profile.pk)
+        return Response(serializer.data)
+
+    @action(detail=True, methods=['get'], url_path='agp')
+    def agp(self, request, pk=None):
+        """
+        ملف السكر الإسعافي (AGP): المئينات 5/25/50/75/95 لكل 15 دقيقة من اليوم
+        على آخر 14 أو 90 يوماً (?days=14|90).
+        """
+        patient_profile = self.get_object()
+        days = request.query_params.get('days', str(AGP_WINDOWS[0]))
+        if not days.isdigit() or int(days) not in AGP_WINDOWS:
+            return Response({'error': f"days must be one of: {', '.join(map(str, AGP_WINDOWS))}."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(glucose_agp(patient_profile.pk, int(days)))
+
 class BloodGlucoseReadingViewSet(viewsets.ModelViewSet):
     queryset = BloodGlucoseReading.objects.all()
     serializer_class = BloodGlucoseReadingSerializer
     permission_classes = [IsAuthenticated, IsOwnerOrDoctor]
+    cursor_ordering = ('-reading_timestamp', '-id')
     def get_queryset(self):
         user = self.request.user
         if user.is_authenticated:
             if hasattr(user, 'patientprofile'):
-                return BloodGlucoseReading.objects.filter(patient=user.patientprofile).order_by('-reading_timestamp')
+                return BloodGlucoseReading.objects.filter(patient=user.patientprofile).select_related('patient__user').order_by('-reading_timestamp', '-id')
             elif user.is_staff:
-                return BloodGlucoseReading.objects.all().order_by('-reading_timestamp')
+                return BloodGlucoseReading.objects.select_related('patient__user').order_by('-reading_timestamp', '-id')
         return BloodGlucoseReading.objects.none()
     def perform_create(self, serializer):
         if hasattr(self.request.user, 'patientprofile'):
@@ -136,6 +197,101 @@ class BloodGlucoseReadingViewSet(viewsets.ModelViewSet):
         else:
             raise serializers.ValidationError("Only patients can create blood glucose readings.")
 
+    def get_patient_id(self, request):
+        """
+        المريض المقصود بنفس صلاحيات get_queryset:
+        المريض يرى قراءاته فقط، والطبيب (is_staff) يحدد مريضاً موجوداً عن طريق ?patient=،
+        وأي مستخدم آخر لا يصل لقراءات أحد.
+        """
+        if hasattr(request.user, 'patientprofile'):
+            return request.user.patientprofile.id
+        if not request.user.is_staff:
+            raise PermissionDenied('Only patients and doctors can view glucose readings.')
+        patient_id = request.query_params.get('patient')
+        if not patient_id or not patient_id.isdigit():
+            raise serializers.ValidationError({'patient': 'A patient id is required.'})
+        return get_object_or_404(PatientProfile.objects.only('pk'), pk=int(patient_id)).pk
+
+    @action(detail=False, methods=['get'], url_path='stats')
+    def stats(self, request):
+        """
+        إحصائيات السكر لكل يوم أو أسبوع: المتوسط، الانحراف، CV، الوقت ضمن النطاق، GMI...
+        ?from=&to=&bucket=day|week
+        """
+        bucket = request.query_params.get('bucket', 'day')
+        if bucket not in BUCKETS:
+            return Response({'error': f"bucket must be one of: {', '.join(BUCKETS)}."}, status=status.HTTP_400_BAD_REQUEST)
+        start, end = parse_range(request.query_params)
+        return Response(glucose_statistics(self.get_patient_id(request), start, end, bucket))
+
+    @action(detail=False, methods=['get'], url_path='series')
+    def series(self, request):
+        """
+        سلسلة قراءات مخففة للرسوم البيانية بدل كل القراءات: ?from=&to=&points=500&algorithm=lttb|minmax
+        """
+        algorithm = request.query_params.get('algorithm', 'lttb')
+        if algorithm not in ALGORITHMS:
+            return Response({'error': f"algorithm must be one of: {', '.join(ALGORITHMS)}."}, status=status.HTTP_400_BAD_REQUEST)
+        points = request.query_params.get('points', str(DEFAULT_POINTS))
+        if not points.isdigit() or not 3 <= int(points) <= MAX_POINTS:
+            return Response({'error': f'points must be an integer between 3 and {MAX_POINTS}.'}, status=status.HTTP_400_BAD_REQUEST)
+        start, end = parse_range(request.query_params)
+        return Response(glucose_series(self.get_patient_id(request), start, end, int(points), algorithm))
+
+    # JSONRenderer آخر القائمة: ليس صيغة تصدير، لكنه يعطي عميل Accept: application/json رسالة خطأ يقرأها بدل 406 بصيغة CSV
+    @action(detail=False, methods=['get'], url_path='export', renderer_classes=[CSVRenderer, NDJSONRenderer, JSONRenderer])
+    def export(self, request):
+        """
+        تصدير كامل سجل قراءات المريض كملف CSV أو NDJSON (?format=csv|ndjson&patient=)
+        يُبث على دفعات بذاكرة ثابتة مهما كان طول السجل.
+        """
+        renderer = request.accepted_renderer
+        if renderer.format not in STREAMERS:
+            return Response(
+                {'error': f"Export format must be one of: {', '.join(STREAMERS)} (use ?format= or the Accept header)."},
+                status=status.HTTP_406_NOT_ACCEPTABLE,
+            )
+        patient_id = self.get_patient_id(request)
+        readings = self.get_queryset().filter(patient_id=patient_id).order_by('reading_timestamp', 'id')
+        rows = export_rows(readings, patient_id)
+        response = StreamingHttpResponse(STREAMERS[renderer.format](rows), content_type=f'{renderer.media_type}; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="glucose_readings.{renderer.format}"'
+        return response
+
+    @action(
+        detail=False,
+        methods=['post'],
+        url_path='bulk',
+        parser_classes=[JSONParser, NDJSONParser],
+        serializer_class=BloodGlucoseReadingBulkItemSerializer
+    )
+    def bulk(self, request):
+        """
+        مزامنة دفعة قراءات من جهاز القياس (JSON array أو NDJSON) في طلب واحد.
+        يرجع نتيجة القبول/الرفض لكل عنصر حسب ترتيبه في الدفعة.
+        """
+        if not hasattr(request.user, 'patientprofile'):
+            return Response({'error': 'Only patients can create blood glucose readings.'}, status=status.HTTP_403_FORBIDDEN)
+        items = request.data
+        if not isinstance(items, list):
+            return Response({'error': 'Expected a list of readings.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > MAX_BULK_ITEMS:
+            return Response({'error': f'A batch may contain at most {MAX_BULK_ITEMS} readings.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        valid, rejected = validate_reading_batch(items, self.get_serializer())
+        created = insert_readings(request.user.patientprofile, [data for _, data in valid])
+
+        results = [{'index': index, 'status': 'rejected', 'errors': errors} for index, errors in rejected]
+        results += [
+            {'index': index, 'status': 'accepted', 'id': reading.pk}
+            for (index, _), reading in zip(valid, created)
+        ]
+        results.sort(key=lambda result: result['index'])
+        return Response(
+            {'accepted': len(created), 'rejected': len(rejected), 'results': results},
+            status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST
+        )
+
 class MedicationViewSet(viewsets.ModelViewSet):
     queryset = Medication.objects.all()
     serializer_class = MedicationSerializer
@@ -144,9 +300,9 @@ class MedicationViewSet(viewsets.ModelViewSet):
         user = self.request.user
         if user.is_authenticated:
             if hasattr(user, 'patientprofile'):
-                return Medication.objects.filter(patient=user.patientprofile).order_by('-start_date')
+                return Medication.objects.filter(patient=user.patientprofile).select_related('patient__user').order_by('-start_date')
             elif user.is_staff:
-                return Medication.objects.all().order_by('-start_date')
+                return Medication.objects.select_related('patient__user').order_by('-start_date')
         return Medication.objects.none()
     def perform_create(self, serializer):
         if hasattr(self.request.user, 'patientprofile'):
@@ -158,13 +314,14 @@ class DoctorNoteViewSet(viewsets.ModelViewSet):
     queryset = DoctorNote.objects.all()
     serializer_class = DoctorNoteSerializer
     permission_classes = [IsAuthenticated, IsOwnerOrDoctor]
+    cursor_ordering = ('-timestamp', '-id')
     def get_queryset(self):
         user = self.request.user
         if user.is_authenticated:
             if hasattr(user, 'patientprofile'):
-                return DoctorNote.objects.filter(patient=user.patientprofile).order_by('-timestamp')
+                return DoctorNote.objects.filter(patient=user.patientprofile).select_related('patient__user', 'doctor').order_by('-timestamp', '-id')
             elif user.is_staff:
-                return DoctorNote.objects.all().order_by('-timestamp')
+                return DoctorNote.objects.select_related('patient__user', 'doctor').order_by('-timestamp', '-id')
         return DoctorNote.objects.none()
     def perform_create(self, serializer):
         if self.request.user.is_staff:
@@ -192,17 +349,96 @@ def generate_pdf_report(request, consultation_id):
     response['Content-Disposition'] = f'attachment; filename="consultation_report_{consultation.id}.pdf"'
     return response
 
+@extend_schema(
+    parameters=[
+        OpenApiParameter('since', str, description='Sync token from the last page of the previous sync.'),
+        OpenApiParameter('cursor', str, description="The 'next' value of the previous page."),
+    ],
+    responses=OpenApiTypes.OBJECT,
+)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsPatient])
+def sync(request):
+    """
+    مزامنة تطبيق الجوال: بدون since ترجع كل بيانات المريض، ومع ?since=<token>
+    ترجع فقط ما أُنشئ أو عُدل أو حُذف بعده. الرد على صفحات: ما دام next ليس null يطلب العميل
+    ?cursor=<next>، والصفحة الأخيرة فيها token جديد للمزامنة التالية.
+    """
+    cursor = request.query_params.get('cursor')
+    token = request.query_params.get('since')
+    since = decode_token(token) if token and not cursor else None
+    return Response(patient_changes(request.user.patientprofile, since, context={'request': request}, cursor=cursor))
+
+@require_GET
+async def notification_stream(request):
+    """
+    قناة الإشعارات الفورية (Server-Sent Events) بدل الاستعلام المتكرر عن /api/notifications/.
+    التوثيق بـ Authorization: Token <key> أو ?token= (EventSource في المتصفح لا يرسل headers).
+    كل اتصال مفتوح مهمة asyncio تنتظر queue بدون thread ولا استعلامات، لذلك يجب تشغيله على
+    خادم ASGI (rahat_sukari/asgi.py). Last-Event-ID يعيد ما فات العميل أثناء انقطاعه.
+    """
+    header = request.headers.get('Authorization', '')
+    key = header[len('Token '):] if header.startswith('Token ') else request.GET.get('token')
+    token = await Token.objects.select_related('user').filter(key=key).afirst() if key else None
+    if token is None or not token.user.is_active:
+        return HttpResponse(status=401)
+    user_id = token.user_id
+    last_event_id = request.headers.get('Last-Event-ID', '')
+
+    async def events():
+        broker = get_broker()
+        queue = broker.subscribe(user_id)
+        try:
+            yield f'retry: {settings.PUSH_RETRY_MS}\n\n'
+            if last_event_id.isdigit():
+                for event in await sync_to_async(missed_events)(user_id, int(last_event_id)):
+                    yield event
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=settings.PUSH_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    # يبقي الاتصال مفتوحاً عبر الـ proxies التي تغلق الاتصالات الصامتة
+                    yield ': keepalive\n\n'
+        finally:
+            broker.unsubscribe(user_id, queue)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@require_GET
+def bookings_ics(request):
+    """
+    تقويم حجوزات الطبيب المؤكدة لتطبيقات التقويم: ?token=<calendar_token> بدل تسجيل الدخول.
+    الـ ETag من نسخة الحجوزات، فالطلب المتكرر بدون تغيير يرجع 304 باستعلام واحد على DoctorProfile
+    دون قراءة جدول المواعيد، والملف نفسه من الـ cache حتى يتغير شيء (core.ical).
+    """
+    token = request.GET.get('token')
+    doctor = DoctorProfile.objects.filter(calendar_token=token).values_list('pk', 'bookings_version').first() if token else None
+    if doctor is None:
+        return HttpResponseNotFound()
+    etag = bookings_etag(*doctor)
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(bookings_calendar(*doctor), content_type='text/calendar; charset=utf-8')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
 class AttachmentViewSet(viewsets.ModelViewSet):
     queryset = Attachment.objects.all()
     serializer_class = AttachmentSerializer
     permission_classes = [IsAuthenticated, IsOwnerOrDoctor]
+    cursor_ordering = ('-uploaded_at', '-id')
     def get_queryset(self):
         user = self.request.user
         if user.is_authenticated:
             if hasattr(user, 'patientprofile'):
-                return Attachment.objects.filter(patient=user.patientprofile).order_by('-uploaded_at')
+                return Attachment.objects.filter(patient=user.patientprofile).select_related('patient__user').order_by('-uploaded_at', '-id')
             elif user.is_staff:
-                return Attachment.objects.all().order_by('-uploaded_at')
+                return Attachment.objects.select_related('patient__user').order_by('-uploaded_at', '-id')
         return Attachment.objects.none()
     def perform_create(self, serializer):
         if hasattr(self.request.user, 'patientprofile'):
@@ -232,10 +468,10 @@ class ConsultationViewSet(viewsets.ModelViewSet):
         if user.is_authenticated:
             # إذا كان المستخدم مريض، نعرض له استشاراته فقط
             if hasattr(user, 'patientprofile'):
-                return Consultation.objects.filter(patient=user.patientprofile)
+                return Consultation.objects.filter(patient=user.patientprofile).select_related('doctor')
             # إذا كان طبيب، نعرض له كل الاستشارات (يمكن تحسينها لاحقاً)
             elif user.is_staff:
-                return Consultation.objects.all()
+                return Consultation.objects.select_related('doctor')
         return Consultation.objects.none()
 
     def perform_create(self, serializer):
@@ -263,17 +499,14 @@ class ConsultationViewSet(viewsets.ModelViewSet):
         # 3. نحدّث بيانات الاستشارة
         consultation.diagnosis = serializer.validated_data['diagnosis']
         consultation.treatment = serializer.validated_data['treatment']
-        consultation.save()
 
-        # 4. نرسل إشعاراً للمريض
+        # 4. نرسل إشعاراً للمريض (عبر طابور المهام، في نفس transaction الحفظ)
         doctor_name = request.user.get_full_name() or request.user.username
         notification_message = f"قام د. {doctor_name} بإضافة تشخيص وخطة علاج جديدة لك."
-        
-        Notification.objects.create(
-            recipient=consultation.patient.user,
-            message=notification_message,
-            related_object=consultation  # نربط الإشعار بالاستشارة نفسها
-        )
+        with transaction.atomic():
+            consultation.save()
+            # نربط الإشعار بالاستشارة نفسها
+            notify([(consultation.patient.user_id, notification_message, consultation)], kind='consultation.diagnosed')
         
         # 5. نرجع رسالة نجاح للطبيب
         return Response(
@@ -288,7 +521,7 @@ class AlertViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         user = self.request.user
         if user.is_authenticated and hasattr(user, 'patientprofile'):
-            return Alert.objects.filter(patient=user.patientprofile).order_by('alert_date', 'alert_time')
+            return Alert.objects.filter(patient=user.patientprofile).select_related('patient__user').order_by('alert_date', 'alert_time')
         return Alert.objects.none()
     def perform_create(self, serializer):
         if hasattr(self.request.user, 'patientprofile'):
@@ -301,15 +534,38 @@ class AlertViewSet(viewsets.ModelViewSet):
         if new_status not in [True, False]:
             return Response({'error': "You must provide an 'is_active' field with a boolean value (true or false)."}, status=status.HTTP_400_BAD_REQUEST)
         patient_profile = request.user.patientprofile
-        updated_count = Alert.objects.filter(patient=patient_profile).update(is_active=new_status)
+        # update() لا يمر على auto_now، فنحدث updated_at يدوياً حتى تصل التغييرات في المزامنة
+        updated_count = Alert.objects.filter(patient=patient_profile).update(is_active=new_status, updated_at=timezone.now())
         status_word = "activated" if new_status else "deactivated"
         return Response({'status': f'All {updated_count} alerts have been {status_word}.'}, status=status.HTTP_200_OK)
 
 # --- DoctorProfile ViewSet (UPDATED with 'personal_data' action) ---
 class DoctorViewSet(viewsets.ReadOnlyModelViewSet):
     # هذا الـ ViewSet الآن وظيفته الأساسية هي عرض قائمة الأطباء وتفاصيلهم فقط
-    queryset = DoctorProfile.objects.all()
+    queryset = DoctorProfile.objects.select_related('user').order_by('pk')
     serializer_class = DoctorProfileListSerializer # Sserializer الافتراضي لعرض القائمة
+    # البحث في الدليل: ?q= (الاسم، التخصص، النبذة، العنوان) مع فلاتر ?is_available= و ?specialty=
+    # لا فهرس على specialty عمداً: بدون إحصائيات ANALYZE يختاره SQLite كحلقة خارجية ويعيد MATCH لكل طبيب
+    # والترتيب بالتقييم: ?ordering=-average_rating (على فهرس doctor_rating_idx)
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = ['is_available', 'specialty']
+    ordering_fields = ['average_rating', 'rating_count']
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        query = self.request.query_params.get('q', '').strip()
+        if self.action == 'list' and query:
+            queryset = search_doctors(queryset, query)
+        return queryset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in ('list', 'retrieve'):
+            # is_favorited لكل الصفحة من set واحد: استعلام واحد للطلب بدل exists() لكل طبيب
+            context['favorite_doctor_ids'] = set(
+                FavoriteDoctor.objects.filter(patient__user=self.request.user).values_list('doctor_id', flat=True)
+            )
+        return context
 
     @action(detail=False, methods=['get'], url_path='my-patients', serializer_class=PatientListForDoctorSerializer)
     def list_patients(self, request):
@@ -319,11 +575,83 @@ class DoctorViewSet(viewsets.ReadOnlyModelViewSet):
         
         doctor_profile = request.user.doctorprofile
         # هنا نجلب قائمة المرضى المرتبطين بهذا الطبيب
-        patients = doctor_profile.patients.all()
+        patients = doctor_profile.patients.select_related('user')
         
         serializer = self.get_serializer(patients, many=True)
         return Response(serializer.data)
 
+    @action(
+        detail=False, methods=['get'], url_path='my-patients/dashboard',
+        serializer_class=PatientDashboardSerializer
+    )
+    def dashboard(self, request):
+        """
+        لوحة مرضى الطبيب: آخر قراءة، متوسط وزمن النطاق لآخر 7 أيام، مؤشر الخطورة وأقرب موعد مؤكد.
+        ?ordering=-risk (الافتراضي، الأخطر أولاً) أو risk, mean, time_in_range, last_reading, next_appointment, name
+        """
+        if not hasattr(request.user, 'doctorprofile'):
+            return Response({'error': 'User is not a doctor.'}, status=status.HTTP_403_FORBIDDEN)
+
+        ordering = request.query_params.get('ordering', DEFAULT_DASHBOARD_ORDERING)
+        if ordering.lstrip('-') not in DASHBOARD_ORDERING:
+            return Response(
+                {'error': f"ordering must be one of: {', '.join(DASHBOARD_ORDERING)} (prefix - for descending)."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        patients = caseload(request.user.doctorprofile, ordering)
+        page = self.paginate_queryset(patients)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(patients, many=True).data)
+
+    @action(detail=True, methods=['get', 'post', 'delete'], url_path='reviews', serializer_class=DoctorReviewSerializer)
+    def reviews(self, request, pk=None):
+        """
+        تقييمات الطبيب: GET للجميع، POST لإضافة أو تعديل تقييم المريض، DELETE لحذفه.
+        التقييم مسموح فقط للمريض الذي له موعد مؤكد مع هذا الطبيب.
+        """
+        doctor = self.get_object()
+        if request.method == 'GET':
+            reviews = doctor.reviews.select_related('patient__user').order_by('-created_at', '-id')
+            page = self.paginate_queryset(reviews)
+            if page is not None:
+                return self.get_paginated_response(self.get_serializer(page, many=True).data)
+            return Response(self.get_serializer(reviews, many=True).data)
+
+        if not hasattr(request.user, 'patientprofile'):
+            return Response({'error': 'Only patients can review doctors.'}, status=status.HTTP_403_FORBIDDEN)
+        patient_profile = request.user.patientprofile
+        review = DoctorReview.objects.filter(patient=patient_profile, doctor=doctor).first()
+        if request.method == 'DELETE':
+            if review is None:
+                return Response({'error': 'You have not reviewed this doctor.'}, status=status.HTTP_404_NOT_FOUND)
+            review.delete()
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        if not Appointment.objects.filter(patient=patient_profile, doctor=doctor, status='Confirmed').exists():
+            return Response(
+                {'error': 'You can only review a doctor you have a confirmed appointment with.'},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+        serializer = self.get_serializer(review, data=request.data, partial=review is not None)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(patient=patient_profile, doctor=doctor)
+        return Response(serializer.data, status=status.HTTP_200_OK if review else status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get'], url_path='slots')
+    def slots(self, request, pk=None):
+        """
+        المواعيد المتاحة للحجز: ?from=&to= (YYYY-MM-DD، شاملين، الافتراضي 14 يوماً من اليوم).
+        استعلام واحد للجدول والاستثناءات والمواعيد، والطبيب يُقرأ فقط إذا لم يوجد أي موعد متاح (للتمييز بـ 404).
+        """
+        if not pk.isdigit():
+            return Response({'error': 'Doctor not found.'}, status=status.HTTP_404_NOT_FOUND)
+        first_day, last_day = parse_slot_range(request.query_params)
+        slots = free_slots(int(pk), first_day, last_day)
+        if not slots and not DoctorProfile.objects.filter(pk=pk).exists():
+            return Response({'error': 'Doctor not found.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'doctor': int(pk), 'from': first_day, 'to': last_day, 'slots': slots})
+
     @action(detail=True, methods=['delete'], url_path='remove-patient-from-list')
     def remove_patient(self, request, pk=None):
         # هنا نتأكد أن المستخدم هو طبيب
@@ -371,7 +699,10 @@ class DoctorViewSet(viewsets.ReadOnlyModelViewSet):
     def favorite(self, request, pk=None):
         doctor = self.get_object()
         patient_profile = request.user.patientprofile
-        favorite, created = FavoriteDoctor.objects.get_or_create(patient=patient_profile, doctor=doctor)
+        with transaction.atomic():
+            favorite, created = FavoriteDoctor.objects.get_or_create(patient=patient_profile, doctor=doctor)
+            if created:
+                DoctorProfile.objects.filter(pk=doctor.pk).update(favorites_count=F('favorites_count') + 1)
         if created:
             return Response({'status': 'تم إضافة الطبيب إلى المفضلة'}, status=status.HTTP_201_CREATED)
         else:
@@ -381,7 +712,10 @@ class DoctorViewSet(viewsets.ReadOnlyModelViewSet):
     def unfavorite(self, request, pk=None):
         doctor = self.get_object()
         patient_profile = request.user.patientprofile
-        deleted_count, _ = FavoriteDoctor.objects.filter(patient=patient_profile, doctor=doctor).delete()
+        with transaction.atomic():
+            deleted_count, _ = FavoriteDoctor.objects.filter(patient=patient_profile, doctor=doctor).delete()
+            if deleted_count > 0:
+                DoctorProfile.objects.filter(pk=doctor.pk).update(favorites_count=F('favorites_count') - 1)
         if deleted_count > 0:
             return Response({'status': 'تم حذف الطبيب من المفضلة'}, status=status.HTTP_200_OK)
         else:
@@ -390,18 +724,52 @@ class DoctorViewSet(viewsets.ReadOnlyModelViewSet):
     @action(detail=False, methods=['get'], url_path='favorites', permission_classes=[IsPatient])
     def list_favorites(self, request):
         patient_profile = request.user.patientprofile
-        favorites = FavoriteDoctor.objects.filter(patient=patient_profile)
+        # favorites_count عمود في DoctorProfile، فالقائمة كلها استعلام واحد
+        favorites = FavoriteDoctor.objects.filter(patient=patient_profile).select_related('doctor__user')
         if not favorites.exists():
             return Response({"message": "لا يوجد لديك أطباء مفضلين بعد."})
         serializer = FavoriteDoctorSerializer(favorites, many=True, context={'request': request})
         return Response(serializer.data)
 
 
+# --- جدول عمل الطبيب واستثناءاته: كل طبيب يدير جدوله فقط ---
+class DoctorScheduleViewSet(viewsets.ModelViewSet):
+    serializer_class = DoctorScheduleSerializer
+    permission_classes = [IsAuthenticated, IsDoctor]
+    pagination_class = None
+    def get_queryset(self):
+        return DoctorSchedule.objects.filter(doctor__user=self.request.user).order_by('weekday', 'start_time')
+    def perform_create(self, serializer):
+        serializer.save(doctor=self.request.user.doctorprofile)
+
+class ScheduleExceptionViewSet(viewsets.ModelViewSet):
+    serializer_class = ScheduleExceptionSerializer
+    permission_classes = [IsAuthenticated, IsDoctor]
+    def get_queryset(self):
+        return ScheduleException.objects.filter(doctor__user=self.request.user).order_by('-date', 'start_time')
+    def perform_create(self, serializer):
+        serializer.save(doctor=self.request.user.doctorprofile)
 
 # --- AppointmentViewSet (FINAL VERSION) ---
+SLOT_TAKEN_MESSAGE = 'This time slot is already booked with this doctor.'
+ACTIVE_SLOT_CONSTRAINT = next(c for c in Appointment._meta.constraints if c.name == 'appointment_active_slot_uniq')
+
+
+def is_slot_taken(error):
+    """
+    هل IntegrityError من القيد appointment_active_slot_uniq؟ PostgreSQL يذكر اسم القيد في الرسالة
+    و SQLite يذكر أعمدته ("UNIQUE constraint failed: core_appointment.doctor_id, ...").
+    أي خطأ آخر (الإشعار أو المهمة في نفس الـ transaction) ليس "الموعد محجوز" ويجب أن يظهر كما هو.
+    """
+    message = str(error)
+    table = Appointment._meta.db_table
+    columns = ', '.join(f'{table}.{Appointment._meta.get_field(name).column}' for name in ACTIVE_SLOT_CONSTRAINT.fields)
+    return ACTIVE_SLOT_CONSTRAINT.name in message or columns in message
+
+
 class AppointmentViewSet(viewsets.ModelViewSet):
     pagination_class = None
-    queryset = Appointment.objects.all()
+    queryset = Appointment.objects.select_related('patient__user', 'doctor__user')
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['status', 'appointment_date'] 
@@ -433,19 +801,46 @@ class AppointmentViewSet(viewsets.ModelViewSet):
             return self.queryset.filter(doctor=user.doctorprofile, status='Pending').order_by('appointment_date', 'appointment_time')
         return Appointment.objects.none()
 
+    def create(self, request, *args, **kwargs):
+        # الحجز وإشعار الطبيب في transaction واحد، والقيد appointment_active_slot_uniq يحسم
+        # بين طلبين متزامنين على نفس الموعد: الخاسر يحصل على 409 ولا يبقى له أثر
+        try:
+            with transaction.atomic():
+                return super().create(request, *args, **kwargs)
+        except IntegrityError as error:
+            if not is_slot_taken(error):
+                raise
+            return Response({'error': SLOT_TAKEN_MESSAGE}, status=status.HTTP_409_CONFLICT)
+
+    def update(self, request, *args, **kwargs):
+        # تغيير الطبيب لموعد إلى وقت محجوز
+        try:
+            with transaction.atomic():
+                return super().update(request, *args, **kwargs)
+        except IntegrityError as error:
+            if not is_slot_taken(error):
+                raise
+            return Response({'error': SLOT_TAKEN_MESSAGE}, status=status.HTTP_409_CONFLICT)
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        if instance.status == 'Confirmed':
+            touch_bookings(instance.doctor_id)
+
     def perform_create(self, serializer):
         if hasattr(self.request.user, 'patientprofile'):
             appointment = serializer.save(patient=self.request.user.patientprofile)
-            doctor_user = appointment.doctor.user
             patient_name = appointment.patient.user.get_full_name()
             message = f"لديك طلب موعد جديد من المريض: {patient_name}"
-            Notification.objects.create(recipient=doctor_user, message=message, related_object=appointment)
+            notify([(appointment.doctor.user_id, message, appointment)], kind='appointment.requested')
         else:
             raise serializers.ValidationError("Only patients can create appointments.")
 
     def perform_update(self, serializer):
         if self.request.user.is_staff and serializer.instance.doctor.user == self.request.user:
-            serializer.save()
+            appointment = serializer.save()
+            if appointment.status == 'Confirmed':
+                touch_bookings(appointment.doctor_id)
         else:
             raise serializers.ValidationError("You do not have permission to edit this appointment.")
 
@@ -471,13 +866,12 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         else:
             appointment.status = 'Rejected'
             message = "تم رفض الموعد."
-        appointment.save()
         notification_message = f"لقد تم {appointment.get_status_display()} موعدك مع د. {appointment.doctor.user.get_full_name()}"
-        Notification.objects.create(
-            recipient=appointment.patient.user, 
-            message=notification_message,
-            related_object=appointment
-        )
+        with transaction.atomic():
+            appointment.save()
+            if accepted:
+                touch_bookings(appointment.doctor_id)
+            notify([(appointment.patient.user_id, notification_message, appointment)], kind='appointment.responded')
         return Response({'status': message, 'appointment_status': appointment.status}, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, IsPatient])
@@ -495,7 +889,7 @@ class AppointmentViewSet(viewsets.ModelViewSet):
     )
     def bookings(self, request):
         doctor_profile = request.user.doctorprofile
-        confirmed_appointments = Appointment.objects.filter(
+        confirmed_appointments = self.queryset.filter(
             doctor=doctor_profile, 
             status='Confirmed'
         ).order_by('appointment_date', 'appointment_time')
@@ -507,14 +901,47 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(confirmed_appointments, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get', 'post'], url_path='bookings-feed', permission_classes=[IsAuthenticated, IsDoctor])
+    def bookings_feed(self, request):
+        """
+        رابط تقويم الحجوزات (bookings.ics) للاشتراك من تطبيق التقويم. POST يغير الرمز ويلغي الرابط القديم.
+        """
+        doctor_profile = request.user.doctorprofile
+        if request.method == 'POST':
+            doctor_profile.calendar_token = new_calendar_token()
+            doctor_profile.save(update_fields=['calendar_token'])
+        url = request.build_absolute_uri(reverse('bookings_ics'))
+        return Response({'url': f'{url}?token={doctor_profile.calendar_token}'})
+
 class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
+    cursor_ordering = ('-timestamp', '-id')
     def get_queryset(self):
-        return Notification.objects.filter(recipient=self.request.user)
+        return Notification.objects.filter(recipient=self.request.user).order_by('-timestamp', '-id').prefetch_related(
+            notification_related_prefetch()
+        )
+    def get_serializer_class(self):
+        if self.action == 'bulk_mark_read':
+            return NotificationMarkReadSerializer
+        return NotificationSerializer
     @action(detail=True, methods=['post'], url_path='mark-as-read')
     def mark_as_read(self, request, pk=None):
-        notification = self.get_object()
-        notification.is_read = True
-        notification.save()
-        return Response({'status': 'notification marked as read'}, status=status.HTTP_200_OK)
\ No newline at end of file
+        # UPDATE واحد؛ الاستعلام الإضافي فقط عندما لا يتغير شيء (مقروء مسبقاً أو ليس للمستخدم)
+        if not (pk.isdigit() and mark_read(request.user, ids=[int(pk)])):
+            get_object_or_404(self.get_queryset(), pk=pk)
+        return Response({'status': 'notification marked as read'}, status=status.HTTP_200_OK)
+    @action(detail=False, methods=['post'], url_path='mark-read')
+    def bulk_mark_read(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        marked = mark_read(request.user, **serializer.validated_data)
+        return Response({'marked': marked, 'unread': unread_count(request.user)})
+    @action(detail=False, methods=['post'], url_path='mark-all-read')
+    def mark_all_read(self, request):
+        marked = mark_read(request.user)
+        return Response({'marked': marked, 'unread': unread_count(request.user)})
+    @action(detail=False, methods=['get'], url_path='unread-count')
+    def get_unread_count(self, request):
+        # من عداد المستخدم (مفتاح أساسي) بدل COUNT على الإشعارات
+        return Response({'unread': unread_count(request.user)})
\ No newline at end of file
@@ -77,6 +77,18 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # كل transaction يأخذ قفل الكتابة من بدايته، فالحجوزات المتزامنة تنتظر دورها (حتى timeout ثانية)
+            # بدل "database is locked" عند ترقية قفل القراءة. كل كتل atomic() في المشروع تقرأ ثم تكتب
+            # (الحجز، استلام المهام في jobs، العدادات والـ rollups)، والطلبات للقراءة فقط تعمل في autocommit
+            # بدون ATOMIC_REQUESTS، فلا تنتظر هذا القفل
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        # قاعدة الاختبار في ملف وليس في الذاكرة: اختبار الحجز المتزامن يفتح اتصالاً لكل thread
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
@@ -119,6 +131,28 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 
+# أرشيف القراءات القديمة (ملفات NumPy لكل مريض ولكل شهر)، انظر core/archive.py
+GLUCOSE_ARCHIVE_ROOT = os.path.join(BASE_DIR, 'archive')
+
+# الإشعارات المقروءة الأقدم من هذا تُحذف بـ purge_notifications (مع --archive تُحفظ أولاً كـ JSON lines مضغوطة)
+NOTIFICATION_RETENTION_DAYS = 90
+NOTIFICATION_ARCHIVE_ROOT = os.path.join(BASE_DIR, 'archive', 'notifications')
+
+
+# طابور المهام الخلفية (core/jobs.py) تنفذه: python manage.py run_workers
+# True: تُنفذ المهام مباشرة بعد COMMIT داخل الطلب بدون workers (للتطوير فقط)
+JOBS_RUN_EAGERLY = False
+
+
+# الإشعارات الفورية /api/notifications/stream/ (core/push.py) تحتاج خادم ASGI: uvicorn rahat_sukari.asgi:application
+# DatabaseBroker يوزع الإشعارات بين العمليات (والـ workers) من جدول الإشعارات، و LocalBroker داخل عملية واحدة فقط
+PUSH_BROKER = 'core.push.DatabaseBroker'
+PUSH_POLL_INTERVAL = 1.0
+# ثواني بدون أحداث قبل إرسال keepalive، ومدة انتظار العميل قبل إعادة الاتصال (ms)
+PUSH_KEEPALIVE = 25
+PUSH_RETRY_MS = 3000
+
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -133,6 +167,7 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    # ترقيم بأرقام الصفحات افتراضياً، مع وضع cursor (keyset) اختياري لكل طلب
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.KeysetPagination',
     'PAGE_SIZE': 10
 }
\ No newline at end of file